@@ -0,0 +1,17 @@
+"""
+ASGI config for filelink project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "filelink.settings.prod")
+os.environ.setdefault("FL_ASYNC_VIEWS", "1")
+
+application = get_asgi_application()
@@ -40,6 +40,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "shares.metrics.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -68,14 +69,50 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "filelink.wsgi.application"
+ASGI_APPLICATION = "filelink.asgi.application"
+
+# Serve downloads and file listings with async views. This is enabled by
+# filelink.asgi, since sync views are serialized onto one thread under ASGI.
+FL_ASYNC_VIEWS = os.environ.get("FL_ASYNC_VIEWS") == "1"
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Each uwsgi worker writes download logs, so SQLite is tuned for concurrent
+# writers. WAL lets reads continue while another process writes, and writers
+# wait for the lock rather than failing with "database is locked". Atomic
+# blocks take the write lock up front, since a deferred transaction that
+# upgrades to a write can't wait and fails straight away.
+FL_SQLITE_BUSY_TIMEOUT_MS = 10000
+FL_SQLITE_CACHE_SIZE_KB = 16384
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": DATA_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": ";".join([
+                "PRAGMA journal_mode=WAL",
+                "PRAGMA synchronous=NORMAL",
+                f"PRAGMA busy_timeout={FL_SQLITE_BUSY_TIMEOUT_MS}",
+                f"PRAGMA cache_size=-{FL_SQLITE_CACHE_SIZE_KB}",
+            ]),
+            "transaction_mode": "IMMEDIATE",
+        },
+        # Reuse connections across requests, so the pragmas and SQLite's page
+        # cache are not set up again for every request
+        "CONN_MAX_AGE": int(os.environ.get("FL_CONN_MAX_AGE", 600)),
+        "CONN_HEALTH_CHECKS": True,
+    }
+}
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "filelink",
     }
 }
 
@@ -85,6 +122,19 @@ LOGIN_URL = "/login"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/"
 
+# Sessions are kept in signed cookies and users are cached per process, so
+# authenticated pages run no queries to identify the user. Set
+# FL_SESSION_ENGINE to "db" to keep sessions server side, so that logging out
+# revokes them. "cached_db" also works, but the cache is per process, so a
+# session deleted by one worker stays valid in the others until it expires.
+SESSION_ENGINE = "django.contrib.sessions.backends." + \
+    os.environ.get("FL_SESSION_ENGINE", "signed_cookies")
+AUTHENTICATION_BACKENDS = ["shares.auth.CachedModelBackend"]
+
+FL_USER_CACHE_SIZE = 256
+FL_USER_CACHE_TTL = 60
+FL_USER_CACHE_STAMP_PATH = DATA_DIR / "user_cache.stamp"
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -110,3 +160,109 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Other settings
 
 APPEND_SLASH = False
+
+# Share cache settings
+
+# Slug lookups for downloads are cached per process. Saving or deleting a share
+# touches the stamp file so other processes drop their cached entries.
+FL_SHARE_CACHE_SIZE = 1024
+FL_SHARE_CACHE_TTL = 60
+FL_SHARE_CACHE_STAMP_PATH = DATA_DIR / "share_cache.stamp"
+
+# Files view settings
+
+# Where listings are read from: "disk", or "index" to read them from the
+# index kept up to date by the index_files command. Directories that have not
+# been indexed yet are read from disk.
+FL_LISTING_SOURCE = os.environ.get("FL_LISTING_SOURCE", "disk")
+# Seconds between rescans when running index_files --watch
+FL_INDEX_INTERVAL = 300
+# Maximum number of results shown when searching the index
+FL_SEARCH_MAX_RESULTS = 100
+# Total number of directory entries in the listings kept in memory per
+# process. Larger listings are not cached.
+FL_LISTING_CACHE_MAX_ENTRIES = 100000
+# Default and maximum number of entries shown per page, also used as the
+# chunk size when streaming a listing
+FL_FILES_PAGE_SIZE = 1000
+FL_FILES_MAX_PAGE_SIZE = 5000
+# Maximum number of files that can be shared in one bulk operation
+FL_BULK_SHARE_MAX_FILES = 10000
+
+# Checksum settings
+
+# Checksums of shared files are computed by the hash_files command, reading at
+# most this many bytes per second (0 for no limit)
+FL_CHECKSUM_MAX_BYTES_PER_SECOND = 32 * 1024 * 1024
+# Seconds between checks when running hash_files --watch
+FL_CHECKSUM_INTERVAL = 300
+
+# Number of shared files stat'ed at a time by check_shares. Higher values help
+# most on network mounts, where each stat waits on a round trip.
+FL_SHARE_CHECK_WORKERS = 32
+
+# Share deletion settings
+
+# Deleted shares are hidden at once, and their download logs are removed in
+# batches with a pause in between, by a background thread unless this is off.
+FL_SHARE_DELETE_IN_BACKGROUND = True
+FL_SHARE_DELETE_BATCH_SIZE = 1000
+FL_SHARE_DELETE_BATCH_DELAY = 0.05
+
+# Download log settings
+
+# Number of days of download rollups shown on the share page
+FL_SHARE_DAILY_DOWNLOADS_DAYS = 30
+
+# When buffered, download logs are queued in memory and written in batches by
+# a background thread instead of during the download request.
+FL_DOWNLOAD_LOG_BUFFERED = False
+FL_DOWNLOAD_LOG_BATCH_SIZE = 100
+FL_DOWNLOAD_LOG_FLUSH_INTERVAL = 1.0
+FL_DOWNLOAD_LOG_QUEUE_SIZE = 10000
+# What to do when the queue is full: "write" the log during the request, or
+# "drop" it.
+FL_DOWNLOAD_LOG_OVERFLOW = "write"
+
+# Download logs older than this many days are moved to gzip NDJSON files in
+# FL_DOWNLOAD_LOG_ARCHIVE_DIR by archive_download_logs, once rolled up.
+FL_DOWNLOAD_LOG_RETENTION_DAYS = 365
+FL_DOWNLOAD_LOG_ARCHIVE_DIR = DATA_DIR / "download_log_archive"
+# Archived logs are deleted in batches of this size, with a pause in between
+# so downloads are not kept waiting for the write lock.
+FL_DOWNLOAD_LOG_ARCHIVE_BATCH_SIZE = 1000
+FL_DOWNLOAD_LOG_ARCHIVE_BATCH_DELAY = 0.05
+
+# Metrics settings
+
+# Each process writes its metrics to this directory at most once per interval,
+# and /metrics reports the sum across processes.
+FL_METRICS_DIR = DATA_DIR / "metrics"
+FL_METRICS_WRITE_INTERVAL = 5
+# Bearer token that allows reading /metrics without a staff login
+FL_METRICS_TOKEN = os.environ.get("FL_METRICS_TOKEN", "")
+
+# Download rate limit settings
+
+# Limits are tracked per client IP and per share, in a memory mapped file
+# shared by all processes. Rates are in requests per second, with bursts of up
+# to the given number of requests. A rate or concurrency cap of 0 disables it.
+# Concurrency caps only count transfers streamed by the app, not files handed
+# to the server with X-Sendfile.
+FL_RATE_LIMIT_PATH = DATA_DIR / "ratelimit.bin"
+FL_RATE_LIMIT_SLOTS = 65536
+FL_RATE_LIMIT_IP_RATE = 0
+FL_RATE_LIMIT_IP_BURST = 20
+FL_RATE_LIMIT_IP_CONCURRENCY = 0
+FL_RATE_LIMIT_SHARE_RATE = 0
+FL_RATE_LIMIT_SHARE_BURST = 100
+FL_RATE_LIMIT_SHARE_CONCURRENCY = 0
+# Transfers of keys that have had none released for this long are no longer
+# counted, in case a process died before releasing them
+FL_RATE_LIMIT_CONCURRENCY_TTL = 6 * 60 * 60
+
+# Startup settings
+
+# Seconds a fresh process may take to import filelink.wsgi, checked by
+# startup --check-import-time
+FL_WSGI_IMPORT_BUDGET = 2.0
@@ -10,7 +10,10 @@ TIME_ZONE = "America/Los_Angeles"
 FL_FILES_PATH = Path(os.environ["FL_FILES_PATH"]).resolve() \
     if "FL_FILES_PATH" in os.environ else BASE_DIR
 
+# Purge deleted shares during the request, so their logs are gone when it returns
+FL_SHARE_DELETE_IN_BACKGROUND = False
+
 # Sendfile settings
 
 SENDFILE_ROOT = FL_FILES_PATH
-SENDFILE_BACKEND = "django_sendfile.backends.development"
+SENDFILE_BACKEND = "shares.sendfile_backend"
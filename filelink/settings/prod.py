@@ -14,6 +14,17 @@ SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
 SESSION_COOKIE_SECURE = True
 CSRF_COOKIE_SECURE = True
 
+# Static files get content hashes in their names, so uwsgi can let clients
+# cache them forever, and precompressed copies for uwsgi to send
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "shares.storage.CompressedManifestStaticFilesStorage",
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -37,7 +48,12 @@ AUTH_PASSWORD_VALIDATORS = [
 # Use project folder as fallback for local testing
 FL_FILES_PATH = Path(os.environ.get("FL_FILES_PATH") or "/files").resolve()
 
+# Download log settings
+
+FL_DOWNLOAD_LOG_BUFFERED = True
+
 # Sendfile settings
 
 SENDFILE_ROOT = FL_FILES_PATH
-SENDFILE_BACKEND = "django_sendfile.backends.xsendfile"
+SENDFILE_BACKEND = os.environ.get(
+    "FL_SENDFILE_BACKEND", "django_sendfile.backends.xsendfile")
@@ -0,0 +1,15 @@
+import atexit
+import shutil
+import tempfile
+
+from .dev import *
+
+# Keep files written while testing out of DATA_DIR
+TEST_DATA_DIR = Path(tempfile.mkdtemp(prefix="filelink-test-"))
+atexit.register(shutil.rmtree, TEST_DATA_DIR, ignore_errors=True)
+
+# Application settings
+
+FL_METRICS_DIR = TEST_DATA_DIR / "metrics"
+FL_SHARE_CACHE_STAMP_PATH = TEST_DATA_DIR / "share_cache.stamp"
+FL_USER_CACHE_STAMP_PATH = TEST_DATA_DIR / "user_cache.stamp"
@@ -4,17 +4,16 @@
 # Activate virtual environment
 source .venv/bin/activate
 
+# Use the same settings as uwsgi, so static files are collected with the
+# storage that serves them
+export DJANGO_SETTINGS_MODULE=filelink.settings.prod
+
 # Create data folder
 mkdir -p data
 
-# Run database migrations
-python manage.py migrate
-
-# Generate secret key file if needed
-python manage.py generate_secret_key
-
-# Collect static files
-python manage.py collectstatic
+# Generate the secret key, run database migrations and collect static files,
+# skipping the steps with nothing to do
+python manage.py startup
 
 # Start uwsgi server
 exec uwsgi uwsgi.ini
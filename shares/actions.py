@@ -1,50 +1,530 @@
+import bisect
+import datetime
+import functools
 import os
+import time
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
 
 from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser
+from django.db import connection, transaction
+from django.db.models import Count, Max, QuerySet, Sum
 from django.shortcuts import redirect
+from django.utils import timezone
 
-from shares import models
-from shares.exceptions import InvalidRequestPathException
+from shares import deletion, models
+from shares.cache import MISSING, InvalidationStamp, LRUCache
+from shares.exceptions import InvalidRequestPathException, TooManyFilesException
+
+
+class ResolvedShare(NamedTuple):
+    id: int
+    full_path: str
+    download_enabled: bool
+    force_download: bool
+    name: str
+    cache_max_age: int
+    compress_archive: bool
+    # The inode, size, mtime and SHA-256 of the file when it was last hashed
+    checksum: Tuple[int, int, int, str] | None = None
+
+
+BULK_ACTIONS = ("enable", "disable", "delete")
+
+
+share_cache = LRUCache(settings.FL_SHARE_CACHE_SIZE,
+                       settings.FL_SHARE_CACHE_TTL)
+share_cache_stamp = InvalidationStamp(settings.FL_SHARE_CACHE_STAMP_PATH)
+
+LISTING_CACHE_MIN_AGE_NS = 2_000_000_000
+# Bounded by the number of directory entries, as listings vary from a few
+# entries to hundreds of thousands
+listing_cache = LRUCache(settings.FL_LISTING_CACHE_MAX_ENTRIES,
+                         get_size=lambda listing: len(listing[0]) + len(listing[1]) + 1)
 
 
 def get_directories_and_files(requested_path: Path) -> \
         Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Path | None]:
     files_root_path: Path = settings.FL_FILES_PATH
+    scan_path = _get_scan_path(requested_path, files_root_path)
+
+    if (listing := _get_indexed_listing(scan_path, files_root_path)) is not None:
+        return (*listing, _get_parent_path(scan_path, files_root_path))
+
+    (listing, cache_key) = _get_cached_listing(scan_path)
+    if listing is not None:
+        (directories, files) = listing
+    else:
+        (directories, files) = _scan_directory(scan_path, files_root_path)
+        # A change within the same timestamp tick as the scan would not change
+        # the mtime, so only cache directories that have been stable for a bit.
+        if cache_key[1] is not None and \
+                time.time_ns() - cache_key[1] > LISTING_CACHE_MIN_AGE_NS:
+            listing_cache.set(cache_key, (directories, files))
+
+    return (directories, files, _get_parent_path(scan_path, files_root_path))
+
+
+def stream_directories_and_files(requested_path: Path, chunk_size: int) -> \
+        Tuple[Iterator[Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]], Path | None]:
+    """
+    Like get_directories_and_files, but yields the listing in chunks while the
+    directory is being scanned. Entries are in scan order unless the listing
+    was already cached or indexed.
+    """
+    files_root_path: Path = settings.FL_FILES_PATH
+    scan_path = _get_scan_path(requested_path, files_root_path)
+
+    def generate_chunks():
+        listing = _get_indexed_listing(scan_path, files_root_path)
+        if listing is None:
+            (listing, _) = _get_cached_listing(scan_path)
+        if listing is not None:
+            (directories, files) = listing
+            for i in range(0, len(directories), chunk_size):
+                yield (directories[i:i + chunk_size], [])
+            for i in range(0, len(files), chunk_size):
+                yield ([], files[i:i + chunk_size])
+            return
+
+        chunk: Tuple[List[Dict[str, Any]], List[Dict[str, Any]]] = ([], [])
+        for (is_dir, entry) in _iter_directory(scan_path, files_root_path):
+            chunk[0 if is_dir else 1].append(entry)
+            if len(chunk[0]) + len(chunk[1]) >= chunk_size:
+                yield chunk
+                chunk = ([], [])
+        if chunk[0] or chunk[1]:
+            yield chunk
+
+    return (generate_chunks(), _get_parent_path(scan_path, files_root_path))
+
+
+def paginate_directories_and_files(
+        directories: List[Dict[str, Any]], files: List[Dict[str, Any]], after: str | None, limit: int) -> \
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]], str | None]:
+    """
+    Returns the page of a sorted listing that comes after the cursor, along with
+    the cursor for the next page. Directories are listed before files, and a
+    cursor ending in "/" refers to a directory.
+    """
+    if after is None:
+        (directories_start, files_start) = (0, 0)
+    elif after.endswith("/"):
+        directories_start = bisect.bisect_right(
+            directories, after, key=lambda x: x["name"])
+        files_start = 0
+    else:
+        (directories_start, files_start) = (len(directories), bisect.bisect_right(
+            files, after, key=lambda x: x["name"]))
+
+    directories_page = directories[directories_start:directories_start + limit]
+    files_page = files[files_start:files_start + limit - len(directories_page)]
+
+    next_cursor = None
+    if directories_start + len(directories_page) < len(directories) or \
+            files_start + len(files_page) < len(files):
+        next_cursor = files_page[-1]["name"] if files_page \
+            else directories_page[-1]["name"]
+    return (directories_page, files_page, next_cursor)
+
+
+def get_listing_version(requested_path: Path) -> Tuple[Any, ...] | None:
+    """
+    Returns values that change whenever the listing of a directory or the
+    shares in it change, without listing the directory. Returns None if the
+    directory changed too recently for its mtime to be trusted.
+    """
+    files_root_path: Path = settings.FL_FILES_PATH
+    scan_path = _get_scan_path(requested_path, files_root_path)
+    try:
+        stat = os.stat(scan_path)
+    except OSError:
+        return None
+    if time.time_ns() - stat.st_mtime_ns <= LISTING_CACHE_MIN_AGE_NS:
+        return None
+
+    version: Tuple[Any, ...] = (scan_path.as_posix(), stat.st_ino, stat.st_mtime_ns,
+                                settings.FL_LISTING_SOURCE)
+    if settings.FL_LISTING_SOURCE == "index":
+        # Indexed listings include file sizes and times, which change
+        # without changing the directory's mtime
+        path = scan_path.relative_to(files_root_path).as_posix()
+        version += tuple(models.FileEntry.objects.filter(parent="" if path == "." else path).aggregate(
+            Count("id"), Max("id"), Max("mtime_ns"), Sum("size")).values())
+    version += tuple(_get_shares_for_directory_queryset(requested_path, None).aggregate(
+        Count("id"), Max("updated_at")).values())
+    return version
+
+
+def _get_scan_path(requested_path: Path, files_root_path: Path) -> Path:
     scan_path = (files_root_path / requested_path).resolve()
     if requested_path.is_absolute() or not scan_path.is_relative_to(files_root_path):
         raise InvalidRequestPathException()
+    return scan_path
+
+
+def get_share_file_path(full_path: str) -> Path:
+    """
+    Resolves the path of a shared file or directory, and raises
+    InvalidRequestPathException if it is absolute or leads outside the files
+    root, including through a symlink.
+    """
+    return _get_scan_path(Path(full_path), settings.FL_FILES_PATH)
+
+
+def _get_parent_path(scan_path: Path, files_root_path: Path) -> Path | None:
+    if scan_path == files_root_path:
+        return None
+    return (scan_path / "..").resolve().relative_to(files_root_path)
+
+
+def _get_cached_listing(scan_path: Path) -> Tuple[Any, Tuple[Path, int | None]]:
+    try:
+        mtime_ns = os.stat(scan_path).st_mtime_ns
+    except OSError:
+        mtime_ns = None
+
+    # Keying on the mtime means any change to the directory's entries misses
+    # the cache, and stale listings are eventually evicted.
+    cache_key = (scan_path, mtime_ns)
+    listing = listing_cache.get(cache_key, None)
+    return (listing, cache_key)
+
+
+def _get_indexed_listing(scan_path: Path, files_root_path: Path) -> \
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]] | None:
+    """
+    Reads a listing, with file sizes and modification times, from the index
+    when it is the configured listing source and the directory has been
+    indexed. Returns None to fall back to scanning the directory.
+    """
+    if settings.FL_LISTING_SOURCE != "index":
+        return None
+
+    path = scan_path.relative_to(files_root_path).as_posix()
+    if path == ".":
+        path = ""
+    if not models.FileEntry.objects.filter(path=path, is_dir=True, mtime_ns__gt=0).exists():
+        return None
 
     directories = []
     files = []
+    for entry in models.FileEntry.objects.filter(parent=path):
+        if entry.is_dir:
+            directories.append(dict(
+                name=f"{entry.name}/",
+                path=Path(entry.path),
+            ))
+        else:
+            files.append(dict(
+                name=entry.name,
+                path=Path(entry.path),
+                size=entry.size,
+                modified=datetime.datetime.fromtimestamp(
+                    entry.mtime_ns / 1e9, datetime.timezone.utc),
+            ))
+
+    directories.sort(key=lambda x: x["name"])
+    files.sort(key=lambda x: x["name"])
+    return (directories, files)
+
+
+def _iter_directory(scan_path: Path, files_root_path: Path) -> Iterator[Tuple[bool, Dict[str, Any]]]:
+    relative_path = scan_path.relative_to(files_root_path)
     with os.scandir(scan_path) as scan:
         for f in scan:
-            path = (scan_path / f.name).relative_to(files_root_path)
+            path = relative_path / f.name
             if f.is_dir():
-                directories.append(dict(
+                yield (True, dict(
                     name=f"{f.name}/",
                     path=path,
                 ))
             elif f.is_file():
-                files.append(dict(
+                yield (False, dict(
                     name=f.name,
                     path=path,
                 ))
 
+
+def _scan_directory(scan_path: Path, files_root_path: Path) -> \
+        Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    directories = []
+    files = []
+    for (is_dir, entry) in _iter_directory(scan_path, files_root_path):
+        (directories if is_dir else files).append(entry)
+
     directories.sort(key=lambda x: x["name"])
     files.sort(key=lambda x: x["name"])
+    return (directories, files)
 
-    parent_path = None
-    if scan_path != files_root_path:
-        parent_path = (scan_path / "..").resolve().relative_to(files_root_path)
 
-    return (directories, files, parent_path)
+def search_files(query: str, limit: int) -> List[Dict[str, Any]]:
+    """
+    Finds indexed files and directories whose path contains the query, ignoring
+    case, along with the share for each one that is shared.
+    """
+    query = query.strip()
+    if not query:
+        return []
 
+    entries = models.FileEntry.objects.exclude(path="")
+    # Trigrams need at least three characters to match on
+    if len(query) >= 3 and _has_search_index():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT rowid FROM shares_fileentry_search WHERE shares_fileentry_search MATCH %s LIMIT %s",
+                ('"' + query.replace('"', '""') + '"', limit))
+            entries = entries.filter(id__in=[row[0] for row in cursor])
+    else:
+        entries = entries.filter(path__icontains=query).order_by("path")
 
-def get_shares_for_directory(directory: Path) -> Dict[str, models.Share]:
+    results = [dict(
+        name=f"{e.name}/" if e.is_dir else e.name,
+        path=Path(e.path),
+        is_dir=e.is_dir,
+        share=None,
+    ) for e in sorted(entries[:limit], key=lambda e: e.path)]
+
+    by_path = {(r["path"].parent.as_posix(), r["path"].name): r
+               for r in results}
+    if by_path:
+        for share in models.Share.objects.filter(
+                directory__in={"" if d == "." else d for (d, _) in by_path},
+                name__in={n for (_, n) in by_path}):
+            if (result := by_path.get((share.directory or ".", share.name))):
+                result["share"] = share
+    return results
+
+
+@functools.cache
+def _has_search_index() -> bool:
+    return "shares_fileentry_search" in connection.introspection.table_names()
+
+
+def get_shares_for_directory(directory: Path, names: Iterable[str] | None = None) -> Dict[str, models.Share]:
+    return {s.name: s for s in _get_shares_for_directory_queryset(directory, names)}
+
+
+async def aget_shares_for_directory(directory: Path, names: Iterable[str] | None = None) -> Dict[str, models.Share]:
+    return {s.name: s async for s in _get_shares_for_directory_queryset(directory, names)}
+
+
+def _get_shares_for_directory_queryset(directory: Path, names: Iterable[str] | None) -> QuerySet[models.Share]:
     path = directory.as_posix()
     if path == ".":
         path = ""
 
-    return {s.name: s for s in models.Share.objects.filter(directory=path)}
+    shares = models.Share.objects.filter(directory=path)
+    if names is not None:
+        shares = shares.filter(name__in=list(names))
+    return shares
+
+
+def resolve_share(slug: str) -> ResolvedShare | None:
+    """
+    Looks up the download details for a share slug, caching both found and
+    unknown slugs so repeat downloads skip the database.
+    """
+    if (resolved := _get_cached_share(slug)) is not MISSING:
+        return resolved
+
+    share = models.Share.objects.filter(slug=slug).first()
+    checksum = _get_checksum_queryset(share).first() if share else None
+    return _cache_share(slug, share, checksum)
+
+
+async def aresolve_share(slug: str) -> ResolvedShare | None:
+    if (resolved := _get_cached_share(slug)) is not MISSING:
+        return resolved
+
+    share = await models.Share.objects.filter(slug=slug).afirst()
+    checksum = await _get_checksum_queryset(share).afirst() if share else None
+    return _cache_share(slug, share, checksum)
+
+
+def _get_checksum_queryset(share: models.Share) -> QuerySet:
+    return models.FileChecksum.objects.filter(path=share.full_path).values_list(
+        "inode", "size", "mtime_ns", "sha256")
+
+
+def _get_cached_share(slug: str) -> Any:
+    if share_cache_stamp.changed():
+        share_cache.clear()
+    return share_cache.get(slug)
+
+
+def _cache_share(slug: str, share: models.Share | None,
+                 checksum: Tuple[int, int, int, str] | None) -> ResolvedShare | None:
+    resolved = ResolvedShare(
+        id=share.id,
+        full_path=share.full_path,
+        download_enabled=share.download_enabled,
+        force_download=share.force_download,
+        name=share.name,
+        cache_max_age=share.cache_max_age,
+        compress_archive=share.compress_archive,
+        checksum=checksum,
+    ) if share else None
+    share_cache.set(slug, resolved)
+    return resolved
+
+
+def get_shares_version(user: AbstractBaseUser) -> Tuple[Any, ...]:
+    """Returns values that change whenever any of the user's shares change."""
+    return tuple(models.Share.objects.filter(user=user).aggregate(
+        Count("id"), Max("id"), Max("updated_at")).values())
+
+
+def get_current_checksum(share: models.Share) -> models.FileChecksum | None:
+    """Returns the checksum of a shared file, if it was computed since the file last changed."""
+    checksum = models.FileChecksum.objects.filter(path=share.full_path).first()
+    if checksum is None:
+        return None
+    try:
+        stat = os.stat(settings.FL_FILES_PATH / share.full_path)
+    except OSError:
+        return None
+    return checksum if checksum.matches(stat) else None
+
+
+def invalidate_share_cache(share: models.Share):
+    share_cache.delete(share.slug)
+    share_cache.delete_where(lambda r: r is not None and r.id == share.id)
+    share_cache_stamp.touch()
+
+
+def invalidate_all_shares():
+    """Drops every cached share, here and in the other worker processes."""
+    share_cache.clear()
+    share_cache_stamp.touch()
+
+
+def generate_unique_slugs(count: int) -> List[str]:
+    """
+    Generates slugs for a batch of new shares, checking the whole batch for
+    collisions with existing shares in a single query.
+    """
+    slugs: List[str] = []
+    while len(slugs) < count:
+        candidates = {models.default_slug() for _ in range(count - len(slugs))}
+        candidates.difference_update(slugs)
+        taken = set(models.Share.all_objects.filter(
+            slug__in=candidates).values_list("slug", flat=True))
+        slugs.extend(candidates - taken)
+    return slugs
+
+
+def collect_share_paths(requested_paths: Iterable[Path]) -> List[Path]:
+    """
+    Expands the requested paths into the files to share, relative to the files
+    root. Directories include every file in their subtree.
+    """
+    files_root_path: Path = settings.FL_FILES_PATH
+    paths: Dict[Path, None] = {}
+    for requested_path in requested_paths:
+        scan_path = _get_scan_path(requested_path, files_root_path)
+        if scan_path.is_file():
+            paths[scan_path.relative_to(files_root_path)] = None
+        elif scan_path.is_dir():
+            for (dir_path, dir_names, file_names) in os.walk(scan_path):
+                dir_names.sort()
+                for file_name in sorted(file_names):
+                    file_path = Path(dir_path) / file_name
+                    # Symlinked directories are not walked, but symlinked files
+                    # are listed and may point anywhere
+                    if file_path.is_symlink() and \
+                            not file_path.resolve().is_relative_to(files_root_path):
+                        continue
+                    paths[file_path.relative_to(files_root_path)] = None
+        else:
+            raise InvalidRequestPathException()
+
+        if len(paths) > settings.FL_BULK_SHARE_MAX_FILES:
+            raise TooManyFilesException()
+    return list(paths)
+
+
+def bulk_create_shares(user: AbstractBaseUser, paths: Iterable[Path], **options: Any) -> \
+        Tuple[List[models.Share], List[Path]]:
+    """
+    Shares every file that is not already shared in a single transaction, and
+    returns the created shares along with the paths that were skipped.
+    """
+    by_path: Dict[Tuple[str, str], Path] = {}
+    for path in paths:
+        directory = path.parent.as_posix()
+        by_path[("" if directory == "." else directory, path.name)] = path
+
+    def get_existing(keys: Iterable[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+        return set(models.Share.objects.filter(
+            directory__in={directory for (directory, _) in keys},
+            name__in={name for (_, name) in keys},
+        ).values_list("directory", "name"))
+
+    shares: List[models.Share] = []
+    with transaction.atomic():
+        existing = get_existing(by_path)
+        new_keys = [key for key in by_path if key not in existing]
+        while new_keys:
+            batch = [models.Share(directory=directory, name=name, slug=slug, user=user, **options)
+                     for ((directory, name), slug) in zip(new_keys, generate_unique_slugs(len(new_keys)))]
+            # A share of the same path or with the same slug may have been
+            # created since they were checked, so skip conflicting rows and
+            # look up which were inserted.
+            models.Share.objects.bulk_create(
+                batch, batch_size=500, ignore_conflicts=True)
+            inserted = {(slug, directory, name): share_id for (slug, directory, name, share_id) in
+                        models.Share.objects.filter(slug__in=[s.slug for s in batch]).values_list(
+                            "slug", "directory", "name", "id")}
+            new_keys = []
+            for share in batch:
+                share.id = inserted.get(
+                    (share.slug, share.directory, share.name))
+                if share.id is not None:
+                    shares.append(share)
+                else:
+                    new_keys.append((share.directory, share.name))
+            # Shared by someone else in the meantime, otherwise the slug was
+            # taken and the share is retried with a new one
+            if new_keys:
+                existing |= get_existing(new_keys)
+                new_keys = [key for key in new_keys if key not in existing]
+
+    # A new slug may have been looked up before it existed
+    invalidate_all_shares()
+    return (shares, [by_path[key] for key in by_path if key in existing])
+
+
+def bulk_update_shares(user: AbstractBaseUser, share_ids: Iterable[int], action: str) -> int:
+    """
+    Enables, disables or deletes the user's shares with the given IDs using set
+    based queries, and returns the number of shares affected.
+    """
+    shares = models.Share.objects.filter(user=user, id__in=list(share_ids))
+    if action == "delete":
+        return delete_shares(shares)
+    return set_shares_enabled(shares, action == "enable")
+
+
+def set_shares_enabled(shares: QuerySet[models.Share], enabled: bool) -> int:
+    """Enables or disables downloads of shares, and returns the number updated."""
+    count = shares.update(download_enabled=enabled, updated_at=timezone.now())
+    # Bulk updates skip the save signals that invalidate individual shares
+    invalidate_all_shares()
+    return count
+
+
+def delete_shares(shares: QuerySet[models.Share]) -> int:
+    """
+    Hides shares right away and schedules them to be purged along with their
+    download logs, and returns the number of shares deleted.
+    """
+    count = shares.update(pending_deletion=True, updated_at=timezone.now())
+    invalidate_all_shares()
+    if count:
+        if settings.FL_SHARE_DELETE_IN_BACKGROUND:
+            deletion.get_purger().wake()
+        else:
+            deletion.purge_deleted_shares()
+    return count
@@ -4,4 +4,12 @@ from . import models
 
 
 admin.site.register(models.Share)
-admin.site.register(models.DownloadLog)
+
+
+@admin.register(models.DownloadLog)
+class DownloadLogAdmin(admin.ModelAdmin):
+    # DownloadLog.__str__ includes the share's path
+    list_select_related = ("share",)
+
+
+admin.site.register(models.DailyDownloadRollup)
@@ -8,3 +8,6 @@ from django.conf import settings
 class SharesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "shares"
+
+    def ready(self) -> None:
+        from shares import signals  # noqa: F401
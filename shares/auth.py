@@ -0,0 +1,36 @@
+import copy
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.base_user import AbstractBaseUser
+
+from shares.cache import MISSING, InvalidationStamp, LRUCache
+
+
+user_cache = LRUCache(settings.FL_USER_CACHE_SIZE, settings.FL_USER_CACHE_TTL)
+user_cache_stamp = InvalidationStamp(settings.FL_USER_CACHE_STAMP_PATH)
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    A ModelBackend that caches the users it loads for sessions per process, so
+    authenticated requests do not need to query the user table. Saving or
+    deleting a user touches the stamp file so other processes drop their
+    cached users, and permission changes apply once the cache entry expires.
+    """
+
+    def get_user(self, user_id):
+        if user_cache_stamp.changed():
+            user_cache.clear()
+
+        user = user_cache.get(user_id)
+        if user is MISSING:
+            user = super().get_user(user_id)
+            user_cache.set(user_id, user)
+        # Each request gets its own copy, since views may modify the user
+        return copy.copy(user)
+
+
+def invalidate_user_cache(user: AbstractBaseUser):
+    user_cache.delete(user.pk)
+    user_cache_stamp.touch()
@@ -0,0 +1,60 @@
+import atexit
+import os
+import threading
+
+
+class BackgroundWorker:
+    """
+    Runs run() on a daemon thread, started on first use in each process.
+
+    uwsgi forks workers after the app is loaded, and threads do not survive a
+    fork, so the thread is started lazily and restarted in a forked child.
+    Subclasses reset any per-process state in on_start().
+    """
+
+    thread_name = "background-worker"
+
+    def __init__(self):
+        self._start_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._pid: int | None = None
+        self._exit_registered = False
+
+    @property
+    def stopping(self) -> bool:
+        return self._stopping.is_set()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+
+            self._stopping = threading.Event()
+            self.on_start()
+            self._thread = threading.Thread(
+                target=self.run, name=self.thread_name, daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            if not self._exit_registered:
+                atexit.register(self.shutdown)
+                self._exit_registered = True
+
+    def shutdown(self, timeout: float = 1):
+        self._stopping.set()
+        self.on_stop()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=timeout)
+
+    def on_start(self):
+        pass
+
+    def on_stop(self):
+        """Called once stopping is set, to wake a thread blocked in run()."""
+        pass
+
+    def run(self):
+        raise NotImplementedError()
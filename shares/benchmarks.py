@@ -0,0 +1,265 @@
+import datetime
+import http.client
+import math
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from shares import models, rollups
+
+
+# Session engine and authentication backend pairs compared by the session_auth
+# scenarios
+AUTH_CONFIGURATIONS = dict(
+    db=("django.contrib.sessions.backends.db",
+        "django.contrib.auth.backends.ModelBackend"),
+    cached_db=("django.contrib.sessions.backends.cached_db",
+               "shares.auth.CachedModelBackend"),
+    signed_cookies=("django.contrib.sessions.backends.signed_cookies",
+                    "shares.auth.CachedModelBackend"),
+)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    """Summarizes request latencies (in seconds) measured over elapsed seconds."""
+    latencies = sorted(latencies)
+    return dict(
+        requests=len(latencies),
+        errors=errors,
+        requests_per_second=round(
+            len(latencies) / elapsed, 2) if elapsed else 0.0,
+        latency_ms=dict(
+            p50=round(percentile(latencies, 0.50) * 1000, 3),
+            p95=round(percentile(latencies, 0.95) * 1000, 3),
+            p99=round(percentile(latencies, 0.99) * 1000, 3),
+            max=round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        ),
+    )
+
+
+def load_test_url(url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    """
+    Requests the URL from concurrent keep-alive connections for the duration,
+    reading each response body in full.
+    """
+    parts = urlsplit(url)
+    connection_class = http.client.HTTPSConnection if parts.scheme == "https" \
+        else http.client.HTTPConnection
+    target = parts.path + (f"?{parts.query}" if parts.query else "")
+
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    def worker():
+        nonlocal errors
+        connection = connection_class(parts.netloc, timeout=30)
+        worker_latencies = []
+        worker_errors = 0
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request("GET", target)
+                response = connection.getresponse()
+                response.read()
+                if response.status >= 400:
+                    worker_errors += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                worker_errors += 1
+                connection.close()
+                continue
+            worker_latencies.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(worker_latencies)
+            errors += worker_errors
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors, time.monotonic() - start)
+
+
+def generate_file_tree(root_path: Path, depth: int, fanout: int, files_per_directory: int,
+                       file_size: int) -> List[Path]:
+    """
+    Creates a tree of directories and files under root_path, and returns the
+    paths of the directories relative to root_path.
+    """
+    content = b"\0" * file_size
+    directories = [Path(".")]
+    level = [Path(".")]
+    for current_depth in range(depth + 1):
+        next_level = []
+        for directory in level:
+            for i in range(files_per_directory):
+                (root_path / directory /
+                 f"file{i:06}.bin").write_bytes(content)
+            if current_depth < depth:
+                for i in range(fanout):
+                    child = directory / f"dir{i:04}"
+                    (root_path / child).mkdir()
+                    next_level.append(child)
+        directories.extend(next_level)
+        level = next_level
+    return directories
+
+
+def generate_shares_and_logs(root_path: Path, user, share_count: int, log_count: int,
+                             rng: random.Random) -> List[models.Share]:
+    files = sorted(p.relative_to(root_path)
+                   for p in root_path.rglob("*") if p.is_file())
+    shares = models.Share.objects.bulk_create([models.Share(
+        directory="" if path.parent == Path(".") else path.parent.as_posix(),
+        name=path.name,
+        slug=models.default_slug(),
+        user=user,
+    ) for path in rng.sample(files, min(share_count, len(files)))])
+
+    now = timezone.now()
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(1000)]
+    for start in range(0, log_count, 10000):
+        models.DownloadLog.objects.bulk_create([models.DownloadLog(
+            timestamp=now -
+            datetime.timedelta(seconds=rng.randrange(30 * 86400)),
+            share=rng.choice(shares),
+            ip=rng.choice(ips),
+            user_agent="benchmark",
+            range_header=rng.choice(("", "", "", "bytes=0-")),
+        ) for _ in range(min(10000, log_count - start))])
+    rollups.update_daily_rollups()
+    return shares
+
+
+def run_scenario(client: Client, get_url: Callable[[], str], requests: int, warmup: int) -> Dict[str, Any]:
+    for _ in range(warmup):
+        _read_response(client.get(get_url()))
+
+    latencies = []
+    query_counts = []
+    errors = 0
+    start = time.perf_counter()
+    for _ in range(requests):
+        url = get_url()
+        with CaptureQueriesContext(connection) as queries:
+            request_start = time.perf_counter()
+            response = client.get(url)
+            _read_response(response)
+            latency = time.perf_counter() - request_start
+        if response.status_code >= 400:
+            errors += 1
+            continue
+        latencies.append(latency)
+        query_counts.append(len(queries))
+    elapsed = time.perf_counter() - start
+
+    summary = summarize(latencies, errors, elapsed)
+    summary["queries_per_request"] = dict(
+        mean=round(sum(query_counts) / len(query_counts),
+                   2) if query_counts else 0.0,
+        max=max(query_counts, default=0),
+    )
+    return summary
+
+
+def run_auth_scenarios(user, requests: int, warmup: int) -> Dict[str, Any]:
+    """
+    Measures the cost of identifying the user for each session and auth
+    configuration, on an authenticated page that runs no queries of its own.
+    """
+    results = {}
+    for (name, (session_engine, auth_backend)) in AUTH_CONFIGURATIONS.items():
+        with override_settings(SESSION_ENGINE=session_engine, AUTHENTICATION_BACKENDS=[auth_backend]):
+            client = Client()
+            client.force_login(user)
+            url = reverse("shares:search")
+            results[name] = run_scenario(
+                client, lambda: url, requests, warmup)
+    return results
+
+
+def _read_response(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    response.close()
+
+
+def run_benchmarks(root_path: Path, depth: int, fanout: int, files_per_directory: int, file_size: int,
+                   share_count: int, log_count: int, requests: int, warmup: int, seed: int) -> Dict[str, Any]:
+    """
+    Builds a synthetic file tree, shares and download logs, then measures the
+    download and browsing views through the Django test client. Expects an
+    empty database.
+    """
+    rng = random.Random(seed)
+    directories = generate_file_tree(
+        root_path, depth, fanout, files_per_directory, file_size)
+
+    with override_settings(FL_FILES_PATH=root_path, SENDFILE_ROOT=root_path,
+                           ALLOWED_HOSTS=["testserver"]):
+        user = get_user_model().objects.create(username="benchmark")
+        shares = generate_shares_and_logs(
+            root_path, user, share_count, log_count, rng)
+
+        client = Client()
+        client.force_login(user)
+        scenarios = dict(
+            download_share=lambda: reverse(
+                "shares:download_share", args=(rng.choice(shares).slug,)),
+            files=lambda: reverse("shares:files") +
+            f"?path={rng.choice(directories).as_posix()}",
+            shares=lambda: reverse("shares:shares"),
+            share=lambda: reverse(
+                "shares:share", args=(rng.choice(shares).id,)),
+        )
+        results = {name: run_scenario(client, get_url, requests, warmup)
+                   for (name, get_url) in scenarios.items()}
+        results["session_auth"] = run_auth_scenarios(
+            user, requests, warmup)
+
+    return dict(
+        timestamp=timezone.now().isoformat(),
+        parameters=dict(
+            depth=depth,
+            fanout=fanout,
+            files_per_directory=files_per_directory,
+            file_size=file_size,
+            directories=len(directories),
+            shares=len(shares),
+            logs=log_count,
+            requests=requests,
+            warmup=warmup,
+            seed=seed,
+        ),
+        settings=dict(
+            database_engine=connection.settings_dict["ENGINE"],
+            sendfile_backend=settings.SENDFILE_BACKEND,
+            download_log_buffered=settings.FL_DOWNLOAD_LOG_BUFFERED,
+            session_engine=settings.SESSION_ENGINE,
+        ),
+        results=results,
+    )
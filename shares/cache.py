@@ -0,0 +1,125 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread safe in-process cache with LRU eviction and an optional TTL.
+    A maxsize of 0 disables caching.
+
+    By default maxsize is a number of entries. With get_size, it is instead
+    the total size of the cached values as measured by get_size, and values
+    larger than maxsize on their own are not cached.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None,
+                 get_size: Callable[[Any], int] | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._get_size = get_size or (lambda value: 1)
+        self._lock = threading.Lock()
+        # Expiry time, value and size of each entry
+        self._entries: OrderedDict[Hashable,
+                                   Tuple[float, Any, int]] = OrderedDict()
+        self._total_size = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                (expires_at, value, _) = entry
+                if self.ttl is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self._pop(key)
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any):
+        size = self._get_size(value)
+        if self.maxsize <= 0 or size > self.maxsize:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else 0
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (expires_at, value, size)
+            self._total_size += size
+            while self._total_size > self.maxsize:
+                (_, (_, _, evicted_size)) = self._entries.popitem(last=False)
+                self._total_size -= evicted_size
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._pop(key)
+
+    def delete_where(self, predicate: Callable[[Any], bool]):
+        with self._lock:
+            for key in [k for k, (_, v, _) in self._entries.items() if predicate(v)]:
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_size = 0
+
+    def _pop(self, key: Hashable):
+        if (entry := self._entries.pop(key, None)) is not None:
+            self._total_size -= entry[2]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(hits=self.hits, misses=self.misses, size=len(self))
+
+
+class InvalidationStamp:
+    """
+    A file used to tell other processes that a cache is stale. Touching the
+    stamp atomically replaces the file, so its inode changes even on file
+    systems with coarse timestamps.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._seen = self._read()
+
+    def touch(self):
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.path.parent)
+            os.close(fd)
+            os.replace(temp_path, self.path)
+        except OSError:
+            logger.warning("Unable to touch cache stamp %s",
+                           self.path, exc_info=True)
+        self._seen = self._read()
+
+    def changed(self) -> bool:
+        current = self._read()
+        if current == self._seen:
+            return False
+        self._seen = current
+        return True
+
+    def _read(self) -> Tuple[int, int] | None:
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_mtime_ns)
@@ -0,0 +1,126 @@
+"""
+Computes SHA-256 checksums of shared files in the background, so downloads
+can report them without hashing on the request path.
+
+A checksum is stored with the inode, size and mtime of the file it was
+computed from, and files are only hashed again once those change. Reads are
+throttled to FL_CHECKSUM_MAX_BYTES_PER_SECOND so hashing large files does not
+starve downloads of disk bandwidth.
+"""
+import hashlib
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from stat import S_ISREG
+from typing import Set
+
+from django.conf import settings
+
+from shares import actions, models
+
+
+CHUNK_SIZE = 1024 * 1024
+DELETE_BATCH_SIZE = 500
+
+
+@dataclass
+class ChecksumStats:
+    hashed: int = 0
+    unchanged: int = 0
+    skipped: int = 0
+    deleted: int = 0
+
+
+class Throttle:
+    """Sleeps as needed to keep reads under a number of bytes per second."""
+
+    def __init__(self, max_bytes_per_second: int):
+        self._rate = max_bytes_per_second
+        self._start = time.monotonic()
+        self._total = 0
+
+    def consume(self, count: int):
+        if not self._rate:
+            return
+        self._total += count
+        delay = self._total / self._rate - (time.monotonic() - self._start)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def hash_file(path: Path, throttle: Throttle) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+            throttle.consume(len(chunk))
+    return digest.hexdigest()
+
+
+def update_checksums() -> ChecksumStats:
+    """
+    Hashes every shared file without an up to date checksum, and removes
+    checksums of files that are no longer shared.
+    """
+    files_root_path: Path = settings.FL_FILES_PATH
+    throttle = Throttle(settings.FL_CHECKSUM_MAX_BYTES_PER_SECOND)
+    stats = ChecksumStats()
+
+    shared_paths: Set[str] = {
+        f"{directory}/{name}" if directory else name
+        for (directory, name) in models.Share.objects.values_list("directory", "name")
+    }
+    checksums = {c.path: c for c in models.FileChecksum.objects.all()}
+
+    for path in sorted(shared_paths):
+        file_path = (files_root_path / path).resolve()
+        if not file_path.is_relative_to(files_root_path):
+            stats.skipped += 1
+            continue
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            stats.skipped += 1
+            continue
+        # Directories are downloaded as archives built on the fly
+        if not S_ISREG(stat.st_mode):
+            stats.skipped += 1
+            continue
+
+        checksum = checksums.get(path)
+        if checksum is not None and checksum.matches(stat):
+            stats.unchanged += 1
+            continue
+
+        try:
+            sha256 = hash_file(file_path, throttle)
+            after = os.stat(file_path)
+        except OSError:
+            stats.skipped += 1
+            continue
+        if (after.st_ino, after.st_size, after.st_mtime_ns) != \
+                (stat.st_ino, stat.st_size, stat.st_mtime_ns):
+            # Changed while being hashed, try again on the next run
+            stats.skipped += 1
+            continue
+
+        models.FileChecksum.objects.update_or_create(path=path, defaults=dict(
+            inode=stat.st_ino,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            sha256=sha256,
+        ))
+        stats.hashed += 1
+
+    stale_ids = [c.id for c in checksums.values()
+                 if c.path not in shared_paths]
+    for i in range(0, len(stale_ids), DELETE_BATCH_SIZE):
+        (deleted, _) = models.FileChecksum.objects.filter(
+            id__in=stale_ids[i:i + DELETE_BATCH_SIZE]).delete()
+        stats.deleted += deleted
+
+    if stats.hashed:
+        # Cached shares hold the checksum they were resolved with
+        actions.invalidate_all_shares()
+    return stats
@@ -0,0 +1,114 @@
+"""
+Deletes shares without collecting their download logs in Python.
+
+actions.delete_shares marks shares as pending deletion, which hides them
+everywhere at once. Their download logs and rollups are then removed in
+batches of set based deletes, each in its own short transaction, followed by
+the shares themselves. This runs on a background thread when
+FL_SHARE_DELETE_IN_BACKGROUND is set, so the request that deleted the shares
+returns right away.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import QuerySet
+
+from shares import models
+from shares.background import BackgroundWorker
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class PurgeStats:
+    shares: int = 0
+    download_logs: int = 0
+
+
+def purge_deleted_shares() -> PurgeStats:
+    """Removes every share pending deletion along with its download logs and rollups."""
+    stats = PurgeStats()
+    share_ids = list(models.Share.all_objects.filter(
+        pending_deletion=True).values_list("id", flat=True))
+    for share_id in share_ids:
+        stats.download_logs += delete_in_batches(
+            models.DownloadLog.objects.filter(share_id=share_id),
+            settings.FL_SHARE_DELETE_BATCH_SIZE,
+            settings.FL_SHARE_DELETE_BATCH_DELAY,
+        )
+        models.DailyDownloadRollup.objects.filter(share_id=share_id).delete()
+        # Logs written since the last batch are few, so the cascade is cheap
+        (_, deleted) = models.Share.all_objects.filter(
+            id=share_id, pending_deletion=True).delete()
+        stats.shares += deleted.get(models.Share._meta.label, 0)
+    return stats
+
+
+def delete_in_batches(queryset: QuerySet, batch_size: int, delay: float) -> int:
+    """
+    Deletes the rows of a queryset in batches, each in its own short
+    transaction, and returns the number of rows deleted.
+    """
+    deleted = 0
+    manager = queryset.model._base_manager
+    while True:
+        pks = list(queryset.order_by("pk").values_list(
+            "pk", flat=True)[:batch_size])
+        if not pks:
+            return deleted
+
+        (count, _) = manager.filter(pk__in=pks).delete()
+        deleted += count
+        # Let requests waiting on the write lock in between batches
+        time.sleep(delay)
+
+
+class SharePurger(BackgroundWorker):
+    """Purges deleted shares from a background thread whenever it is woken."""
+
+    thread_name = "share-purger"
+
+    def __init__(self):
+        super().__init__()
+        self._wake = threading.Event()
+
+    def wake(self):
+        self.ensure_started()
+        self._wake.set()
+
+    def on_start(self):
+        self._wake = threading.Event()
+
+    def on_stop(self):
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait()
+            if self.stopping:
+                return
+            self._wake.clear()
+            try:
+                purge_deleted_shares()
+            except Exception:
+                logger.exception("Failed to purge deleted shares")
+            finally:
+                close_old_connections()
+
+
+_purger: SharePurger | None = None
+_purger_lock = threading.Lock()
+
+
+def get_purger() -> SharePurger:
+    global _purger
+    if _purger is None:
+        with _purger_lock:
+            if _purger is None:
+                _purger = SharePurger()
+    return _purger
@@ -0,0 +1,148 @@
+import logging
+import queue
+import threading
+import time
+from typing import List
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections
+from django.http import HttpRequest
+
+from shares import models
+from shares.background import BackgroundWorker
+
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_DROP = "drop"
+OVERFLOW_WRITE = "write"
+
+
+class DownloadLogWriter(BackgroundWorker):
+    """
+    Queues download logs in memory and writes them in batches from a
+    background thread, so the request thread never waits on the database.
+    """
+
+    thread_name = "download-log-writer"
+
+    def __init__(self, batch_size: int, flush_interval: float, max_queue_size: int, overflow: str):
+        if overflow not in (OVERFLOW_DROP, OVERFLOW_WRITE):
+            raise ValueError(
+                f"Unknown download log overflow policy: {overflow}")
+
+        super().__init__()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.overflow = overflow
+        self.dropped = 0
+
+        self._lock = threading.Lock()
+        self._queue: queue.Queue[models.DownloadLog] = queue.Queue(
+            maxsize=max_queue_size)
+
+    def log(self, download_log: models.DownloadLog):
+        if not self._enqueue(download_log):
+            download_log.save()
+
+    async def alog(self, download_log: models.DownloadLog):
+        if not self._enqueue(download_log):
+            await download_log.asave()
+
+    def _enqueue(self, download_log: models.DownloadLog) -> bool:
+        """Returns False if the caller needs to write the log itself."""
+        self.ensure_started()
+        try:
+            self._queue.put_nowait(download_log)
+        except queue.Full:
+            if self.overflow == OVERFLOW_WRITE:
+                return False
+            with self._lock:
+                self.dropped += 1
+            logger.warning("Download log queue is full, dropping log")
+        return True
+
+    def flush(self):
+        """Write everything currently queued from the calling thread."""
+        while batch := self._take_batch(block=False):
+            self._write(batch)
+
+    def shutdown(self):
+        super().shutdown(timeout=self.flush_interval * 2)
+        self.flush()
+
+    def on_start(self):
+        # Logs queued before a fork belong to the parent
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+
+    def run(self):
+        while not self.stopping:
+            if batch := self._take_batch(block=True):
+                self._write(batch)
+
+    def _take_batch(self, block: bool) -> List[models.DownloadLog]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if block:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    batch.append(self._queue.get(timeout=timeout))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[models.DownloadLog]):
+        try:
+            try:
+                models.DownloadLog.objects.bulk_create(batch)
+            except IntegrityError:
+                # A share was deleted while its logs were queued, so drop the
+                # orphaned logs and write the rest.
+                share_ids = set(models.Share.objects.filter(
+                    id__in={log.share_id for log in batch}).values_list("id", flat=True))
+                models.DownloadLog.objects.bulk_create(
+                    [log for log in batch if log.share_id in share_ids])
+        except Exception:
+            logger.exception("Failed to write %d download logs", len(batch))
+        finally:
+            close_old_connections()
+
+
+_writer: DownloadLogWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> DownloadLogWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = DownloadLogWriter(
+                    batch_size=settings.FL_DOWNLOAD_LOG_BATCH_SIZE,
+                    flush_interval=settings.FL_DOWNLOAD_LOG_FLUSH_INTERVAL,
+                    max_queue_size=settings.FL_DOWNLOAD_LOG_QUEUE_SIZE,
+                    overflow=settings.FL_DOWNLOAD_LOG_OVERFLOW,
+                )
+    return _writer
+
+
+def log_download(request: HttpRequest, share_id: int):
+    download_log = models.DownloadLog.from_request(request, share_id)
+    if settings.FL_DOWNLOAD_LOG_BUFFERED:
+        get_writer().log(download_log)
+    else:
+        download_log.save()
+
+
+async def alog_download(request: HttpRequest, share_id: int):
+    download_log = models.DownloadLog.from_request(request, share_id)
+    if settings.FL_DOWNLOAD_LOG_BUFFERED:
+        await get_writer().alog(download_log)
+    else:
+        await download_log.asave()
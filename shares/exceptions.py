@@ -1,2 +1,10 @@
 class InvalidRequestPathException(Exception):
     pass
+
+
+class TooManyFilesException(Exception):
+    pass
+
+
+class FilesRootUnavailableException(Exception):
+    pass
@@ -0,0 +1,113 @@
+"""
+Streams download logs out as CSV or NDJSON.
+
+Rows are read with a server side cursor as plain tuples, with the share's
+path joined in the same query, so memory use stays flat however many logs
+are exported.
+"""
+import csv
+import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from shares import models
+
+
+CHUNK_SIZE = 2000
+# Rows are written out in batches, so a response is not one tiny chunk per row
+ROWS_PER_CHUNK = 500
+
+FIELDS = ("id", "timestamp", "share_id", "path",
+          "ip", "user_agent", "range_header")
+
+
+def parse_time(value: str) -> datetime.datetime:
+    """Parses an ISO 8601 date or time, in the current time zone if it has none."""
+    parsed = parse_datetime(value)
+    if parsed is None and (date := parse_date(value)) is not None:
+        parsed = datetime.datetime.combine(date, datetime.time.min)
+    if parsed is None:
+        raise ValueError(f"Invalid date or time: {value}")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def get_download_logs(start: datetime.datetime | None = None, end: datetime.datetime | None = None,
+                      share_id: int | None = None) -> QuerySet:
+    """Download logs from start up to but excluding end, oldest first."""
+    logs = models.DownloadLog.objects.all()
+    if start is not None:
+        logs = logs.filter(timestamp__gte=start)
+    if end is not None:
+        logs = logs.filter(timestamp__lt=end)
+    if share_id is not None:
+        logs = logs.filter(share_id=share_id)
+    return select_rows(logs)
+
+
+def select_rows(logs: QuerySet) -> QuerySet:
+    """Selects the exported fields of download logs, oldest first."""
+    return logs.order_by("id").values_list(
+        "id", "timestamp", "share_id", "share__directory", "share__name",
+        "ip", "user_agent", "range_header")
+
+
+def iter_rows(logs: QuerySet) -> Iterator[Tuple[Any, ...]]:
+    """Iterates the rows of logs from select_rows, with values in FIELDS order."""
+    for (log_id, timestamp, share_id, directory, name, ip, user_agent, range_header) in \
+            logs.iterator(chunk_size=CHUNK_SIZE):
+        path = f"{directory}/{name}" if directory else name
+        yield (log_id, timestamp.isoformat(), share_id, path, ip, user_agent, range_header)
+
+
+_ndjson_encoder = DjangoJSONEncoder(separators=(",", ":"))
+
+
+def encode_ndjson(row: Tuple[Any, ...]) -> str:
+    return _ndjson_encoder.encode(dict(zip(FIELDS, row))) + "\n"
+
+
+class _Buffer:
+    """A file-like object that keeps what csv.writer writes to it."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, value: str):
+        self.parts.append(value)
+
+    def take(self) -> str:
+        value = "".join(self.parts)
+        self.parts.clear()
+        return value
+
+
+def iter_csv(logs: QuerySet) -> Iterator[str]:
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    for (i, row) in enumerate(iter_rows(logs), 1):
+        writer.writerow(row)
+        if i % ROWS_PER_CHUNK == 0:
+            yield buffer.take()
+    yield buffer.take()
+
+
+def iter_ndjson(logs: QuerySet) -> Iterator[str]:
+    lines = []
+    for row in iter_rows(logs):
+        lines.append(encode_ndjson(row))
+        if len(lines) == ROWS_PER_CHUNK:
+            yield "".join(lines)
+            lines.clear()
+    yield "".join(lines)
+
+
+# Content type and writer for each export format
+FORMATS: Dict[str, Tuple[str, Callable[[QuerySet], Iterable[str]]]] = {
+    "csv": ("text/csv; charset=utf-8", iter_csv),
+    "ndjson": ("application/x-ndjson", iter_ndjson),
+}
@@ -1,9 +1,62 @@
 from django import forms
+from django.core.exceptions import ValidationError
 
-from shares import models
+from shares import actions, models
+from shares.exceptions import InvalidRequestPathException
 
 
 class ShareForm(forms.ModelForm):
     class Meta:
         model = models.Share
-        fields = ["directory", "name", "download_enabled", "force_download"]
+        fields = ["directory", "name", "download_enabled",
+                  "force_download", "cache_max_age", "compress_archive"]
+
+    def clean_cache_max_age(self):
+        return self.cleaned_data["cache_max_age"] or 0
+
+    def clean(self):
+        cleaned_data = super().clean()
+        directory = cleaned_data.get("directory", "")
+        name = cleaned_data.get("name")
+        if name is None:
+            return cleaned_data
+
+        if "/" in name or name in (".", ".."):
+            self.add_error(
+                "name", "Enter the name of a file or directory, without slashes.")
+            return cleaned_data
+        try:
+            actions.get_share_file_path(
+                f"{directory}/{name}" if directory else name)
+        except InvalidRequestPathException:
+            self.add_error(
+                "directory", "The shared path must be inside the files directory.")
+        return cleaned_data
+
+    def validate_unique(self):
+        super().validate_unique()
+        if self.has_error("directory") or self.has_error("name"):
+            return
+
+        # Model validation skips the unique path constraint, since its
+        # condition is on a field that is not in the form.
+        [constraint] = [c for c in models.Share._meta.constraints
+                        if c.name == "unique_path"]
+        try:
+            constraint.validate(models.Share, self.instance)
+        except ValidationError as e:
+            self.add_error(None, e)
+
+
+class BulkShareForm(forms.Form):
+    download_enabled = forms.BooleanField(required=False)
+    force_download = forms.BooleanField(required=False)
+    cache_max_age = forms.IntegerField(min_value=0, required=False)
+
+    def clean_cache_max_age(self):
+        return self.cleaned_data["cache_max_age"] or 0
+
+
+class BulkShareActionForm(forms.Form):
+    action = forms.ChoiceField(choices=[(action, action.capitalize())
+                                        for action in actions.BULK_ACTIONS])
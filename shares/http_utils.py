@@ -0,0 +1,152 @@
+import hashlib
+import os
+import re
+from typing import Any, Awaitable, Callable, Iterable, List, Tuple, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+from django.utils.http import parse_http_date_safe
+
+
+MAX_RANGES = 50
+
+_RANGE_SPEC_RE = re.compile(r"^(\d*)-(\d*)$")
+
+
+def stat_etag(stat: os.stat_result) -> str:
+    """Builds a strong ETag from a file's inode, size and modification time."""
+    return f"\"{stat.st_ino:x}-{stat.st_size:x}-{stat.st_mtime_ns:x}\""
+
+
+def hash_etag(*parts: Any) -> str:
+    """Builds a strong ETag from a hash of the values a response depends on."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    return f"\"{digest}\""
+
+
+def parse_range_header(header: str, size: int) -> List[Tuple[int, int]] | None:
+    """
+    Parses a bytes Range header into a sorted list of inclusive (start, end)
+    ranges, merging any that overlap or touch. Returns None if the header
+    should be ignored, and an empty list if no range can be satisfied.
+    """
+    (unit, _, specs) = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    ranges = []
+    for spec in specs.split(","):
+        if not (match := _RANGE_SPEC_RE.match(spec.strip())):
+            return None
+
+        (first, last) = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+            if last and int(last) < start:
+                return None
+        elif last:
+            # Suffix range for the last N bytes
+            start = max(size - int(last), 0)
+            end = size - 1
+            if int(last) == 0:
+                continue
+        else:
+            return None
+
+        if start < size:
+            ranges.append((start, end))
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    merged: List[Tuple[int, int]] = []
+    for (start, end) in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def if_range_matches(header: str | None, etag: str, mtime: float) -> bool:
+    """Checks an If-Range header against the current validators."""
+    if header is None:
+        return True
+
+    header = header.strip()
+    if header.startswith("\"") or header.startswith("W/"):
+        # Weak tags never match for If-Range
+        return header == etag
+
+    header_time = parse_http_date_safe(header)
+    return header_time is not None and int(mtime) == header_time
+
+
+T = TypeVar("T")
+
+
+def run_in_thread(func: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """
+    Wraps blocking work to run in any pool thread, rather than the one thread
+    Django's sync code shares. Database connections the threads open are
+    closed once past CONN_MAX_AGE or unusable, as at the end of a request.
+    """
+    def call(*args: Any, **kwargs: Any) -> T:
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+class ThreadedAsyncIterator:
+    """
+    Iterates a blocking iterable in a thread, so ASGI servers can stream it
+    without Django reading the whole thing into memory first.
+    """
+
+    def __init__(self, iterable: Iterable[bytes]):
+        self._iterable = iterable
+
+    async def __aiter__(self):
+        iterator = iter(self._iterable)
+        next_chunk = sync_to_async(next, thread_sensitive=False)
+        while (chunk := await next_chunk(iterator, None)) is not None:
+            yield chunk
+
+    def close(self):
+        if hasattr(self._iterable, "close"):
+            self._iterable.close()
+
+
+def streaming_content(request: HttpRequest, iterable: Iterable[bytes]) -> Iterable[bytes]:
+    """Wraps streamed content to be iterated in a thread when serving ASGI."""
+    if isinstance(request, ASGIRequest):
+        return ThreadedAsyncIterator(iterable)
+    return iterable
+
+
+def close_with_response(response: HttpResponseBase, on_close: Callable[[], None]):
+    """
+    Calls on_close once when the server closes a response, after its content
+    has been sent. The content is left in place, so a FileResponse can still
+    be sent with wsgi.file_wrapper.
+    """
+    close = response.close
+    closed = False
+
+    def close_and_call():
+        nonlocal closed
+        try:
+            close()
+        finally:
+            if not closed:
+                closed = True
+                on_close()
+
+    response.close = close_and_call
@@ -0,0 +1,139 @@
+"""
+Indexes FL_FILES_PATH into FileEntry rows, so listings can be served from the
+database instead of the filesystem.
+
+Rescans are incremental: a directory whose mtime has not changed since it was
+last scanned still has the same entries, so only its subdirectories are
+checked. Changes to a file's contents that are not made by replacing the file
+do not change its directory's mtime, and are only picked up by a full scan.
+"""
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Set, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from shares import models
+
+
+@dataclass
+class IndexStats:
+    scanned_directories: int = 0
+    skipped_directories: int = 0
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+
+def _join(parent: str, name: str) -> str:
+    return f"{parent}/{name}" if parent else name
+
+
+def index_files(full: bool = False) -> IndexStats:
+    """
+    Brings the index up to date with FL_FILES_PATH, rescanning every directory
+    if full is set, and returns counts of what changed.
+    """
+    files_root_path: Path = settings.FL_FILES_PATH
+    stats = IndexStats()
+
+    root = models.FileEntry.objects.filter(path="").first()
+    if root is None:
+        root = models.FileEntry.objects.create(
+            path="", parent=None, name="", is_dir=True)
+        stats.created += 1
+
+    # Directories to visit, with their mtime as of their last scan
+    pending = [(root.path, root.mtime_ns)]
+    while pending:
+        (path, indexed_mtime_ns) = pending.pop()
+        try:
+            mtime_ns = os.stat(files_root_path / path).st_mtime_ns
+        except OSError:
+            # Removed since its parent was scanned, the next scan of the
+            # parent will remove it from the index
+            continue
+
+        if mtime_ns == indexed_mtime_ns and not full:
+            stats.skipped_directories += 1
+            pending.extend(models.FileEntry.objects.filter(
+                parent=path, is_dir=True).values_list("path", "mtime_ns"))
+        else:
+            stats.scanned_directories += 1
+            pending.extend(_scan_directory(
+                files_root_path, path, mtime_ns, stats))
+    return stats
+
+
+def _scan_directory(files_root_path: Path, path: str, mtime_ns: int, stats: IndexStats) -> List[Tuple[str, int]]:
+    """Syncs the entries of one directory, and returns its subdirectories."""
+    found: Dict[str, models.FileEntry] = {}
+    # Symlinked directories are listed, but not followed
+    followed: Set[str] = set()
+    try:
+        with os.scandir(files_root_path / path) as scan:
+            for f in scan:
+                try:
+                    is_dir = f.is_dir()
+                    stat = f.stat()
+                except OSError:
+                    continue
+                if not is_dir and not f.is_file():
+                    continue
+                if is_dir and not f.is_symlink():
+                    followed.add(f.name)
+
+                found[f.name] = models.FileEntry(
+                    path=_join(path, f.name),
+                    parent=path,
+                    name=f.name,
+                    is_dir=is_dir,
+                    size=0 if is_dir else stat.st_size,
+                    mtime_ns=0 if is_dir else stat.st_mtime_ns,
+                    inode=stat.st_ino,
+                )
+    except OSError:
+        return []
+
+    with transaction.atomic():
+        indexed = {
+            e.name: e for e in models.FileEntry.objects.filter(parent=path)}
+
+        removed = [e for (name, e) in indexed.items()
+                   if name not in found or e.is_dir != found[name].is_dir]
+        for entry in removed:
+            if entry.is_dir:
+                # A range rather than startswith, since LIKE ignores case in SQLite
+                (deleted, _) = models.FileEntry.objects.filter(
+                    path__gt=f"{entry.path}/", path__lt=f"{entry.path}0").delete()
+                stats.deleted += deleted
+            indexed.pop(entry.name)
+        if removed:
+            (deleted, _) = models.FileEntry.objects.filter(
+                id__in=[e.id for e in removed]).delete()
+            stats.deleted += deleted
+
+        created = [e for (name, e) in found.items() if name not in indexed]
+        models.FileEntry.objects.bulk_create(created, batch_size=500)
+        stats.created += len(created)
+
+        # Directory mtimes are only updated once their own entries are scanned
+        updated = []
+        for (name, entry) in indexed.items():
+            new_entry = found[name]
+            if (entry.size, entry.inode) != (new_entry.size, new_entry.inode) or \
+                    (not entry.is_dir and entry.mtime_ns != new_entry.mtime_ns):
+                (entry.size, entry.inode) = (new_entry.size, new_entry.inode)
+                if not entry.is_dir:
+                    entry.mtime_ns = new_entry.mtime_ns
+                updated.append(entry)
+        models.FileEntry.objects.bulk_update(
+            updated, ("size", "mtime_ns", "inode"), batch_size=500)
+        stats.updated += len(updated)
+
+        models.FileEntry.objects.filter(path=path).update(mtime_ns=mtime_ns)
+
+    return [(found[name].path, indexed[name].mtime_ns if name in indexed else 0)
+            for name in followed]
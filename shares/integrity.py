@@ -0,0 +1,111 @@
+"""
+Checks that shared files still exist, without downloading them.
+
+Every share's target is stat'ed from a thread pool, since on network mounts
+each stat is a round trip and checking shares one at a time would take
+minutes. Files that have been hashed by hash_files also have their inode,
+size and mtime compared against those recorded with the checksum.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from stat import S_ISDIR
+from typing import List, Tuple
+
+from django.conf import settings
+
+from shares import actions, models
+from shares.exceptions import FilesRootUnavailableException
+
+
+MISSING = "missing"
+BECAME_DIRECTORY = "became directory"
+CHANGED = "changed"
+# Errors other than the file not existing, such as a stalled network mount
+ERROR = "error"
+
+
+@dataclass
+class ShareProblem:
+    share_id: int
+    path: str
+    problem: str
+    detail: str = ""
+
+
+@dataclass
+class IntegrityReport:
+    checked: int = 0
+    problems: List[ShareProblem] = field(default_factory=list)
+    # Why the files root itself could not be listed, if it could not
+    files_root_error: str | None = None
+
+    def get_share_ids(self, problem: str) -> List[int]:
+        return [p.share_id for p in self.problems if p.problem == problem]
+
+
+# Share ID, path, and the inode, size and mtime recorded with its checksum
+_Target = Tuple[int, str, Tuple[int, int, int] | None]
+
+
+def check_shares(max_workers: int) -> IntegrityReport:
+    files_root_path: Path = settings.FL_FILES_PATH
+    baselines = {path: (inode, size, mtime_ns) for (path, inode, size, mtime_ns) in
+                 models.FileChecksum.objects.values_list("path", "inode", "size", "mtime_ns")}
+    targets: List[_Target] = []
+    for (share_id, directory, name) in models.Share.objects.order_by("id").values_list(
+            "id", "directory", "name"):
+        path = f"{directory}/{name}" if directory else name
+        targets.append((share_id, path, baselines.get(path)))
+
+    report = IntegrityReport(checked=len(targets))
+    try:
+        with os.scandir(files_root_path) as scan:
+            if next(scan, None) is None:
+                report.files_root_error = "Empty directory"
+    except OSError as e:
+        report.files_root_error = e.strerror or str(e)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="check-shares") as executor:
+        for problem in executor.map(lambda target: _check_target(files_root_path, target), targets):
+            if problem is not None:
+                report.problems.append(problem)
+    return report
+
+
+def _check_target(files_root_path: Path, target: _Target) -> ShareProblem | None:
+    (share_id, path, baseline) = target
+    try:
+        stat = os.stat(files_root_path / path)
+    except (FileNotFoundError, NotADirectoryError):
+        return ShareProblem(share_id, path, MISSING)
+    except OSError as e:
+        return ShareProblem(share_id, path, ERROR, e.strerror or str(e))
+
+    if baseline is None:
+        return None
+    # Only files are hashed, so a directory with a checksum used to be a file
+    if S_ISDIR(stat.st_mode):
+        return ShareProblem(share_id, path, BECAME_DIRECTORY)
+    (inode, size, mtime_ns) = baseline
+    changes = []
+    if stat.st_ino != inode:
+        changes.append("replaced")
+    if stat.st_size != size:
+        changes.append(f"size {size} -> {stat.st_size}")
+    if stat.st_mtime_ns != mtime_ns:
+        changes.append("modified")
+    return ShareProblem(share_id, path, CHANGED, ", ".join(changes)) if changes else None
+
+
+def disable_missing_shares(report: IntegrityReport) -> int:
+    """
+    Disables downloads of the shares whose files are missing, and returns how
+    many were enabled before. Refuses to when the files root itself is empty
+    or unreadable, as with an unmounted volume every share looks missing.
+    """
+    if report.files_root_error is not None:
+        raise FilesRootUnavailableException(report.files_root_error)
+    return actions.set_shares_enabled(models.Share.objects.filter(
+        id__in=report.get_share_ids(MISSING), download_enabled=True), False)
@@ -0,0 +1,25 @@
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from shares import retention
+
+
+class Command(BaseCommand):
+    help = "Move rolled up download logs older than the retention period to archive files"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--retention-days", type=int, default=settings.FL_DOWNLOAD_LOG_RETENTION_DAYS,
+                            help="Archive logs older than this many days (default: FL_DOWNLOAD_LOG_RETENTION_DAYS)")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        try:
+            stats = retention.archive_download_logs(options["retention_days"])
+        except retention.AlreadyRunningException:
+            raise CommandError("Download logs are already being archived")
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {stats.archived} download logs to {stats.files} files, "
+            f"deleted {stats.deleted}"))
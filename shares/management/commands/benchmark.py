@@ -0,0 +1,63 @@
+import json
+import tempfile
+from pathlib import Path
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from shares import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Benchmark the download and browsing views against synthetic data in a test database"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--depth", type=int, default=2,
+                            help="Depth of the generated directory tree")
+        parser.add_argument("--fanout", type=int, default=5,
+                            help="Subdirectories per directory")
+        parser.add_argument("--files-per-directory", type=int, default=200)
+        parser.add_argument("--file-size", type=int, default=1024,
+                            help="Size of each generated file in bytes")
+        parser.add_argument("--shares", type=int, default=1000)
+        parser.add_argument("--logs", type=int, default=100000,
+                            help="Number of download logs to generate")
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Measured requests per view")
+        parser.add_argument("--warmup", type=int, default=20,
+                            help="Unmeasured requests per view before measuring")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", type=Path,
+                            help="File to write the JSON results to")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as temp_dir:
+                results = benchmarks.run_benchmarks(
+                    Path(temp_dir).resolve(),
+                    depth=options["depth"],
+                    fanout=options["fanout"],
+                    files_per_directory=options["files_per_directory"],
+                    file_size=options["file_size"],
+                    share_count=options["shares"],
+                    log_count=options["logs"],
+                    requests=options["requests"],
+                    warmup=options["warmup"],
+                    seed=options["seed"],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(results, indent=2)
+        if options["output"]:
+            options["output"].write_text(output)
+            self.stdout.write(self.style.SUCCESS(
+                f"Results written to {options["output"]}"))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,26 @@
+import json
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from shares import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Measure requests per second and latency of a running server"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("urls", nargs="+", metavar="url",
+                            help="URLs to request, e.g. a download link")
+        parser.add_argument("--concurrency", type=int, default=16,
+                            help="Number of concurrent connections")
+        parser.add_argument("--duration", type=float, default=10,
+                            help="Seconds to run each URL for")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        results = {
+            url: benchmarks.load_test_url(
+                url, options["concurrency"], options["duration"])
+            for url in options["urls"]
+        }
+        self.stdout.write(json.dumps(results, indent=2))
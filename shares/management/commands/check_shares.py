@@ -0,0 +1,45 @@
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from shares import integrity
+from shares.exceptions import FilesRootUnavailableException
+
+
+class Command(BaseCommand):
+    help = "Report shares whose files are missing, became directories, or changed since they were hashed"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--workers", type=int, default=settings.FL_SHARE_CHECK_WORKERS,
+                            help="Number of files to stat at a time (default: FL_SHARE_CHECK_WORKERS)")
+        parser.add_argument("--disable-missing", action="store_true",
+                            help="Disable downloads of shares whose files are missing, unless the files directory "
+                            "is empty or cannot be read")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        report = integrity.check_shares(options["workers"])
+        for problem in report.problems:
+            line = f"{problem.share_id}\t{problem.problem}\t{problem.path}"
+            if problem.detail:
+                line += f"\t{problem.detail}"
+            self.stdout.write(line)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {report.checked} shares: "
+            f"{len(report.get_share_ids(integrity.MISSING))} missing, "
+            f"{len(report.get_share_ids(integrity.BECAME_DIRECTORY))} became directories, "
+            f"{len(report.get_share_ids(integrity.CHANGED))} changed, "
+            f"{len(report.get_share_ids(integrity.ERROR))} errors"))
+        if report.files_root_error is not None:
+            self.stderr.write(
+                f"Files directory {settings.FL_FILES_PATH}: {report.files_root_error}")
+
+        if options["disable_missing"]:
+            try:
+                disabled = integrity.disable_missing_shares(report)
+            except FilesRootUnavailableException:
+                raise CommandError(
+                    "Not disabling any shares, as the files directory is empty or cannot be read")
+            self.stdout.write(self.style.SUCCESS(
+                f"Disabled {disabled} shares"))
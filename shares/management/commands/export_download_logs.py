@@ -0,0 +1,44 @@
+import argparse
+import datetime
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from shares import exports
+
+
+def _parse_time(value: str) -> datetime.datetime:
+    try:
+        return exports.parse_time(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+class Command(BaseCommand):
+    help = "Export download logs as CSV or NDJSON"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--format", choices=exports.FORMATS.keys(), default="csv",
+                            help="Output format")
+        parser.add_argument("--start", type=_parse_time,
+                            help="Only export downloads at or after this date or ISO 8601 time")
+        parser.add_argument("--end", type=_parse_time,
+                            help="Only export downloads before this date or ISO 8601 time")
+        parser.add_argument("--share", type=int,
+                            help="Only export downloads of the share with this ID")
+        parser.add_argument(
+            "--output", help="File to write to instead of stdout")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        (_, write_logs) = exports.FORMATS[options["format"]]
+        logs = exports.get_download_logs(
+            options["start"], options["end"], options["share"])
+
+        if not options["output"]:
+            for chunk in write_logs(logs):
+                self.stdout.write(chunk, ending="")
+            return
+
+        with open(options["output"], "w", newline="", encoding="utf-8") as output:
+            for chunk in write_logs(logs):
+                output.write(chunk)
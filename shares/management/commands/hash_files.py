@@ -0,0 +1,30 @@
+import time
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from shares import checksums
+
+
+class Command(BaseCommand):
+    help = "Compute checksums of shared files that are new or have changed"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--watch", action="store_true",
+                            help="Keep running and check for changes every FL_CHECKSUM_INTERVAL seconds")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        while True:
+            start = time.monotonic()
+            stats = checksums.update_checksums()
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated checksums in {time.monotonic() - start:.2f}s: "
+                f"{stats.hashed} files hashed, "
+                f"{stats.unchanged} unchanged, "
+                f"{stats.skipped} skipped, "
+                f"{stats.deleted} deleted"))
+
+            if not options["watch"]:
+                return
+            time.sleep(settings.FL_CHECKSUM_INTERVAL)
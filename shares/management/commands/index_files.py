@@ -0,0 +1,35 @@
+import time
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from shares import indexer
+
+
+class Command(BaseCommand):
+    help = "Update the index of the files directory"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--full", action="store_true",
+                            help="Rescan every directory, including unchanged ones")
+        parser.add_argument("--watch", action="store_true",
+                            help="Keep running and rescan every FL_INDEX_INTERVAL seconds")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        full = options["full"]
+        while True:
+            start = time.monotonic()
+            stats = indexer.index_files(full=full)
+            self.stdout.write(self.style.SUCCESS(
+                f"Indexed files in {time.monotonic() - start:.2f}s: "
+                f"{stats.scanned_directories} directories scanned, "
+                f"{stats.skipped_directories} unchanged, "
+                f"{stats.created} entries created, "
+                f"{stats.updated} updated, "
+                f"{stats.deleted} deleted"))
+
+            if not options["watch"]:
+                return
+            full = False
+            time.sleep(settings.FL_INDEX_INTERVAL)
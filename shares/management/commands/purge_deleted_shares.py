@@ -0,0 +1,14 @@
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand
+
+from shares import deletion
+
+
+class Command(BaseCommand):
+    help = "Remove deleted shares and their download logs, e.g. those left by a restarted worker"
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        stats = deletion.purge_deleted_shares()
+        self.stdout.write(self.style.SUCCESS(
+            f"Purged {stats.shares} deleted shares and {stats.download_logs} download logs"))
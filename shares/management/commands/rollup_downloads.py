@@ -0,0 +1,14 @@
+from typing import Any, Optional
+
+from django.core.management.base import BaseCommand
+
+from shares import rollups
+
+
+class Command(BaseCommand):
+    help = "Fold new download logs into the daily download rollups"
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        updated = rollups.update_daily_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated {updated} daily download rollups"))
@@ -0,0 +1,41 @@
+from typing import Any, Optional
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from shares import startup
+
+
+class Command(BaseCommand):
+    help = "Prepare the app to start, only migrating and collecting static files when something changed"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--check-import-time", action="store_true",
+                            help="Fail if importing filelink.wsgi takes longer than FL_WSGI_IMPORT_BUDGET")
+
+    def handle(self, *args: Any, **options: Any) -> Optional[str]:
+        call_command("generate_secret_key", stdout=self.stdout)
+
+        if (pending := startup.get_pending_migrations()):
+            self.stdout.write(f"Applying {len(pending)} migrations...")
+            call_command("migrate", interactive=False, stdout=self.stdout)
+        else:
+            self.stdout.write(self.style.SUCCESS("No migrations to apply"))
+
+        digest = startup.get_static_files_digest()
+        if startup.static_files_changed(digest):
+            self.stdout.write("Collecting static files...")
+            call_command("collectstatic", interactive=False,
+                         verbosity=0, stdout=self.stdout)
+            startup.record_static_files_digest(digest)
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                "Static files are up to date"))
+
+        if options["check_import_time"]:
+            import_time = startup.measure_import_time("filelink.wsgi")
+            self.stdout.write(f"Imported filelink.wsgi in {import_time:.3f}s")
+            if import_time > settings.FL_WSGI_IMPORT_BUDGET:
+                raise CommandError(
+                    f"Importing filelink.wsgi took longer than the {settings.FL_WSGI_IMPORT_BUDGET}s budget")
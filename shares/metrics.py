@@ -0,0 +1,305 @@
+"""
+Prometheus style metrics. Each process records metrics in memory and
+periodically writes a snapshot to FL_METRICS_DIR, and the metrics endpoint
+sums the snapshots of every process, so uwsgi workers report together.
+
+Snapshots are named after the process ID and the time the process started
+recording, since PIDs are reused once workers restart. Snapshots of processes
+that have exited are merged into one file of retired totals, so counters
+never go backwards and the directory does not grow with every restart.
+"""
+import fcntl
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.http import HttpRequest, HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+
+from shares import actions, auth
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1,
+                    0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "filelink_requests_total": ("counter", "Requests handled, by view and status code."),
+    "filelink_request_duration_seconds": ("histogram", "Time spent handling requests, by view."),
+    "filelink_db_queries_total": ("counter", "Database queries run while handling requests, by view."),
+    "filelink_db_query_duration_seconds_total": ("counter", "Time spent running database queries, by view."),
+    "filelink_downloads_total": ("counter", "Downloads served, by share ID."),
+    "filelink_download_rejections_total": ("counter", "Download requests that were rejected, by reason."),
+    "filelink_cache_hits_total": ("counter", "Cache hits, by cache."),
+    "filelink_cache_misses_total": ("counter", "Cache misses, by cache."),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+RETIRED_FILENAME = "retired.json"
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._last_write = 0.0
+        self._pid: int | None = None
+        self._snapshot_name = ""
+
+    def inc(self, name: str, value: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            # Bucket counts, then the sum and count of observations
+            histogram = self._histograms.setdefault(
+                key, [0] * (len(DURATION_BUCKETS) + 2))
+            for (i, bound) in enumerate(DURATION_BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = [[name, list(labels), value]
+                        for ((name, labels), value) in self._counters.items()]
+            histograms = [[name, list(labels), list(values)]
+                          for ((name, labels), values) in self._histograms.items()]
+
+        for (cache_name, cache) in (("share", actions.share_cache), ("listing", actions.listing_cache),
+                                    ("user", auth.user_cache)):
+            counters.append(["filelink_cache_hits_total", [
+                            ["cache", cache_name]], cache.hits])
+            counters.append(["filelink_cache_misses_total", [
+                            ["cache", cache_name]], cache.misses])
+        return dict(counters=counters, histograms=histograms)
+
+    def maybe_write(self):
+        if time.monotonic() - self._last_write >= settings.FL_METRICS_WRITE_INTERVAL:
+            self.write()
+
+    def write(self):
+        self._last_write = time.monotonic()
+        metrics_dir: Path = settings.FL_METRICS_DIR
+        try:
+            metrics_dir.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=metrics_dir, suffix=".tmp", delete=False) as f:
+                json.dump(self.snapshot(), f)
+            os.replace(f.name, metrics_dir / self._get_snapshot_name())
+        except OSError:
+            logger.warning("Unable to write metrics to %s",
+                           metrics_dir, exc_info=True)
+
+    def _get_snapshot_name(self) -> str:
+        # uwsgi forks workers after the app is loaded, so each one picks its
+        # own name the first time it writes
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._snapshot_name = f"{self._pid}-{time.time_ns()}.json"
+        return self._snapshot_name
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+def _get_snapshot_pid(path: Path) -> int | None:
+    try:
+        return int(path.stem.split("-")[0])
+    except ValueError:
+        return None
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshot(path: Path) -> Dict[str, Any] | None:
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError):
+        logger.warning("Unable to read metrics from %s",
+                       path, exc_info=True)
+        return None
+
+
+def _retire_snapshots(metrics_dir: Path):
+    """
+    Merges the snapshots of processes that have exited into the retired
+    totals, and deletes them. A PID that has been reused keeps its old
+    snapshot around until the new process exits too, which is harmless.
+    """
+    dead_paths = [path for path in metrics_dir.glob("*.json")
+                  if (pid := _get_snapshot_pid(path)) is not None and not _is_running(pid)]
+    if not dead_paths:
+        return
+
+    retired_path = metrics_dir / RETIRED_FILENAME
+    retired = _read_snapshot(retired_path) or dict(counters=[], histograms=[])
+    # Snapshots already merged by a run that stopped before deleting them
+    merged = set(retired.get("merged", []))
+    snapshots = [retired]
+    for path in dead_paths:
+        if path.name not in merged and (snapshot := _read_snapshot(path)) is not None:
+            snapshots.append(snapshot)
+    (counters, histograms) = _sum_snapshots(snapshots)
+
+    with tempfile.NamedTemporaryFile("w", dir=metrics_dir, suffix=".tmp", delete=False) as f:
+        json.dump(dict(
+            counters=[[name, list(labels), value]
+                      for ((name, labels), value) in counters.items()],
+            histograms=[[name, list(labels), values] for (
+                (name, labels), values) in histograms.items()],
+            merged=[path.name for path in dead_paths],
+        ), f)
+    os.replace(f.name, retired_path)
+    for path in dead_paths:
+        path.unlink(missing_ok=True)
+
+
+def _read_snapshots() -> List[Dict[str, Any]]:
+    registry.write()
+    metrics_dir = Path(settings.FL_METRICS_DIR)
+    snapshots = []
+    try:
+        # Readers retire snapshots too, so they take turns, or one could sum
+        # a snapshot along with the retired totals it was just merged into
+        with open(metrics_dir / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            _retire_snapshots(metrics_dir)
+            snapshots = [snapshot for path in metrics_dir.glob("*.json")
+                         if (snapshot := _read_snapshot(path)) is not None]
+    except OSError:
+        logger.warning("Unable to read metrics from %s",
+                       metrics_dir, exc_info=True)
+    return snapshots or [registry.snapshot()]
+
+
+def _sum_snapshots(snapshots: List[Dict[str, Any]]) -> \
+        Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], List[float]]]:
+    counters: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], List[float]] = {}
+    for snapshot in snapshots:
+        for (name, labels, value) in snapshot["counters"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for (name, labels, values) in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            histograms[key] = [a + b for (a, b) in zip(
+                histograms.get(key, [0] * len(values)), values)]
+    return (counters, histograms)
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return "{" + ",".join(f"{name}=\"{escape(value)}\"" for (name, value) in labels) + "}"
+
+
+def render() -> str:
+    """Renders the metrics of all processes in the text exposition format."""
+    (counters, histograms) = _sum_snapshots(_read_snapshots())
+
+    lines = []
+    for (metric_name, (metric_type, metric_help)) in METRICS.items():
+        lines.append(f"# HELP {metric_name} {metric_help}")
+        lines.append(f"# TYPE {metric_name} {metric_type}")
+        for ((name, labels), value) in sorted(counters.items()):
+            if name == metric_name:
+                lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for ((name, labels), values) in sorted(histograms.items()):
+            if name != metric_name:
+                continue
+            cumulative = 0
+            for (bound, count) in zip(DURATION_BUCKETS, values):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels + (("le", str(bound)),))} {cumulative:g}")
+            lines.append(
+                f"{name}_bucket{_format_labels(labels + (("le", "+Inf"),))} {values[-1]:g}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {values[-2]:g}")
+            lines.append(
+                f"{name}_count{_format_labels(labels)} {values[-1]:g}")
+    return "\n".join(lines) + "\n"
+
+
+class _QueryRecorder:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - start
+
+
+def _record_request(request: HttpRequest, response: HttpResponse, duration: float, queries: _QueryRecorder):
+    match = request.resolver_match
+    view = match.view_name if match else "unmatched"
+    registry.inc("filelink_requests_total", view=view,
+                 status=str(response.status_code))
+    registry.observe("filelink_request_duration_seconds", duration, view=view)
+    registry.inc("filelink_db_queries_total", queries.count, view=view)
+    registry.inc("filelink_db_query_duration_seconds_total",
+                 queries.duration, view=view)
+    registry.maybe_write()
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request: HttpRequest):
+            queries = _QueryRecorder()
+            start = time.perf_counter()
+            with connection.execute_wrapper(queries):
+                response = await get_response(request)
+            _record_request(request, response,
+                            time.perf_counter() - start, queries)
+            return response
+    else:
+        def middleware(request: HttpRequest):
+            queries = _QueryRecorder()
+            start = time.perf_counter()
+            with connection.execute_wrapper(queries):
+                response = get_response(request)
+            _record_request(request, response,
+                            time.perf_counter() - start, queries)
+            return response
+    return middleware
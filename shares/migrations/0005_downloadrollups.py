@@ -0,0 +1,69 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0004_share_force_download"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyDownloadRollup",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("day", models.DateField(verbose_name="Day")),
+                (
+                    "request_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Requests"),
+                ),
+                (
+                    "distinct_ips",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Distinct IP Addresses"
+                    ),
+                ),
+                (
+                    "range_request_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Range Requests"
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="DownloadRollupState",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "last_download_log_id",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Last Download Log ID"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="downloadlog",
+            index=models.Index(
+                fields=["share", "timestamp"], name="downloadlog_share_timestamp"
+            ),
+        ),
+        migrations.AddField(
+            model_name="dailydownloadrollup",
+            name="share",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="shares.share"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailydownloadrollup",
+            constraint=models.UniqueConstraint(
+                fields=("share", "day"), name="unique_share_day"
+            ),
+        ),
+    ]
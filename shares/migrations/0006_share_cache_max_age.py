@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0005_downloadrollups"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="share",
+            name="cache_max_age",
+            field=models.PositiveIntegerField(
+                blank=True,
+                default=0,
+                help_text="How long browsers and proxies may cache downloads without revalidating.",
+                verbose_name="Cache Max Age (Seconds)",
+            ),
+        ),
+    ]
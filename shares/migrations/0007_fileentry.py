@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0006_share_cache_max_age"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileEntry",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "path",
+                    models.CharField(
+                        max_length=1024, unique=True, verbose_name="Path"),
+                ),
+                (
+                    "parent",
+                    models.CharField(
+                        max_length=1024, null=True, verbose_name="Parent Directory"
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, verbose_name="Name")),
+                ("is_dir", models.BooleanField(verbose_name="Is Directory")),
+                ("size", models.BigIntegerField(default=0, verbose_name="Size")),
+                (
+                    "mtime_ns",
+                    models.BigIntegerField(
+                        default=0, verbose_name="Modification Time (ns)"
+                    ),
+                ),
+                ("inode", models.BigIntegerField(default=0, verbose_name="Inode")),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["parent", "is_dir", "name"],
+                        name="fileentry_parent_listing",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import OperationalError, migrations, transaction
+
+# An external content FTS5 table over FileEntry paths, kept in sync by
+# triggers. The trigram tokenizer allows substring matches.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE shares_fileentry_search USING fts5(
+        path, content='shares_fileentry', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER shares_fileentry_search_insert AFTER INSERT ON shares_fileentry BEGIN
+        INSERT INTO shares_fileentry_search(rowid, path) VALUES (new.id, new.path);
+    END
+    """,
+    """
+    CREATE TRIGGER shares_fileentry_search_delete AFTER DELETE ON shares_fileentry BEGIN
+        INSERT INTO shares_fileentry_search(shares_fileentry_search, rowid, path)
+            VALUES ('delete', old.id, old.path);
+    END
+    """,
+    """
+    CREATE TRIGGER shares_fileentry_search_update AFTER UPDATE OF path ON shares_fileentry BEGIN
+        INSERT INTO shares_fileentry_search(shares_fileentry_search, rowid, path)
+            VALUES ('delete', old.id, old.path);
+        INSERT INTO shares_fileentry_search(rowid, path) VALUES (new.id, new.path);
+    END
+    """,
+    "INSERT INTO shares_fileentry_search(shares_fileentry_search) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS shares_fileentry_search_insert",
+    "DROP TRIGGER IF EXISTS shares_fileentry_search_delete",
+    "DROP TRIGGER IF EXISTS shares_fileentry_search_update",
+    "DROP TABLE IF EXISTS shares_fileentry_search",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    # Search falls back to LIKE queries if SQLite lacks FTS5 or the trigram
+    # tokenizer (added in 3.34)
+    try:
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for sql in CREATE_SQL:
+                schema_editor.execute(sql)
+    except OperationalError:
+        pass
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0007_fileentry"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
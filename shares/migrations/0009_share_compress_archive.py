@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0008_fileentry_search"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="share",
+            name="compress_archive",
+            field=models.BooleanField(
+                default=False,
+                help_text="Directories are downloaded as ZIP archives. Compressed archives are smaller, but their size is not known up front.",
+                verbose_name="Compress Directory Downloads",
+            ),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0009_share_compress_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="share",
+            name="updated_at",
+            field=models.DateTimeField(
+                auto_now=True, verbose_name="Updated At"),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0010_share_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FileChecksum",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "path",
+                    models.CharField(
+                        max_length=1024, unique=True, verbose_name="Path"),
+                ),
+                ("inode", models.BigIntegerField(verbose_name="Inode")),
+                ("size", models.BigIntegerField(verbose_name="Size")),
+                (
+                    "mtime_ns",
+                    models.BigIntegerField(
+                        verbose_name="Modification Time (ns)"),
+                ),
+                ("sha256", models.CharField(max_length=64, verbose_name="SHA-256")),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0011_filechecksum"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="downloadrollupstate",
+            name="last_archived_log_id",
+            field=models.BigIntegerField(
+                default=0, verbose_name="Last Archived Download Log ID"
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shares", "0012_downloadrollupstate_last_archived_log_id"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="share",
+            name="unique_path",
+        ),
+        migrations.AddField(
+            model_name="share",
+            name="pending_deletion",
+            field=models.BooleanField(
+                default=False, verbose_name="Pending Deletion"),
+        ),
+        migrations.AddConstraint(
+            model_name="share",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("pending_deletion", False)),
+                fields=("directory", "name"),
+                name="unique_path",
+                violation_error_message="Share with this Containing Directory and Shared File Name already exists.",
+            ),
+        ),
+    ]
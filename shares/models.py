@@ -1,3 +1,4 @@
+import os
 import secrets
 import string
 from typing import Any, Dict, Self
@@ -24,21 +25,47 @@ def get_ip_from_meta(meta: Dict[str, Any]) -> str:
     return ip
 
 
+class ShareManager(models.Manager):
+    """Leaves out shares that are waiting for their download logs to be purged."""
+
+    def get_queryset(self) -> models.QuerySet:
+        return super().get_queryset().filter(pending_deletion=False)
+
+
 class Share(models.Model):
     id = models.BigAutoField(primary_key=True)
     download_enabled = models.BooleanField("Enable Download", default=True)
     force_download = models.BooleanField("Force Downloading", default=True)
+    cache_max_age = models.PositiveIntegerField(
+        "Cache Max Age (Seconds)", default=0, blank=True,
+        help_text="How long browsers and proxies may cache downloads without revalidating.")
+    compress_archive = models.BooleanField(
+        "Compress Directory Downloads", default=False,
+        help_text="Directories are downloaded as ZIP archives. Compressed archives are smaller, "
+        "but their size is not known up front.")
     slug = models.SlugField("Slug", max_length=15,
                             unique=True, default=default_slug)
     directory = models.CharField(
         "Containing Directory", max_length=200, blank=True)
     name = models.CharField("Shared File Name", max_length=100)
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    # Bulk updates skip auto_now, so they set this explicitly
+    updated_at = models.DateTimeField("Updated At", auto_now=True)
+    # Deleted shares are hidden right away, and removed along with their
+    # download logs in batches by shares.deletion.
+    pending_deletion = models.BooleanField("Pending Deletion", default=False)
+
+    objects = ShareManager()
+    all_objects = models.Manager()
 
     class Meta:
         constraints = [
+            # A path can be shared again while its old share is being purged
             models.UniqueConstraint(
-                fields=("directory", "name"), name="unique_path")
+                fields=("directory", "name"), condition=models.Q(pending_deletion=False),
+                name="unique_path",
+                violation_error_message="Share with this Containing Directory and Shared File Name "
+                "already exists.")
         ]
 
     @property
@@ -51,6 +78,8 @@ class Share(models.Model):
             f"id={self.id}," \
             f"download_enabled={self.download_enabled}," \
             f"force_download={self.force_download}," \
+            f"cache_max_age={self.cache_max_age}," \
+            f"compress_archive={self.compress_archive}," \
             f"slug={self.slug}," \
             f"directory={self.directory}," \
             f"name={self.name}," \
@@ -67,6 +96,12 @@ class DownloadLog(models.Model):
     range_header = models.CharField(
         "HTTP Range Header", max_length=100, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=("share", "timestamp"),
+                         name="downloadlog_share_timestamp")
+        ]
+
     def __str__(self):
         return "DownloadLog(id={}, timestamp={}, share={}, ip={}, user_agent={}, range_header={})".format(
             self.pk,
@@ -78,11 +113,116 @@ class DownloadLog(models.Model):
         )
 
     @classmethod
-    def create_from_request_and_share(cls, request: HttpRequest, share: Share) -> Self:
-        return cls.objects.create(
+    def from_request(cls, request: HttpRequest, share_id: int) -> Self:
+        return cls(
             timestamp=timezone.now(),
-            share=share,
+            share_id=share_id,
             ip=get_ip_from_meta(request.META),
             user_agent=request.headers.get("User-Agent", ""),
             range_header=request.headers.get("Range", ""),
         )
+
+    @classmethod
+    def create_from_request_and_share(cls, request: HttpRequest, share: Share) -> Self:
+        download_log = cls.from_request(request, share.id)
+        download_log.save()
+        return download_log
+
+
+class DailyDownloadRollup(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    share = models.ForeignKey(Share, on_delete=models.CASCADE)
+    day = models.DateField("Day")
+    request_count = models.PositiveIntegerField("Requests", default=0)
+    distinct_ips = models.PositiveIntegerField(
+        "Distinct IP Addresses", default=0)
+    range_request_count = models.PositiveIntegerField(
+        "Range Requests", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=("share", "day"), name="unique_share_day")
+        ]
+
+    def __str__(self):
+        return "DailyDownloadRollup(" \
+            f"id={self.pk}," \
+            f"share_id={self.share_id}," \
+            f"day={self.day}," \
+            f"request_count={self.request_count}," \
+            f"distinct_ips={self.distinct_ips}," \
+            f"range_request_count={self.range_request_count}" \
+            ")"
+
+
+class DownloadRollupState(models.Model):
+    """Tracks the last DownloadLog folded into the daily rollups, and the last archived."""
+    id = models.BigAutoField(primary_key=True)
+    last_download_log_id = models.BigIntegerField(
+        "Last Download Log ID", default=0)
+    last_archived_log_id = models.BigIntegerField(
+        "Last Archived Download Log ID", default=0)
+
+    @classmethod
+    def get(cls) -> Self:
+        state, _ = cls.objects.get_or_create(pk=1)
+        return state
+
+
+class FileEntry(models.Model):
+    """
+    An entry in the index of FL_FILES_PATH. Paths are relative to the files
+    root, and the root itself is stored with an empty path and no parent.
+    """
+    id = models.BigAutoField(primary_key=True)
+    path = models.CharField("Path", max_length=1024, unique=True)
+    parent = models.CharField(
+        "Parent Directory", max_length=1024, null=True)
+    name = models.CharField("Name", max_length=255)
+    is_dir = models.BooleanField("Is Directory")
+    size = models.BigIntegerField("Size", default=0)
+    # For directories, the mtime as of the last scan of their entries, or 0 if
+    # they have not been scanned yet
+    mtime_ns = models.BigIntegerField("Modification Time (ns)", default=0)
+    inode = models.BigIntegerField("Inode", default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=("parent", "is_dir", "name"),
+                         name="fileentry_parent_listing")
+        ]
+
+    def __str__(self):
+        return "FileEntry(" \
+            f"id={self.pk}," \
+            f"path={self.path}," \
+            f"is_dir={self.is_dir}," \
+            f"size={self.size}," \
+            f"mtime_ns={self.mtime_ns}" \
+            ")"
+
+
+class FileChecksum(models.Model):
+    """
+    The SHA-256 of a shared file, relative to FL_FILES_PATH. It only applies
+    while the file's inode, size and modification time are unchanged.
+    """
+    id = models.BigAutoField(primary_key=True)
+    path = models.CharField("Path", max_length=1024, unique=True)
+    inode = models.BigIntegerField("Inode")
+    size = models.BigIntegerField("Size")
+    mtime_ns = models.BigIntegerField("Modification Time (ns)")
+    sha256 = models.CharField("SHA-256", max_length=64)
+
+    def matches(self, stat: os.stat_result) -> bool:
+        return (self.inode, self.size, self.mtime_ns) == \
+            (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def __str__(self):
+        return "FileChecksum(" \
+            f"id={self.pk}," \
+            f"path={self.path}," \
+            f"size={self.size}," \
+            f"sha256={self.sha256}" \
+            ")"
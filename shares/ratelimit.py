@@ -0,0 +1,220 @@
+"""
+Download rate limits and concurrency caps, shared across processes.
+
+Limiter state lives in a memory mapped file, as a fixed size hash table of
+token buckets with a count of active transfers. Every update happens under an
+exclusive flock on the file, so uwsgi workers see each other's counts.
+"""
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Tuple
+
+from django.conf import settings
+
+
+# Key hash, tokens, last update time, time the bucket is full again, time of
+# the last release and active transfers
+_SLOT = struct.Struct("<QddddI4x")
+_MAX_PROBES = 8
+
+
+class Limit(NamedTuple):
+    key: str
+    # Requests per second, and the number that may be made at once
+    rate: float
+    burst: int
+    max_concurrent: int
+
+
+def _hash_key(key: str) -> int:
+    # Zero marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class RateLimiter:
+
+    def __init__(self, path: Path, slots: int, concurrency_ttl: float):
+        self._path = path
+        self._slots = slots
+        self._concurrency_ttl = concurrency_ttl
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._file = None
+        self._map: mmap.mmap | None = None
+
+    def _open(self):
+        # flock locks belong to the open file, so each process needs its own
+        if self._pid == os.getpid():
+            return
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self._path, "a+b")
+        size = self._slots * _SLOT.size
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._file.fileno()).st_size != size:
+                # Left by a different slot count or layout, so start over
+                self._file.truncate(0)
+                self._file.truncate(size)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._pid = os.getpid()
+
+    def _get_active(self, released: float, active: int, now: float) -> int:
+        # Transfers from crashed processes are never released, so a key that
+        # has had none released for the TTL is assumed to have none left
+        return 0 if now - released > self._concurrency_ttl else active
+
+    def _find_slot(self, key_hash: int, now: float) -> Tuple[int | None, float]:
+        """
+        Finds the slot for a key, claiming an empty or idle slot if it has
+        none. An idle slot has no transfers and a full bucket, so claiming it
+        loses nothing. If there is no such slot, returns None and the time
+        the first probed slot becomes idle.
+        """
+        start = key_hash % self._slots
+        claim = None
+        idle_at = math.inf
+        for i in range(_MAX_PROBES):
+            index = (start + i) % self._slots
+            (slot_hash, _, _, full_at, released, active) = _SLOT.unpack_from(
+                self._map, index * _SLOT.size)
+            if slot_hash == key_hash:
+                return (index, now)
+            if slot_hash == 0:
+                slot_idle_at = 0.0
+            elif self._get_active(released, active, now):
+                slot_idle_at = max(
+                    full_at, released + self._concurrency_ttl)
+            else:
+                slot_idle_at = full_at
+            if claim is None and slot_idle_at <= now:
+                claim = index
+            idle_at = min(idle_at, slot_idle_at)
+        return (claim, idle_at)
+
+    def _read(self, limit: Limit, index: int, key_hash: int, now: float):
+        (slot_hash, tokens, updated, _, released, active) = _SLOT.unpack_from(
+            self._map, index * _SLOT.size)
+        if slot_hash != key_hash:
+            return (limit.burst, now, 0)
+        if not (active := self._get_active(released, active, now)):
+            released = now
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        return (tokens, released, active)
+
+    def acquire(self, limits: List[Limit]) -> float | None:
+        """
+        Takes a request from every limit, and starts a transfer for those with
+        a concurrency cap. If any limit is exhausted nothing is taken, and the
+        number of seconds to wait before retrying is returned.
+        """
+        limits = [limit for limit in limits if limit.rate or limit.max_concurrent]
+        if not limits:
+            return None
+
+        now = time.time()
+        with self._lock:
+            self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                slots = []
+                retry_after = 0.0
+                for limit in limits:
+                    key_hash = _hash_key(limit.key)
+                    (index, idle_at) = self._find_slot(key_hash, now)
+                    if index is None:
+                        # Taking over a busy slot would reset another key's
+                        # limits, so wait for one to become idle
+                        retry_after = max(retry_after, idle_at - now, 1.0)
+                        continue
+                    (tokens, released, active) = self._read(
+                        limit, index, key_hash, now)
+                    if limit.rate and tokens < 1:
+                        retry_after = max(
+                            retry_after, (1 - tokens) / limit.rate)
+                    if limit.max_concurrent and active >= limit.max_concurrent:
+                        retry_after = max(retry_after, 1.0)
+                    slots.append((limit, index, key_hash,
+                                 tokens, released, active))
+                if retry_after:
+                    return retry_after
+
+                for (limit, index, key_hash, tokens, released, active) in slots:
+                    full_at = now
+                    if limit.rate:
+                        tokens -= 1
+                        full_at += (limit.burst - tokens) / limit.rate
+                    _SLOT.pack_into(self._map, index * _SLOT.size, key_hash,
+                                    tokens, now, full_at, released,
+                                    active + 1 if limit.max_concurrent else active)
+                return None
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def release(self, limits: List[Limit]):
+        """Ends a transfer started by acquire."""
+        limits = [limit for limit in limits if limit.max_concurrent]
+        if not limits:
+            return
+
+        with self._lock:
+            self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                for limit in limits:
+                    key_hash = _hash_key(limit.key)
+                    start = key_hash % self._slots
+                    for i in range(_MAX_PROBES):
+                        offset = (start + i) % self._slots * _SLOT.size
+                        (slot_hash, tokens, updated, full_at, _, active) = \
+                            _SLOT.unpack_from(self._map, offset)
+                        if slot_hash == key_hash:
+                            _SLOT.pack_into(self._map, offset, slot_hash, tokens, updated,
+                                            full_at, time.time(), max(active - 1, 0))
+                            break
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def clear(self):
+        with self._lock:
+            self._open()
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+            try:
+                self._map[:] = bytes(len(self._map))
+            finally:
+                fcntl.flock(self._file, fcntl.LOCK_UN)
+
+
+_limiter: RateLimiter | None = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter() -> RateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    path=settings.FL_RATE_LIMIT_PATH,
+                    slots=settings.FL_RATE_LIMIT_SLOTS,
+                    concurrency_ttl=settings.FL_RATE_LIMIT_CONCURRENCY_TTL,
+                )
+    return _limiter
+
+
+def get_download_limits(ip: str, share_id: int) -> List[Limit]:
+    return [
+        Limit(f"ip:{ip}", settings.FL_RATE_LIMIT_IP_RATE,
+              settings.FL_RATE_LIMIT_IP_BURST, settings.FL_RATE_LIMIT_IP_CONCURRENCY),
+        Limit(f"share:{share_id}", settings.FL_RATE_LIMIT_SHARE_RATE,
+              settings.FL_RATE_LIMIT_SHARE_BURST, settings.FL_RATE_LIMIT_SHARE_CONCURRENCY),
+    ]
@@ -0,0 +1,131 @@
+"""
+Moves old download logs out of the database into gzip compressed NDJSON
+archives, one file per month.
+
+Logs are archived by ID range, and only once they have been folded into the
+daily rollups. A run writes the logs after the last archived ID to temporary
+files, renames them into place, records the new last archived ID, and only
+then deletes the archived logs in small batches, so the write lock is never
+held for long. Archive files are named after the first ID in them, so if a
+run is interrupted before recording its progress the next run rewrites the
+same files rather than duplicating logs.
+"""
+import datetime
+import fcntl
+import gzip
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Dict, Tuple
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from shares import deletion, exports, models
+
+
+@dataclass
+class ArchiveStats:
+    archived: int = 0
+    deleted: int = 0
+    files: int = 0
+
+
+class AlreadyRunningException(Exception):
+    pass
+
+
+def _get_archive_dir() -> Path:
+    return Path(settings.FL_DOWNLOAD_LOG_ARCHIVE_DIR)
+
+
+def archive_download_logs(retention_days: int) -> ArchiveStats:
+    """
+    Archives and deletes the rolled up download logs older than the given
+    number of days, and returns counts of what was done.
+    """
+    if retention_days < 1:
+        # A late log makes the rollups recount its day from the logs that remain
+        raise ValueError("Download logs must be kept for at least a day")
+
+    archive_dir = _get_archive_dir()
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    with open(archive_dir / ".lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise AlreadyRunningException()
+
+        stats = ArchiveStats()
+        state = models.DownloadRollupState.get()
+        # Finish deleting logs archived by an interrupted run
+        stats.deleted += _delete_archived_logs(state.last_archived_log_id)
+
+        cutoff = timezone.now() - datetime.timedelta(days=retention_days)
+        last_id = models.DownloadLog.objects.filter(
+            id__gt=state.last_archived_log_id,
+            id__lte=state.last_download_log_id,
+            timestamp__lt=cutoff,
+        ).aggregate(last_id=Max("id"))["last_id"]
+        if last_id is None:
+            return stats
+
+        (stats.archived, stats.files) = _write_archives(
+            archive_dir, state.last_archived_log_id, last_id)
+        models.DownloadRollupState.objects.filter(
+            pk=state.pk).update(last_archived_log_id=last_id)
+        stats.deleted += _delete_archived_logs(last_id)
+        return stats
+
+
+def _write_archives(archive_dir: Path, after_id: int, last_id: int) -> Tuple[int, int]:
+    """Writes the logs with IDs in (after_id, last_id] to monthly archives."""
+    logs = exports.select_rows(models.DownloadLog.objects.filter(
+        id__gt=after_id, id__lte=last_id))
+
+    # Open archives by month, along with their temporary and final paths
+    archives: Dict[str, Tuple[BinaryIO, gzip.GzipFile, Path, Path]] = {}
+    count = 0
+    try:
+        for row in exports.iter_rows(logs):
+            # Partition by the month in UTC, from the row's ISO timestamp
+            month = datetime.datetime.fromisoformat(row[1]).astimezone(
+                datetime.timezone.utc).strftime("%Y-%m")
+            if month not in archives:
+                path = archive_dir / \
+                    f"download-logs-{month}.{row[0]}.ndjson.gz"
+                temp_path = path.with_name(f".{path.name}.tmp")
+                raw = open(temp_path, "wb")
+                archives[month] = (raw, gzip.GzipFile(
+                    fileobj=raw, mode="wb", mtime=0), temp_path, path)
+            archives[month][1].write(exports.encode_ndjson(row).encode())
+            count += 1
+
+        for (raw, archive, temp_path, path) in archives.values():
+            archive.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+            raw.close()
+            os.replace(temp_path, path)
+    finally:
+        for (raw, _, temp_path, _) in archives.values():
+            if not raw.closed:
+                raw.close()
+                temp_path.unlink(missing_ok=True)
+
+    # Make the renames durable before any logs are deleted
+    dir_fd = os.open(archive_dir, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+    return (count, len(archives))
+
+
+def _delete_archived_logs(last_id: int) -> int:
+    return deletion.delete_in_batches(
+        models.DownloadLog.objects.filter(id__lte=last_id),
+        settings.FL_DOWNLOAD_LOG_ARCHIVE_BATCH_SIZE,
+        settings.FL_DOWNLOAD_LOG_ARCHIVE_BATCH_DELAY,
+    )
@@ -0,0 +1,121 @@
+"""
+A django_sendfile backend that serves files from Python with full Range
+support, for deployments where the server does not handle X-Sendfile.
+
+Whole files under WSGI are returned as a FileResponse, so servers with a
+wsgi.file_wrapper (uwsgi, mod_wsgi, gunicorn) can send them with sendfile().
+Byte ranges are read from a memory map of the file.
+"""
+import mmap
+import os
+import secrets
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+from shares import http_utils
+
+
+CHUNK_SIZE = 256 * 1024
+
+
+class _KeepContentHeadersMixin:
+    """
+    django_sendfile sets Content-Length and Content-Type for the whole file
+    after the backend returns, which would be wrong for partial responses.
+    """
+
+    def __setitem__(self, header, value):
+        if header.lower() in ("content-length", "content-type") and self.has_header(header):
+            return
+        super().__setitem__(header, value)
+
+
+class _RangeResponse(_KeepContentHeadersMixin, StreamingHttpResponse):
+    pass
+
+
+class _RangeNotSatisfiableResponse(_KeepContentHeadersMixin, HttpResponse):
+    status_code = 416
+
+
+class _FileRanges:
+    """Yields the parts of a file, with optional separators, from a memory map."""
+
+    def __init__(self, file, parts: List[Tuple[bytes, int, int]], trailer: bytes):
+        self._file = file
+        self._parts = parts
+        self._trailer = trailer
+        self._map = None
+
+    def __iter__(self) -> Iterator[bytes]:
+        if any(end >= start for (_, start, end) in self._parts):
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        for (header, start, end) in self._parts:
+            if header:
+                yield header
+            for offset in range(start, end + 1, CHUNK_SIZE):
+                yield self._map[offset:min(offset + CHUNK_SIZE, end + 1)]
+        if self._trailer:
+            yield self._trailer
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+
+def _stream(request: HttpRequest, response_class, ranges: _FileRanges, **kwargs) -> StreamingHttpResponse:
+    return response_class(http_utils.streaming_content(request, ranges), **kwargs)
+
+
+def sendfile(request: HttpRequest, filepath: Path, mimetype: str = "application/octet-stream", **kwargs) -> HttpResponse:
+    file = open(filepath, "rb")
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    etag = http_utils.stat_etag(stat)
+
+    ranges = None
+    if (range_header := request.headers.get("Range")) and request.method in ("GET", "HEAD") and \
+            http_utils.if_range_matches(request.META.get("HTTP_IF_RANGE"), etag, stat.st_mtime):
+        ranges = http_utils.parse_range_header(range_header, size)
+
+    if ranges == []:
+        file.close()
+        response = _RangeNotSatisfiableResponse(content_type=mimetype)
+        response["Content-Range"] = f"bytes */{size}"
+        response["Content-Length"] = 0
+    elif ranges is None and not isinstance(request, ASGIRequest):
+        response = FileResponse(file, content_type=mimetype)
+    elif ranges is None:
+        response = _stream(request, _RangeResponse, _FileRanges(
+            file, [(b"", 0, size - 1)], b""), content_type=mimetype)
+        response["Content-Length"] = size
+    elif len(ranges) == 1:
+        (start, end) = ranges[0]
+        response = _stream(request, _RangeResponse, _FileRanges(
+            file, [(b"", start, end)], b""), status=206, content_type=mimetype)
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = end - start + 1
+    else:
+        boundary = secrets.token_hex(16)
+        parts = [(
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {mimetype}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n".encode(),
+            start,
+            end,
+        ) for (start, end) in ranges]
+        trailer = f"\r\n--{boundary}--\r\n".encode()
+        response = _stream(request, _RangeResponse, _FileRanges(file, parts, trailer), status=206,
+                           content_type=f"multipart/byteranges; boundary={boundary}")
+        response["Content-Length"] = sum(
+            len(header) + end - start + 1 for (header, start, end) in parts) + len(trailer)
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    return response
@@ -0,0 +1,17 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from shares import actions, auth, models
+
+
+@receiver(post_save, sender=models.Share)
+@receiver(post_delete, sender=models.Share)
+def invalidate_share_cache(sender, instance: models.Share, **kwargs):
+    actions.invalidate_share_cache(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user_cache(sender, instance, **kwargs):
+    auth.invalidate_user_cache(instance)
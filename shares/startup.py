@@ -0,0 +1,69 @@
+"""
+Container startup tasks, skipped when there is nothing for them to do.
+"""
+import hashlib
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Tuple
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.executor import MigrationExecutor
+
+
+# Written to STATIC_ROOT after collecting, so a wiped static directory is
+# collected again
+STATIC_DIGEST_FILENAME = ".collected.sha256"
+
+
+def get_pending_migrations(database: str = DEFAULT_DB_ALIAS) -> List[Tuple[str, str]]:
+    executor = MigrationExecutor(connections[database])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [(migration.app_label, migration.name) for (migration, _) in plan]
+
+
+def get_static_files_digest() -> str:
+    """Hashes the paths and contents of every static file collectstatic would copy."""
+    files = {}
+    for finder in finders.get_finders():
+        for (path, storage) in finder.list([]):
+            # The first finder to list a path wins, as in collectstatic
+            prefix = getattr(storage, "prefix", None) or ""
+            files.setdefault(os.path.join(prefix, path), storage.path(path))
+
+    digest = hashlib.sha256(
+        settings.STORAGES["staticfiles"]["BACKEND"].encode())
+    for (path, full_path) in sorted(files.items()):
+        digest.update(f"\0{path}\0".encode())
+        with open(full_path, "rb") as f:
+            digest.update(hashlib.file_digest(f, "sha256").digest())
+    return digest.hexdigest()
+
+
+def _get_static_digest_path() -> Path:
+    return Path(settings.STATIC_ROOT) / STATIC_DIGEST_FILENAME
+
+
+def static_files_changed(digest: str) -> bool:
+    try:
+        return _get_static_digest_path().read_text().strip() != digest
+    except OSError:
+        return True
+
+
+def record_static_files_digest(digest: str):
+    path = _get_static_digest_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(digest)
+
+
+def measure_import_time(module: str) -> float:
+    """Measures how long a fresh interpreter takes to import a module, in seconds."""
+    code = "import time; start = time.perf_counter(); " \
+        f"import {module}; print(time.perf_counter() - start)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=settings.BASE_DIR)
+    return float(result.stdout.strip().splitlines()[-1])
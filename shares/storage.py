@@ -0,0 +1,47 @@
+import gzip
+import os
+from typing import Any, Dict, Iterator, Tuple
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+COMPRESSIBLE_EXTENSIONS = {".css", ".html", ".js",
+                           ".json", ".map", ".svg", ".txt", ".xml"}
+# Smaller files gain little, and may end up larger once compressed
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Stores static files under names that include a hash of their contents, so
+    they can be cached forever. Text files also get gzip compressed copies
+    alongside them, which uwsgi's static-gzip sends to clients that accept them.
+    """
+
+    def post_process(self, paths: Dict[str, Any], dry_run: bool = False, **options: Any) -> \
+            Iterator[Tuple[str, str | None, Any]]:
+        names = set()
+        for (name, hashed_name, processed) in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.add(name)
+                if hashed_name:
+                    names.add(hashed_name)
+            yield (name, hashed_name, processed)
+
+        if dry_run:
+            return
+        for name in sorted(names):
+            if os.path.splitext(name)[1] in COMPRESSIBLE_EXTENSIONS:
+                self._compress(name)
+
+    def _compress(self, name: str):
+        path = self.path(name)
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+
+        compressed = gzip.compress(data, 9, mtime=0)
+        if len(compressed) < len(data):
+            with open(path + ".gz", "wb") as f:
+                f.write(compressed)
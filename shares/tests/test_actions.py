@@ -1,12 +1,14 @@
 import contextlib
+import os
 from pathlib import Path
 from unittest import mock
 
+from django.contrib.auth.models import User
 from django.test import TestCase
 
 from shares import actions, models
-from shares.exceptions import InvalidRequestPathException
-from .utils import get_user
+from shares.exceptions import InvalidRequestPathException, TooManyFilesException
+from .utils import FilesRootMixin, get_user
 
 
 def _create_test_scandir_result(is_file, name):
@@ -19,6 +21,10 @@ def _create_test_scandir_result(is_file, name):
 
 class TestGetDirectoriesAndFiles(TestCase):
 
+    def setUp(self) -> None:
+        super().setUp()
+        actions.listing_cache.clear()
+
     def test_redirects_on_invalid_path(self):
         with self.settings(FL_FILES_PATH=Path(__file__).resolve().parent.parent):
             with self.assertRaises(InvalidRequestPathException):
@@ -100,6 +106,100 @@ class TestGetDirectoriesAndFiles(TestCase):
         self.assertEqual(parent_path, Path("child1"))
 
 
+class TestListingCache(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.listing_cache.clear()
+        (self.root_path / "file1").touch()
+        self._make_stable()
+
+    def _make_stable(self):
+        os.utime(self.root_path, (0, 0))
+
+    def test_serves_repeat_listings_from_cache(self):
+        stats = actions.listing_cache.stats()
+        listing = actions.get_directories_and_files(Path("."))
+        with mock.patch("os.scandir") as mock_scandir:
+            self.assertEqual(
+                actions.get_directories_and_files(Path(".")), listing)
+            mock_scandir.assert_not_called()
+
+        self.assertEqual(actions.listing_cache.hits, stats["hits"] + 1)
+        self.assertEqual(actions.listing_cache.misses, stats["misses"] + 1)
+
+    def test_rescans_when_directory_changes(self):
+        (_, files, _) = actions.get_directories_and_files(Path("."))
+        self.assertEqual([f["name"] for f in files], ["file1"])
+
+        (self.root_path / "file2").touch()
+        os.utime(self.root_path, (1, 1))
+        (_, files, _) = actions.get_directories_and_files(Path("."))
+        self.assertEqual([f["name"] for f in files], ["file1", "file2"])
+
+    def test_does_not_cache_recently_modified_directory(self):
+        os.utime(self.root_path)
+        actions.get_directories_and_files(Path("."))
+
+        self.assertEqual(len(actions.listing_cache), 0)
+
+
+class TestStreamDirectoriesAndFiles(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.listing_cache.clear()
+
+    def test_redirects_on_invalid_path(self):
+        with self.assertRaises(InvalidRequestPathException):
+            actions.stream_directories_and_files(Path("../"), 10)
+
+    @mock.patch("os.scandir")
+    def test_yields_chunks_in_scan_order(self, mock_scandir):
+        mock_scandir.return_value = contextlib.nullcontext([
+            _create_test_scandir_result(True, "file2"),
+            _create_test_scandir_result(False, "dir1"),
+            _create_test_scandir_result(True, "file1"),
+        ])
+
+        (chunks, parent_path) = actions.stream_directories_and_files(
+            Path("."), 2)
+        self.assertIsNone(parent_path)
+        self.assertListEqual(list(chunks), [
+            ([dict(name="dir1/", path=Path("dir1"))],
+             [dict(name="file2", path=Path("file2"))]),
+            ([], [dict(name="file1", path=Path("file1"))]),
+        ])
+
+
+class TestPaginateDirectoriesAndFiles(TestCase):
+
+    directories = [dict(name="dir1/"), dict(name="dir2/")]
+    files = [dict(name="file1"), dict(name="file2"), dict(name="file3")]
+
+    def _paginate(self, after, limit):
+        return actions.paginate_directories_and_files(
+            self.directories, self.files, after, limit)
+
+    def test_returns_everything_when_under_limit(self):
+        self.assertEqual(self._paginate(None, 10),
+                         (self.directories, self.files, None))
+
+    def test_pages_through_directories_then_files(self):
+        self.assertEqual(self._paginate(None, 1),
+                         ([dict(name="dir1/")], [], "dir1/"))
+        self.assertEqual(self._paginate("dir1/", 2),
+                         ([dict(name="dir2/")], [dict(name="file1")], "file1"))
+        self.assertEqual(self._paginate("file1", 2),
+                         ([], [dict(name="file2"), dict(name="file3")], None))
+
+    def test_cursor_need_not_exist(self):
+        self.assertEqual(self._paginate("file15", 5),
+                         ([], [dict(name="file2"), dict(name="file3")], None))
+        self.assertEqual(self._paginate("dir/", 1),
+                         ([dict(name="dir1/")], [], "dir1/"))
+
+
 class TestGetSharesForDirectory(TestCase):
 
     def test_gets_shares_for_path(self):
@@ -122,3 +222,265 @@ class TestGetSharesForDirectory(TestCase):
         # other path
         self.assertDictEqual(
             actions.get_shares_for_directory(Path("other")), {})
+
+    def test_limits_shares_to_names(self):
+        user = get_user()
+        share1 = models.Share.objects.create(
+            directory="", name="file1", user=user)
+        models.Share.objects.create(directory="", name="file2", user=user)
+
+        self.assertDictEqual(actions.get_shares_for_directory(Path("."), ["file1", "file3"]), {
+            share1.name: share1,
+        })
+
+
+class TestResolveShare(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.share_cache.clear()
+
+    def test_resolves_share(self):
+        share = models.Share.objects.create(
+            directory="dir", name="name", force_download=False, user=get_user())
+
+        self.assertEqual(actions.resolve_share(share.slug), actions.ResolvedShare(
+            id=share.id,
+            full_path="dir/name",
+            download_enabled=True,
+            force_download=False,
+            name="name",
+            cache_max_age=0,
+            compress_archive=False,
+        ))
+
+    def test_caches_resolved_share(self):
+        share = models.Share.objects.create(name="name", user=get_user())
+        actions.resolve_share(share.slug)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(actions.resolve_share(share.slug).id, share.id)
+
+    def test_caches_unknown_slug(self):
+        self.assertIsNone(actions.resolve_share("unknown"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(actions.resolve_share("unknown"))
+
+    def test_invalidates_on_save(self):
+        share = models.Share.objects.create(name="name", user=get_user())
+        self.assertTrue(actions.resolve_share(share.slug).download_enabled)
+
+        share.download_enabled = False
+        share.save()
+        self.assertFalse(actions.resolve_share(share.slug).download_enabled)
+
+    def test_invalidates_on_slug_change(self):
+        share = models.Share.objects.create(name="name", user=get_user())
+        old_slug = share.slug
+        actions.resolve_share(old_slug)
+
+        share.slug = "newslug"
+        share.save()
+        self.assertIsNone(actions.resolve_share(old_slug))
+
+    def test_invalidates_on_create_and_delete(self):
+        self.assertIsNone(actions.resolve_share("slug"))
+        share = models.Share.objects.create(
+            slug="slug", name="name", user=get_user())
+        self.assertEqual(actions.resolve_share("slug").id, share.id)
+
+        share.delete()
+        self.assertIsNone(actions.resolve_share("slug"))
+
+    def test_clears_when_stamp_changes(self):
+        share = models.Share.objects.create(name="name", user=get_user())
+        actions.resolve_share(share.slug)
+
+        # Simulate another process updating the share.
+        models.Share.objects.filter(id=share.id).update(download_enabled=False)
+        self.assertTrue(actions.resolve_share(share.slug).download_enabled)
+        with mock.patch.object(actions.share_cache_stamp, "changed", return_value=True):
+            self.assertFalse(actions.resolve_share(
+                share.slug).download_enabled)
+
+
+class TestGenerateUniqueSlugs(TestCase):
+
+    def test_generates_unique_slugs(self):
+        with self.assertNumQueries(1):
+            slugs = actions.generate_unique_slugs(100)
+        self.assertEqual(len(set(slugs)), 100)
+
+    @mock.patch("shares.models.default_slug")
+    def test_regenerates_taken_slugs(self, mock_default_slug):
+        models.Share.objects.create(slug="taken", name="name", user=get_user())
+        mock_default_slug.side_effect = ["taken", "free1", "free2"]
+
+        with self.assertNumQueries(2):
+            self.assertEqual(sorted(actions.generate_unique_slugs(2)),
+                             ["free1", "free2"])
+
+
+class TestBulkShares(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.share_cache.clear()
+        (self.root_path / "dir" / "sub").mkdir(parents=True)
+        for name in ("file1", "dir/file2", "dir/sub/file3"):
+            (self.root_path / name).touch()
+
+    def test_collects_files_and_subtrees(self):
+        self.assertEqual(actions.collect_share_paths([Path("dir"), Path("file1"), Path("dir/file2")]),
+                         [Path("dir/file2"), Path("dir/sub/file3"), Path("file1")])
+
+    def test_collect_rejects_invalid_paths(self):
+        with self.assertRaises(InvalidRequestPathException):
+            actions.collect_share_paths([Path("..")])
+        with self.assertRaises(InvalidRequestPathException):
+            actions.collect_share_paths([Path("missing")])
+
+    def test_collect_skips_symlinks_outside_files_root(self):
+        (self.root_path.parent / "outside").touch()
+        (self.root_path / "dir" / "link").symlink_to(self.root_path.parent / "outside")
+        (self.root_path / "dir" / "inside").symlink_to(self.root_path / "file1")
+        self.assertEqual(actions.collect_share_paths([Path("dir")]),
+                         [Path("dir/file2"), Path("dir/inside"), Path("dir/sub/file3")])
+
+    def test_collect_limits_files(self):
+        with self.settings(FL_BULK_SHARE_MAX_FILES=2):
+            with self.assertRaises(TooManyFilesException):
+                actions.collect_share_paths([Path(".")])
+
+    def test_creates_shares(self):
+        user = get_user()
+        existing = models.Share.objects.create(
+            directory="dir", name="file2", user=user)
+
+        with self.assertNumQueries(6):
+            (created, skipped) = actions.bulk_create_shares(
+                user, [Path("file1"), Path("dir/file2"), Path("dir/sub/file3")], force_download=False)
+
+        self.assertEqual(skipped, [Path("dir/file2")])
+        self.assertEqual(sorted(s.full_path for s in created),
+                         ["dir/sub/file3", "file1"])
+        self.assertEqual(models.Share.objects.count(), 3)
+        self.assertFalse(models.Share.objects.get(name="file1").force_download)
+        self.assertEqual(models.Share.objects.get(
+            id=existing.id).slug, existing.slug)
+
+    def test_creates_shares_despite_concurrent_conflicts(self):
+        user = get_user()
+        taken = models.Share.objects.create(name="other", user=user)
+
+        def generate_unique_slugs(count):
+            if not models.Share.objects.filter(name="file2").exists():
+                # Shared after the existing shares were checked
+                models.Share.objects.create(
+                    directory="dir", name="file2", user=user)
+                return [taken.slug, "fresh1", "fresh2"][:count]
+            return ["fresh3"]
+
+        with mock.patch.object(actions, "generate_unique_slugs", generate_unique_slugs):
+            (created, skipped) = actions.bulk_create_shares(
+                user, [Path("file1"), Path("dir/file2"), Path("dir/sub/file3")])
+
+        self.assertEqual(skipped, [Path("dir/file2")])
+        self.assertEqual(sorted((s.full_path, s.slug) for s in created),
+                         [("dir/sub/file3", "fresh2"), ("file1", "fresh3")])
+        self.assertTrue(all(s.id is not None for s in created))
+        self.assertEqual(models.Share.objects.get(
+            slug="fresh3").full_path, "file1")
+
+    def test_updates_shares(self):
+        share1 = models.Share.objects.create(name="file1", user=get_user())
+        share2 = models.Share.objects.create(
+            directory="dir", name="file2", user=get_user())
+        self.assertTrue(actions.resolve_share(share1.slug).download_enabled)
+
+        self.assertEqual(actions.bulk_update_shares(
+            get_user(), [share1.id, share2.id], "disable"), 2)
+        self.assertFalse(actions.resolve_share(share1.slug).download_enabled)
+        self.assertFalse(models.Share.objects.filter(
+            download_enabled=True).exists())
+
+        self.assertEqual(actions.bulk_update_shares(
+            get_user(), [share1.id], "enable"), 1)
+        self.assertTrue(actions.resolve_share(share1.slug).download_enabled)
+
+        self.assertEqual(actions.bulk_update_shares(
+            get_user(), [share1.id, share2.id], "delete"), 2)
+        self.assertFalse(models.Share.objects.exists())
+        self.assertIsNone(actions.resolve_share(share1.slug))
+
+    def test_updates_only_own_shares(self):
+        other_user = User.objects.create(username="other")
+        share = models.Share.objects.create(name="file1", user=other_user)
+
+        self.assertEqual(actions.bulk_update_shares(
+            get_user(), [share.id], "delete"), 0)
+        self.assertTrue(models.Share.objects.exists())
+
+
+class TestSearchFiles(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        for (path, is_dir) in (("", True), ("Photos", True), ("Photos/holiday.jpg", False),
+                               ("docs", True), ("docs/photos.txt", False), ("a.jpg", False)):
+            models.FileEntry.objects.create(
+                path=path,
+                parent=None if not path else path.rpartition("/")[0],
+                name=path.rpartition("/")[2],
+                is_dir=is_dir)
+
+    def _search(self, query, limit=10):
+        return [(r["name"], r["path"].as_posix()) for r in actions.search_files(query, limit)]
+
+    def test_matches_substrings_ignoring_case(self):
+        self.assertTrue(actions._has_search_index())
+        self.assertEqual(self._search("photo"), [
+            ("Photos/", "Photos"),
+            ("holiday.jpg", "Photos/holiday.jpg"),
+            ("photos.txt", "docs/photos.txt"),
+        ])
+        self.assertEqual(self._search("s/h"), [
+            ("holiday.jpg", "Photos/holiday.jpg")])
+
+    def test_short_queries(self):
+        self.assertEqual(self._search(".j"), [
+            ("holiday.jpg", "Photos/holiday.jpg"),
+            ("a.jpg", "a.jpg"),
+        ])
+        self.assertEqual(self._search(" "), [])
+
+    def test_quotes_query(self):
+        self.assertEqual(self._search('"jpg OR txt'), [])
+        self.assertEqual(self._search("jpg OR txt"), [])
+
+    def test_limits_results(self):
+        self.assertEqual(len(self._search("jpg", limit=1)), 1)
+
+    def test_follows_index_updates(self):
+        models.FileEntry.objects.filter(path="a.jpg").delete()
+        models.FileEntry.objects.filter(
+            path="docs/photos.txt").update(path="docs/notes.txt")
+        self.assertEqual(self._search("jpg"), [
+            ("holiday.jpg", "Photos/holiday.jpg")])
+        self.assertEqual(self._search("notes"), [
+            ("photos.txt", "docs/notes.txt")])
+
+    def test_includes_shares(self):
+        share1 = models.Share.objects.create(name="a.jpg", user=get_user())
+        share2 = models.Share.objects.create(
+            directory="Photos", name="holiday.jpg", user=get_user())
+        models.Share.objects.create(
+            directory="docs", name="a.jpg", user=get_user())
+
+        results = actions.search_files("jpg", 10)
+        self.assertEqual([r["share"] for r in results], [share2, share1])
+
+    def test_includes_directory_shares(self):
+        share = models.Share.objects.create(name="Photos", user=get_user())
+        results = actions.search_files("photo", 10)
+        self.assertEqual([r["share"] for r in results], [share, None, None])
@@ -0,0 +1,81 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from shares import auth
+
+
+class TestCachedModelBackend(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        auth.user_cache.clear()
+        self.backend = auth.CachedModelBackend()
+        self.user = User.objects.create(username="test")
+
+    def test_caches_user(self):
+        self.assertEqual(self.backend.get_user(self.user.id), self.user)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.id)
+        self.assertEqual(user, self.user)
+
+    def test_returns_copies(self):
+        user = self.backend.get_user(self.user.id)
+        user.first_name = "changed"
+        self.assertEqual(self.backend.get_user(self.user.id).first_name, "")
+
+    def test_caches_unknown_users(self):
+        self.assertIsNone(self.backend.get_user(-1))
+        with self.assertNumQueries(0):
+            self.assertIsNone(self.backend.get_user(-1))
+
+    def test_invalidates_on_save_and_delete(self):
+        self.backend.get_user(self.user.id)
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(self.backend.get_user(self.user.id))
+
+        self.user.is_active = True
+        self.user.save()
+        self.assertEqual(self.backend.get_user(self.user.id), self.user)
+        self.user.delete()
+        self.assertIsNone(self.backend.get_user(self.user.id))
+
+    def test_clears_when_stamp_changes(self):
+        self.backend.get_user(self.user.id)
+        with self.assertNumQueries(0):
+            self.backend.get_user(self.user.id)
+
+        # Simulate another process touching the stamp
+        with mock.patch.object(auth.user_cache_stamp, "changed", return_value=True):
+            with self.assertNumQueries(1):
+                self.backend.get_user(self.user.id)
+
+
+class TestAuthenticatedRequests(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        auth.user_cache.clear()
+        self.user = User.objects.create(username="test")
+        self.user.set_password("password")
+        self.user.save()
+
+    def test_no_queries_to_identify_user(self):
+        self.client.login(username="test", password="password")
+        self.client.get(reverse("shares:search"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("shares:search"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user"], self.user)
+
+    def test_password_change_logs_out(self):
+        self.client.login(username="test", password="password")
+        self.client.get(reverse("shares:search"))
+
+        self.user.set_password("changed")
+        self.user.save()
+        response = self.client.get(reverse("shares:search"))
+        self.assertEqual(response.status_code, 302)
@@ -0,0 +1,47 @@
+import threading
+
+from django.test import SimpleTestCase
+
+from shares.background import BackgroundWorker
+
+
+class _Worker(BackgroundWorker):
+
+    def __init__(self):
+        super().__init__()
+        self.started = 0
+        self.wake = threading.Event()
+
+    def on_start(self):
+        self.started += 1
+        self.wake = threading.Event()
+
+    def on_stop(self):
+        self.wake.set()
+
+    def run(self):
+        self.wake.wait()
+
+
+class TestBackgroundWorker(SimpleTestCase):
+
+    def test_starts_once_per_process(self):
+        worker = _Worker()
+        self.addCleanup(worker.shutdown)
+        worker.ensure_started()
+        worker.ensure_started()
+        self.assertEqual(worker.started, 1)
+
+        # As seen from a child forked after the thread was started, which has
+        # no thread of its own
+        worker.shutdown()
+        worker._pid = None
+        worker.ensure_started()
+        self.assertEqual(worker.started, 2)
+
+    def test_shutdown_stops_thread(self):
+        worker = _Worker()
+        worker.ensure_started()
+        worker.shutdown()
+        self.assertTrue(worker.stopping)
+        self.assertFalse(worker._thread.is_alive())
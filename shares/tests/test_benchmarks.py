@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from shares import benchmarks, models
+from .utils import TempDirMixin
+
+
+class TestSummarize(SimpleTestCase):
+
+    def test_percentile(self):
+        values = [i / 100 for i in range(1, 101)]
+        self.assertEqual(benchmarks.percentile(values, 0.5), 0.5)
+        self.assertEqual(benchmarks.percentile(values, 0.99), 0.99)
+        self.assertEqual(benchmarks.percentile([], 0.5), 0.0)
+
+    def test_summarize(self):
+        self.assertDictEqual(benchmarks.summarize([0.002, 0.001], 1, 2), dict(
+            requests=2,
+            errors=1,
+            requests_per_second=1.0,
+            latency_ms=dict(p50=1.0, p95=2.0, p99=2.0, max=2.0),
+        ))
+
+
+class TestGenerateFileTree(TempDirMixin, SimpleTestCase):
+
+    def test_generates_tree(self):
+        root_path = self.create_temp_dir()
+        directories = benchmarks.generate_file_tree(
+            root_path, depth=2, fanout=2, files_per_directory=3, file_size=10)
+
+        self.assertEqual(len(directories), 7)
+        self.assertIn(Path("dir0001/dir0000"), directories)
+        files = [p for p in root_path.rglob("*") if p.is_file()]
+        self.assertEqual(len(files), 21)
+        self.assertEqual(files[0].stat().st_size, 10)
+
+
+class TestRunBenchmarks(TempDirMixin, TestCase):
+
+    def test_reports_all_views(self):
+        results = benchmarks.run_benchmarks(
+            self.create_temp_dir(), depth=1, fanout=2, files_per_directory=3, file_size=10,
+            share_count=4, log_count=20, requests=3, warmup=1, seed=0)
+
+        self.assertEqual(results["parameters"]["shares"], 4)
+        self.assertEqual(models.DownloadLog.objects.count(), 24)
+        for view in ("download_share", "files", "shares", "share"):
+            self.assertEqual(results["results"][view]["requests"], 3)
+            self.assertEqual(results["results"][view]["errors"], 0)
+            self.assertIn("p99", results["results"][view]["latency_ms"])
+            self.assertIn("mean", results["results"]
+                          [view]["queries_per_request"])
+
+    def test_compares_session_auth_queries(self):
+        user = get_user_model().objects.create(username="benchmark")
+        results = benchmarks.run_auth_scenarios(user, requests=3, warmup=1)
+
+        queries = {name: result["queries_per_request"]["max"]
+                   for (name, result) in results.items()}
+        self.assertEqual(queries, dict(db=2, cached_db=0, signed_cookies=0))
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from shares.cache import MISSING, InvalidationStamp, LRUCache
+from .utils import TempDirMixin
+
+
+class TestLRUCache(SimpleTestCase):
+
+    def test_get_and_set(self):
+        cache = LRUCache(2)
+        self.assertIs(cache.get("key"), MISSING)
+        cache.set("key", None)
+        self.assertIsNone(cache.get("key"))
+        self.assertDictEqual(cache.stats(), dict(hits=1, misses=1, size=1))
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(cache.get("c"), 3)
+
+    @mock.patch("time.monotonic")
+    def test_expires_entries(self, mock_monotonic):
+        cache = LRUCache(2, ttl=10)
+        mock_monotonic.return_value = 100
+        cache.set("key", "value")
+
+        mock_monotonic.return_value = 109
+        self.assertEqual(cache.get("key"), "value")
+        mock_monotonic.return_value = 110
+        self.assertIs(cache.get("key"), MISSING)
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled_when_empty(self):
+        cache = LRUCache(0)
+        cache.set("key", "value")
+        self.assertIs(cache.get("key"), MISSING)
+
+    def test_delete_where(self):
+        cache = LRUCache(3)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.delete_where(lambda v: v == 2)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIs(cache.get("b"), MISSING)
+
+    def test_bounded_by_total_size(self):
+        cache = LRUCache(5, get_size=len)
+        cache.set("a", [1, 2])
+        cache.set("b", [1, 2])
+        cache.set("a", [1])
+        cache.set("c", [1, 2])
+        self.assertEqual(cache.get("a"), [1])
+        cache.set("d", [1, 2])
+        self.assertIs(cache.get("b"), MISSING)
+        self.assertEqual(len(cache), 3)
+
+        # Too large to cache at all, without evicting anything
+        cache.set("e", [1] * 6)
+        self.assertIs(cache.get("e"), MISSING)
+        self.assertEqual(len(cache), 3)
+
+
+class TestInvalidationStamp(TempDirMixin, SimpleTestCase):
+
+    def test_detects_touch_from_other_instance(self):
+        path = self.create_temp_dir() / "stamp"
+        stamp = InvalidationStamp(path)
+        other_stamp = InvalidationStamp(path)
+        self.assertFalse(stamp.changed())
+
+        other_stamp.touch()
+        self.assertFalse(other_stamp.changed())
+        self.assertTrue(stamp.changed())
+        self.assertFalse(stamp.changed())
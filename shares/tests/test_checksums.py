@@ -0,0 +1,101 @@
+import hashlib
+import os
+from pathlib import Path
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from shares import actions, checksums, models
+from .utils import FilesRootMixin, get_user
+
+
+class TestThrottle(SimpleTestCase):
+
+    @mock.patch("time.sleep")
+    @mock.patch("time.monotonic")
+    def test_limits_rate(self, mock_monotonic, mock_sleep):
+        mock_monotonic.return_value = 100.0
+        throttle = checksums.Throttle(1000)
+        throttle.consume(500)
+        mock_sleep.assert_called_once_with(0.5)
+
+        mock_sleep.reset_mock()
+        mock_monotonic.return_value = 102.0
+        throttle.consume(500)
+        mock_sleep.assert_not_called()
+
+    @mock.patch("time.sleep")
+    def test_unlimited(self, mock_sleep):
+        checksums.Throttle(0).consume(10 ** 9)
+        mock_sleep.assert_not_called()
+
+
+class TestUpdateChecksums(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        (self.root_path / "dir").mkdir()
+        (self.root_path / "dir" / "file").write_bytes(b"data")
+        self.share = models.Share.objects.create(
+            directory="dir", name="file", user=get_user())
+
+    def test_hashes_shared_files(self):
+        models.Share.objects.create(name="dir", user=get_user())
+        models.Share.objects.create(name="missing", user=get_user())
+        stats = checksums.update_checksums()
+        self.assertEqual(
+            (stats.hashed, stats.unchanged, stats.skipped), (1, 0, 2))
+
+        checksum = models.FileChecksum.objects.get()
+        self.assertEqual(checksum.path, "dir/file")
+        self.assertEqual(checksum.sha256, hashlib.sha256(b"data").hexdigest())
+        self.assertTrue(checksum.matches(
+            os.stat(self.root_path / "dir" / "file")))
+
+    def test_only_rehashes_changed_files(self):
+        checksums.update_checksums()
+        with mock.patch("shares.checksums.hash_file") as mock_hash_file:
+            stats = checksums.update_checksums()
+        mock_hash_file.assert_not_called()
+        self.assertEqual(stats.unchanged, 1)
+
+        (self.root_path / "dir" / "file").write_bytes(b"changed")
+        self.assertEqual(checksums.update_checksums().hashed, 1)
+        self.assertEqual(models.FileChecksum.objects.get().sha256,
+                         hashlib.sha256(b"changed").hexdigest())
+
+    def test_skips_files_changed_while_hashing(self):
+        def hash_file(path, throttle):
+            Path(path).write_bytes(b"changed while hashing")
+            return "stale"
+
+        with mock.patch("shares.checksums.hash_file", side_effect=hash_file):
+            stats = checksums.update_checksums()
+        self.assertEqual(stats.skipped, 1)
+        self.assertFalse(models.FileChecksum.objects.exists())
+
+    def test_deletes_unshared_checksums(self):
+        checksums.update_checksums()
+        self.share.delete()
+        self.assertEqual(checksums.update_checksums().deleted, 1)
+        self.assertFalse(models.FileChecksum.objects.exists())
+
+    def test_resolved_shares_include_checksum(self):
+        actions.share_cache.clear()
+        self.assertIsNone(actions.resolve_share(self.share.slug).checksum)
+
+        checksums.update_checksums()
+        stat = os.stat(self.root_path / "dir" / "file")
+        self.assertEqual(actions.resolve_share(self.share.slug).checksum, (
+            stat.st_ino, stat.st_size, stat.st_mtime_ns, hashlib.sha256(b"data").hexdigest()))
+
+    def test_invalidates_cached_shares_once(self):
+        (self.root_path / "other").write_bytes(b"other")
+        models.Share.objects.create(name="other", user=get_user())
+        with mock.patch.object(actions.share_cache_stamp, "touch") as mock_touch:
+            self.assertEqual(checksums.update_checksums().hashed, 2)
+            mock_touch.assert_called_once_with()
+
+            mock_touch.reset_mock()
+            checksums.update_checksums()
+            mock_touch.assert_not_called()
@@ -0,0 +1,109 @@
+import contextlib
+import multiprocessing
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import Client, SimpleTestCase
+from django.urls import reverse
+
+from shares import benchmarks, models
+from .utils import FilesRootMixin
+
+
+PROCESSES = 4
+REQUESTS_PER_PROCESS = 50
+
+
+@contextlib.contextmanager
+def _use_database(path: Path):
+    """Points the default connection at an SQLite file, as a worker process would see it."""
+    original = connections[DEFAULT_DB_ALIAS]
+    connection = original.__class__(
+        {**original.settings_dict, "NAME": str(path)}, DEFAULT_DB_ALIAS)
+    connections[DEFAULT_DB_ALIAS] = connection
+    try:
+        yield connection
+    finally:
+        connection.close()
+        connections[DEFAULT_DB_ALIAS] = original
+
+
+def _download_in_process(db_path, url, barrier, results):
+    latencies = []
+    errors = 0
+    with _use_database(db_path):
+        client = Client()
+        barrier.wait()
+        for _ in range(REQUESTS_PER_PROCESS):
+            start = time.perf_counter()
+            try:
+                response = client.get(url)
+                response.close()
+                if response.status_code != 200:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+    results.put((latencies, errors))
+
+
+class TestConcurrentDownloads(FilesRootMixin, SimpleTestCase):
+    # Runs against its own database file rather than the test database
+    databases = {DEFAULT_DB_ALIAS}
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.db_path = self.root_path.parent / "db.sqlite3"
+        (self.root_path / "file").write_bytes(b"data")
+
+        with _use_database(self.db_path) as connection:
+            with connection.schema_editor() as editor:
+                for model in (User, models.Share, models.DownloadLog, models.FileChecksum):
+                    editor.create_model(model)
+            user = User.objects.create(username="test")
+            self.share = models.Share.objects.create(
+                directory="", name="file", user=user)
+
+    def test_configures_connections(self):
+        with _use_database(self.db_path) as connection:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode")
+                self.assertEqual(cursor.fetchone()[0], "wal")
+                cursor.execute("PRAGMA busy_timeout")
+                self.assertEqual(cursor.fetchone()[0],
+                                 settings.FL_SQLITE_BUSY_TIMEOUT_MS)
+
+    def test_concurrent_download_logs(self):
+        url = reverse("shares:download_share", args=(self.share.slug,))
+        context = multiprocessing.get_context("fork")
+        barrier = context.Barrier(PROCESSES)
+        results = context.Queue()
+        processes = [
+            context.Process(target=_download_in_process,
+                            args=(self.db_path, url, barrier, results))
+            for _ in range(PROCESSES)
+        ]
+        for process in processes:
+            process.start()
+        latencies = []
+        errors = 0
+        for _ in processes:
+            (process_latencies, process_errors) = results.get(timeout=60)
+            latencies.extend(process_latencies)
+            errors += process_errors
+        for process in processes:
+            process.join()
+
+        summary = benchmarks.summarize(latencies, errors, 1)
+        self.assertEqual(summary["errors"], 0)
+        self.assertEqual(summary["requests"], PROCESSES * REQUESTS_PER_PROCESS)
+        # No request should come close to waiting out the busy timeout
+        self.assertLess(summary["latency_ms"]["p99"], 1000)
+        self.assertLess(summary["latency_ms"]["max"],
+                        settings.FL_SQLITE_BUSY_TIMEOUT_MS / 2)
+        with _use_database(self.db_path):
+            self.assertEqual(models.DownloadLog.objects.count(),
+                             PROCESSES * REQUESTS_PER_PROCESS)
@@ -0,0 +1,92 @@
+import datetime
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from shares import actions, deletion, forms, models
+from .utils import get_user
+
+
+class TestDeleteShares(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user = get_user()
+        self.share = models.Share.objects.create(
+            directory="dir", name="file.txt", user=self.user)
+        self.other_share = models.Share.objects.create(
+            directory="dir", name="other.txt", user=self.user)
+        self.enterContext(self.settings(
+            FL_SHARE_DELETE_BATCH_SIZE=2, FL_SHARE_DELETE_BATCH_DELAY=0))
+
+    def _log(self, share):
+        return models.DownloadLog.objects.create(share=share, timestamp=timezone.now())
+
+    def test_purges_logs_and_rollups(self):
+        for _ in range(5):
+            self._log(self.share)
+        other_log = self._log(self.other_share)
+        models.DailyDownloadRollup.objects.create(
+            share=self.share, day=datetime.date(2024, 1, 1), request_count=5)
+
+        self.assertEqual(actions.delete_shares(
+            models.Share.objects.filter(id=self.share.id)), 1)
+        self.assertFalse(models.Share.all_objects.filter(
+            id=self.share.id).exists())
+        self.assertListEqual(list(models.DownloadLog.objects.values_list(
+            "id", flat=True)), [other_log.id])
+        self.assertFalse(models.DailyDownloadRollup.objects.exists())
+
+    def test_hides_shares_until_purged(self):
+        self._log(self.share)
+        with self.settings(FL_SHARE_DELETE_IN_BACKGROUND=True), \
+                mock.patch.object(deletion, "get_purger") as get_purger:
+            actions.delete_shares(
+                models.Share.objects.filter(id=self.share.id))
+        get_purger.return_value.wake.assert_called_once()
+
+        self.assertQuerySetEqual(
+            models.Share.objects.all(), [self.other_share])
+        self.assertIsNone(actions.resolve_share(self.share.slug))
+        # The path can be shared again before the old share is purged
+        form = forms.ShareForm(dict(directory="dir", name="file.txt"))
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.user = self.user
+        new_share = form.save()
+
+        stats = deletion.purge_deleted_shares()
+        self.assertEqual((stats.shares, stats.download_logs), (1, 1))
+        self.assertQuerySetEqual(models.Share.all_objects.order_by("id"),
+                                 [self.other_share, new_share])
+
+    def test_bulk_delete(self):
+        self._log(self.share)
+        self._log(self.other_share)
+        self.assertEqual(actions.bulk_update_shares(
+            self.user, [self.share.id, self.other_share.id], "delete"), 2)
+        self.assertFalse(models.Share.all_objects.exists())
+        self.assertFalse(models.DownloadLog.objects.exists())
+
+    def test_command(self):
+        self._log(self.share)
+        models.Share.objects.filter(
+            id=self.share.id).update(pending_deletion=True)
+        out = StringIO()
+        call_command("purge_deleted_shares", stdout=out)
+        self.assertIn(
+            "Purged 1 deleted shares and 1 download logs", out.getvalue())
+
+
+class TestSharePurger(TestCase):
+
+    def test_purges_in_background(self):
+        purged = threading.Event()
+        purger = deletion.SharePurger()
+        self.addCleanup(purger.shutdown)
+        with mock.patch.object(deletion, "purge_deleted_shares", side_effect=purged.set):
+            purger.wake()
+            self.assertTrue(purged.wait(timeout=5))
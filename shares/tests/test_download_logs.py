@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.http import HttpRequest
+from django.test import TestCase, TransactionTestCase
+
+from shares import download_logs, models
+from .utils import get_user
+
+
+def _create_writer(**kwargs) -> download_logs.DownloadLogWriter:
+    return download_logs.DownloadLogWriter(**dict(dict(
+        batch_size=10,
+        flush_interval=0.01,
+        max_queue_size=10,
+        overflow=download_logs.OVERFLOW_WRITE,
+    ), **kwargs))
+
+
+def _create_log(share_id: int) -> models.DownloadLog:
+    request = HttpRequest()
+    request.META["REMOTE_ADDR"] = "remote_addr"
+    return models.DownloadLog.from_request(request, share_id)
+
+
+class TestDownloadLogWriter(TransactionTestCase):
+
+    def test_writes_in_background(self):
+        share = models.Share.objects.create(name="name", user=get_user())
+        writer = _create_writer(batch_size=2)
+        for _ in range(5):
+            writer.log(_create_log(share.id))
+        writer.shutdown()
+
+        self.assertEqual(models.DownloadLog.objects.filter(
+            share=share, ip="remote_addr").count(), 5)
+
+    @mock.patch.object(download_logs.DownloadLogWriter, "ensure_started")
+    def test_drops_logs_for_deleted_shares(self, _):
+        share = models.Share.objects.create(name="name", user=get_user())
+        writer = _create_writer()
+        writer.log(_create_log(share.id))
+        writer.log(_create_log(share.id + 1))
+        writer.flush()
+
+        self.assertQuerySetEqual(
+            models.DownloadLog.objects.values_list("share_id", flat=True), [share.id])
+
+    def test_rejects_unknown_overflow_policy(self):
+        with self.assertRaises(ValueError):
+            _create_writer(overflow="unknown")
+
+
+@mock.patch.object(download_logs.DownloadLogWriter, "ensure_started")
+class TestDownloadLogWriterOverflow(TestCase):
+
+    def test_writes_synchronously_when_full(self, _):
+        share = models.Share.objects.create(name="name", user=get_user())
+        writer = _create_writer(max_queue_size=1)
+        writer.log(_create_log(share.id))
+        writer.log(_create_log(share.id))
+        self.assertEqual(models.DownloadLog.objects.count(), 1)
+
+        writer.flush()
+        self.assertEqual(models.DownloadLog.objects.count(), 2)
+        self.assertEqual(writer.dropped, 0)
+
+    def test_drops_when_full(self, _):
+        share = models.Share.objects.create(name="name", user=get_user())
+        writer = _create_writer(
+            max_queue_size=1, overflow=download_logs.OVERFLOW_DROP)
+        writer.log(_create_log(share.id))
+        writer.log(_create_log(share.id))
+        writer.flush()
+
+        self.assertEqual(models.DownloadLog.objects.count(), 1)
+        self.assertEqual(writer.dropped, 1)
+
+
+class TestLogDownload(TestCase):
+
+    def test_writes_immediately_when_not_buffered(self):
+        share = models.Share.objects.create(name="name", user=get_user())
+        with self.settings(FL_DOWNLOAD_LOG_BUFFERED=False):
+            download_logs.log_download(HttpRequest(), share.id)
+
+        self.assertEqual(
+            models.DownloadLog.objects.filter(share=share).count(), 1)
+
+    @mock.patch("shares.download_logs.get_writer")
+    def test_queues_when_buffered(self, mock_get_writer):
+        share = models.Share.objects.create(name="name", user=get_user())
+        with self.settings(FL_DOWNLOAD_LOG_BUFFERED=True):
+            download_logs.log_download(HttpRequest(), share.id)
+
+        self.assertEqual(models.DownloadLog.objects.count(), 0)
+        download_log = mock_get_writer.return_value.log.call_args.args[0]
+        self.assertEqual(download_log.share_id, share.id)
@@ -0,0 +1,88 @@
+import csv
+import datetime
+import io
+import json
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from shares import exports, models
+from .utils import TempDirMixin, get_user
+
+
+class TestExports(TempDirMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.share1 = models.Share.objects.create(
+            directory="dir", name="file1", user=get_user())
+        self.share2 = models.Share.objects.create(
+            name="file2", user=get_user())
+        self.logs = [models.DownloadLog.objects.create(
+            timestamp=datetime.datetime(
+                2024, 1, day, tzinfo=datetime.timezone.utc),
+            share=share, ip="1.2.3.4", user_agent="agent, \"quoted\"", range_header="",
+        ) for (day, share) in ((1, self.share1), (2, self.share2), (3, self.share1))]
+
+    def test_csv(self):
+        with self.assertNumQueries(1):
+            output = "".join(exports.iter_csv(exports.get_download_logs()))
+        self.assertEqual(list(csv.reader(io.StringIO(output))), [
+            list(exports.FIELDS),
+            [str(self.logs[0].id), "2024-01-01T00:00:00+00:00", str(self.share1.id),
+             "dir/file1", "1.2.3.4", "agent, \"quoted\"", ""],
+            [str(self.logs[1].id), "2024-01-02T00:00:00+00:00", str(self.share2.id),
+             "file2", "1.2.3.4", "agent, \"quoted\"", ""],
+            [str(self.logs[2].id), "2024-01-03T00:00:00+00:00", str(self.share1.id),
+             "dir/file1", "1.2.3.4", "agent, \"quoted\"", ""],
+        ])
+
+    def test_ndjson(self):
+        with self.assertNumQueries(1):
+            lines = "".join(exports.iter_ndjson(
+                exports.get_download_logs())).splitlines()
+        self.assertEqual(json.loads(lines[0]), dict(
+            id=self.logs[0].id,
+            timestamp="2024-01-01T00:00:00+00:00",
+            share_id=self.share1.id,
+            path="dir/file1",
+            ip="1.2.3.4",
+            user_agent="agent, \"quoted\"",
+            range_header="",
+        ))
+        self.assertEqual(len(lines), 3)
+
+    @mock.patch("shares.exports.ROWS_PER_CHUNK", 2)
+    def test_streams_in_chunks(self):
+        self.assertEqual(
+            len(list(exports.iter_ndjson(exports.get_download_logs()))), 2)
+        self.assertEqual(
+            len(list(exports.iter_csv(exports.get_download_logs()))), 2)
+
+    def test_filters(self):
+        logs = exports.get_download_logs(
+            start=exports.parse_time("2024-01-02T00:00:00Z"), end=exports.parse_time("2024-01-03T00:00:00Z"))
+        self.assertEqual([row[0] for row in logs], [self.logs[1].id])
+
+        logs = exports.get_download_logs(share_id=self.share1.id)
+        self.assertEqual([row[0] for row in logs], [
+                         self.logs[0].id, self.logs[2].id])
+
+    def test_parse_time(self):
+        self.assertEqual(exports.parse_time("2024-01-02"), timezone.make_aware(
+            datetime.datetime(2024, 1, 2)))
+        with self.assertRaises(ValueError):
+            exports.parse_time("yesterday")
+
+    def test_command(self):
+        stdout = io.StringIO()
+        call_command("export_download_logs", format="ndjson",
+                     share=self.share2.id, stdout=stdout)
+        self.assertEqual(json.loads(stdout.getvalue())["id"], self.logs[1].id)
+
+        output_path = self.create_temp_dir() / "logs.csv"
+        call_command("export_download_logs", "--start", "2024-01-02T00:00:00+00:00",
+                     "--output", str(output_path))
+        self.assertEqual(len(output_path.read_text().splitlines()), 3)
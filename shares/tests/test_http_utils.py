@@ -0,0 +1,121 @@
+import io
+import os
+from unittest import mock
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase
+from django.utils.http import http_date
+
+from shares import http_utils
+
+
+class TestStatEtag(SimpleTestCase):
+
+    def test_uses_inode_size_and_mtime(self):
+        stat = mock.MagicMock(spec=os.stat_result)
+        stat.st_ino = 255
+        stat.st_size = 16
+        stat.st_mtime_ns = 4096
+        self.assertEqual(http_utils.stat_etag(stat), "\"ff-10-1000\"")
+
+
+class TestParseRangeHeader(SimpleTestCase):
+
+    def test_single_ranges(self):
+        self.assertEqual(http_utils.parse_range_header(
+            "bytes=0-9", 100), [(0, 9)])
+        self.assertEqual(http_utils.parse_range_header(
+            "bytes=90-", 100), [(90, 99)])
+        self.assertEqual(http_utils.parse_range_header(
+            "bytes=-10", 100), [(90, 99)])
+        self.assertEqual(http_utils.parse_range_header(
+            "bytes=-200", 100), [(0, 99)])
+        self.assertEqual(http_utils.parse_range_header(
+            "bytes=50-200", 100), [(50, 99)])
+
+    def test_multiple_ranges_are_sorted_and_merged(self):
+        self.assertEqual(http_utils.parse_range_header(
+            "bytes=50-59, 0-9", 100), [(0, 9), (50, 59)])
+        self.assertEqual(http_utils.parse_range_header(
+            "bytes=0-9,5-19,20-29,40-", 100), [(0, 29), (40, 99)])
+
+    def test_unsatisfiable(self):
+        self.assertEqual(http_utils.parse_range_header("bytes=100-", 100), [])
+        self.assertEqual(http_utils.parse_range_header("bytes=-0", 100), [])
+        self.assertEqual(http_utils.parse_range_header("bytes=0-", 0), [])
+
+    def test_invalid_is_ignored(self):
+        self.assertIsNone(http_utils.parse_range_header("items=0-9", 100))
+        self.assertIsNone(http_utils.parse_range_header("bytes=9-0", 100))
+        self.assertIsNone(http_utils.parse_range_header("bytes=-", 100))
+        self.assertIsNone(http_utils.parse_range_header("bytes=a-b", 100))
+        self.assertIsNone(http_utils.parse_range_header(
+            "bytes=" + ",".join(f"{i}-{i}" for i in range(0, 200, 2)), 1000))
+
+
+class TestIfRangeMatches(SimpleTestCase):
+
+    def test_matches(self):
+        self.assertTrue(http_utils.if_range_matches(None, "\"etag\"", 1000))
+        self.assertTrue(http_utils.if_range_matches(
+            "\"etag\"", "\"etag\"", 1000))
+        self.assertTrue(http_utils.if_range_matches(
+            http_date(1000), "\"etag\"", 1000.5))
+
+    def test_does_not_match(self):
+        self.assertFalse(http_utils.if_range_matches(
+            "\"other\"", "\"etag\"", 1000))
+        self.assertFalse(http_utils.if_range_matches(
+            "W/\"etag\"", "\"etag\"", 1000))
+        self.assertFalse(http_utils.if_range_matches(
+            http_date(999), "\"etag\"", 1000))
+        self.assertFalse(http_utils.if_range_matches(
+            "invalid", "\"etag\"", 1000))
+
+
+class TestCloseWithResponse(TestCase):
+    # Closing a response sends request_finished, which closes database connections
+
+    def test_sync(self):
+        on_close = mock.Mock()
+        response = StreamingHttpResponse(iter([b"a", b"b"]))
+        http_utils.close_with_response(response, on_close)
+        self.assertEqual(b"".join(response), b"ab")
+        on_close.assert_not_called()
+
+        response.close()
+        response.close()
+        on_close.assert_called_once_with()
+
+    async def test_async(self):
+        async def content():
+            yield b"a"
+
+        on_close = mock.Mock()
+        response = StreamingHttpResponse(content())
+        http_utils.close_with_response(response, on_close)
+        self.assertTrue(response.is_async)
+        self.assertEqual([chunk async for chunk in response], [b"a"])
+
+        response.close()
+        on_close.assert_called_once_with()
+
+    def test_keeps_file_to_stream(self):
+        on_close = mock.Mock()
+        file = io.BytesIO(b"data")
+        response = FileResponse(file)
+        http_utils.close_with_response(response, on_close)
+        # Left for the server's wsgi.file_wrapper
+        self.assertIs(response.file_to_stream, file)
+
+        response.close()
+        self.assertTrue(file.closed)
+        on_close.assert_called_once_with()
+
+
+class TestRunInThread(SimpleTestCase):
+
+    @mock.patch("shares.http_utils.close_old_connections")
+    async def test_closes_old_connections(self, mock_close_old_connections):
+        self.assertEqual(await http_utils.run_in_thread(lambda x: x + 1)(1), 2)
+        self.assertEqual(mock_close_old_connections.call_count, 2)
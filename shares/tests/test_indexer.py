@@ -0,0 +1,126 @@
+import os
+import shutil
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from shares import actions, indexer, models
+from .utils import FilesRootMixin
+
+
+class TestIndexFiles(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        (self.root_path / "dir" / "sub").mkdir(parents=True)
+        (self.root_path / "file1").write_bytes(b"a")
+        (self.root_path / "dir" / "file2").write_bytes(b"ab")
+        (self.root_path / "dir" / "sub" / "file3").touch()
+
+    def _entries(self):
+        return list(models.FileEntry.objects.order_by("path").values_list(
+            "path", "parent", "is_dir", "size"))
+
+    def _bump_mtime(self, path: str):
+        # Directory mtimes may not change within a coarse timestamp tick
+        stat = os.stat(self.root_path / path)
+        os.utime(self.root_path / path, ns=(stat.st_atime_ns,
+                 stat.st_mtime_ns + 1_000_000_000))
+
+    def test_indexes_tree(self):
+        stats = indexer.index_files()
+        self.assertEqual(stats.scanned_directories, 3)
+        self.assertEqual(stats.created, 6)
+        self.assertEqual(self._entries(), [
+            ("", None, True, 0),
+            ("dir", "", True, 0),
+            ("dir/file2", "dir", False, 2),
+            ("dir/sub", "dir", True, 0),
+            ("dir/sub/file3", "dir/sub", False, 0),
+            ("file1", "", False, 1),
+        ])
+
+    def test_skips_unchanged_directories(self):
+        indexer.index_files()
+        stats = indexer.index_files()
+        self.assertEqual(stats.scanned_directories, 0)
+        self.assertEqual(stats.skipped_directories, 3)
+        self.assertEqual(stats.created + stats.updated + stats.deleted, 0)
+
+    def test_picks_up_changes(self):
+        indexer.index_files()
+        (self.root_path / "dir" / "sub" / "file4").write_bytes(b"abc")
+        (self.root_path / "file1").unlink()
+        self._bump_mtime("dir/sub")
+        self._bump_mtime("")
+
+        stats = indexer.index_files()
+        self.assertEqual(stats.scanned_directories, 2)
+        self.assertEqual(stats.skipped_directories, 1)
+        self.assertEqual(self._entries(), [
+            ("", None, True, 0),
+            ("dir", "", True, 0),
+            ("dir/file2", "dir", False, 2),
+            ("dir/sub", "dir", True, 0),
+            ("dir/sub/file3", "dir/sub", False, 0),
+            ("dir/sub/file4", "dir/sub", False, 3),
+        ])
+
+    def test_removes_deleted_subtrees(self):
+        (self.root_path / "dir0").mkdir()
+        indexer.index_files()
+        shutil.rmtree(self.root_path / "dir")
+        self._bump_mtime("")
+
+        indexer.index_files()
+        self.assertEqual(self._entries(), [
+            ("", None, True, 0),
+            ("dir0", "", True, 0),
+            ("file1", "", False, 1),
+        ])
+
+    def test_full_rescan_updates_files(self):
+        indexer.index_files()
+        # Writing in place leaves the directory mtime unchanged
+        (self.root_path / "file1").write_bytes(b"abcd")
+
+        self.assertEqual(indexer.index_files().updated, 0)
+        self.assertEqual(indexer.index_files(full=True).updated, 1)
+        self.assertEqual(models.FileEntry.objects.get(path="file1").size, 4)
+
+    def test_command(self):
+        out = StringIO()
+        call_command("index_files", stdout=out)
+        self.assertIn("3 directories scanned", out.getvalue())
+        self.assertEqual(models.FileEntry.objects.count(), 6)
+
+
+class TestIndexedListing(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.listing_cache.clear()
+        (self.root_path / "dir").mkdir()
+        (self.root_path / "file1").write_bytes(b"a")
+        self.enterContext(self.settings(FL_LISTING_SOURCE="index"))
+
+    def test_lists_from_index(self):
+        indexer.index_files()
+        (self.root_path / "file2").touch()
+
+        (directories, files, parent_path) = actions.get_directories_and_files(Path("."))
+        self.assertEqual(directories, [dict(name="dir/", path=Path("dir"))])
+        self.assertEqual([(f["name"], f["path"], f["size"]) for f in files],
+                         [("file1", Path("file1"), 1)])
+        self.assertIsNone(parent_path)
+
+        (chunks, _) = actions.stream_directories_and_files(Path("."), 10)
+        self.assertEqual([f["name"] for (_, files) in chunks for f in files],
+                         ["file1"])
+
+    def test_falls_back_to_disk(self):
+        (directories, files, _) = actions.get_directories_and_files(Path("."))
+        self.assertEqual(directories, [dict(name="dir/", path=Path("dir"))])
+        self.assertEqual(files, [dict(name="file1", path=Path("file1"))])
@@ -0,0 +1,94 @@
+import errno
+import os
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from shares import actions, checksums, integrity, models
+from .utils import FilesRootMixin, get_user
+
+
+class TestCheckShares(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.enterContext(self.settings(FL_CHECKSUM_MAX_BYTES_PER_SECOND=0))
+        (self.root_path / "dir").mkdir()
+        for name in ("ok.txt", "changed.txt", "became_dir.txt", "unhashed.txt"):
+            (self.root_path / "dir" / name).write_bytes(b"data")
+
+        user = get_user()
+        self.shares = {name: models.Share.objects.create(directory="dir", name=name, user=user)
+                       for name in ("ok.txt", "changed.txt", "became_dir.txt", "missing.txt")}
+        self.shares["directory"] = models.Share.objects.create(
+            name="dir", user=user)
+        checksums.update_checksums()
+        models.Share.objects.create(
+            directory="dir", name="unhashed.txt", user=user)
+
+        (self.root_path / "dir" / "changed.txt").write_bytes(b"more data")
+        (self.root_path / "dir" / "became_dir.txt").unlink()
+        (self.root_path / "dir" / "became_dir.txt").mkdir()
+        os.utime(self.root_path / "dir" / "unhashed.txt", ns=(0, 0))
+
+    def test_reports_problems(self):
+        report = integrity.check_shares(max_workers=4)
+        self.assertEqual(report.checked, 6)
+        problems = {(p.share_id, p.problem) for p in report.problems}
+        self.assertSetEqual(problems, {
+            (self.shares["missing.txt"].id, integrity.MISSING),
+            (self.shares["became_dir.txt"].id, integrity.BECAME_DIRECTORY),
+            (self.shares["changed.txt"].id, integrity.CHANGED),
+        })
+        changed = next(p for p in report.problems if p.problem ==
+                       integrity.CHANGED)
+        self.assertIn("size 4 -> 9", changed.detail)
+
+    def test_disable_missing(self):
+        share = self.shares["missing.txt"]
+        self.assertEqual(actions.resolve_share(
+            share.slug).download_enabled, True)
+        out = StringIO()
+        call_command("check_shares", "--disable-missing", stdout=out)
+        self.assertIn(f"{share.id}\tmissing\tdir/missing.txt", out.getvalue())
+        self.assertIn(
+            "Checked 6 shares: 1 missing, 1 became directories, 1 changed, 0 errors", out.getvalue())
+        self.assertIn("Disabled 1 shares", out.getvalue())
+
+        self.assertQuerySetEqual(
+            models.Share.objects.filter(download_enabled=False), [share])
+        self.assertEqual(actions.resolve_share(
+            share.slug).download_enabled, False)
+
+    def test_other_errors_are_not_missing(self):
+        real_stat = os.stat
+
+        def stat(path, *args, **kwargs):
+            if Path(path).name == "ok.txt":
+                raise OSError(errno.ESTALE, os.strerror(errno.ESTALE))
+            return real_stat(path, *args, **kwargs)
+
+        with mock.patch("os.stat", side_effect=stat):
+            report = integrity.check_shares(max_workers=4)
+        [problem] = [p for p in report.problems if p.problem == integrity.ERROR]
+        self.assertEqual(problem.share_id, self.shares["ok.txt"].id)
+        self.assertEqual(report.get_share_ids(integrity.MISSING), [
+                         self.shares["missing.txt"].id])
+
+    def test_does_not_disable_when_files_root_is_unavailable(self):
+        for files_root_path in (self.root_path / "unmounted", self.root_path / "empty"):
+            (self.root_path / "empty").mkdir(exist_ok=True)
+            with self.settings(FL_FILES_PATH=files_root_path):
+                report = integrity.check_shares(max_workers=4)
+                self.assertIsNotNone(report.files_root_error)
+                self.assertEqual(
+                    len(report.get_share_ids(integrity.MISSING)), 6)
+                with self.assertRaises(CommandError):
+                    call_command("check_shares", "--disable-missing",
+                                 stdout=StringIO(), stderr=StringIO())
+
+        self.assertFalse(models.Share.objects.filter(
+            download_enabled=False).exists())
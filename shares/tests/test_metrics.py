@@ -0,0 +1,188 @@
+import json
+import os
+import subprocess
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from shares import metrics, models
+from .utils import TempDirMixin, create_random_string, get_user
+
+
+class TestRegistry(TempDirMixin, SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.registry = metrics.Registry()
+
+    def test_inc(self):
+        self.registry.inc("filelink_downloads_total", share="1")
+        self.registry.inc("filelink_downloads_total", 2, share="1")
+        self.registry.inc("filelink_downloads_total", share="2")
+
+        counters = self.registry.snapshot()["counters"]
+        self.assertIn(["filelink_downloads_total",
+                      [("share", "1")], 3], counters)
+        self.assertIn(["filelink_downloads_total",
+                      [("share", "2")], 1], counters)
+
+    def test_observe(self):
+        self.registry.observe("filelink_request_duration_seconds", 0.007)
+        self.registry.observe("filelink_request_duration_seconds", 100)
+
+        [[name, labels, values]] = self.registry.snapshot()["histograms"]
+        self.assertEqual(name, "filelink_request_duration_seconds")
+        self.assertEqual(values[1], 1)
+        self.assertEqual(sum(values[:-2]), 1)
+        self.assertEqual(values[-2], 100.007)
+        self.assertEqual(values[-1], 2)
+
+    def test_write(self):
+        metrics_dir = self.create_temp_dir() / "metrics"
+        with self.settings(FL_METRICS_DIR=metrics_dir):
+            self.registry.inc("filelink_downloads_total", share="1")
+            self.registry.write()
+
+            [path] = metrics_dir.glob("*.json")
+            self.assertRegex(path.name, rf"^{os.getpid()}-\d+\.json$")
+            self.assertEqual(json.loads(path.read_text()),
+                             json.loads(json.dumps(self.registry.snapshot())))
+
+            # A reused PID does not overwrite the old process's snapshot
+            self.registry._pid = None
+            self.registry.write()
+            self.assertEqual(len(list(metrics_dir.glob("*.json"))), 2)
+
+
+class TestRender(TempDirMixin, SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        metrics.registry.clear()
+        self.metrics_dir = self.create_temp_dir()
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        metrics.registry.clear()
+
+    def test_sums_processes(self):
+        (self.metrics_dir / "1.json").write_text(json.dumps(dict(
+            counters=[["filelink_downloads_total", [["share", "1"]], 2]],
+            histograms=[["filelink_request_duration_seconds", [["view", "x"]],
+                         [1] + [0] * (len(metrics.DURATION_BUCKETS) - 1) + [0.001, 1]]],
+        )))
+        metrics.registry.inc("filelink_downloads_total", share="1")
+        metrics.registry.observe(
+            "filelink_request_duration_seconds", 20, view="x")
+
+        with self.settings(FL_METRICS_DIR=self.metrics_dir):
+            output = metrics.render()
+
+        self.assertIn("# TYPE filelink_downloads_total counter", output)
+        self.assertIn('filelink_downloads_total{share="1"} 3', output)
+        self.assertIn(
+            'filelink_request_duration_seconds_bucket{view="x",le="0.005"} 1', output)
+        self.assertIn(
+            'filelink_request_duration_seconds_bucket{view="x",le="10.0"} 1', output)
+        self.assertIn(
+            'filelink_request_duration_seconds_bucket{view="x",le="+Inf"} 2', output)
+        self.assertIn(
+            'filelink_request_duration_seconds_sum{view="x"} 20.001', output)
+        self.assertIn(
+            'filelink_request_duration_seconds_count{view="x"} 2', output)
+
+    def test_retires_exited_processes(self):
+        child = subprocess.Popen(["true"])
+        child.wait()
+        dead_path = self.metrics_dir / f"{child.pid}-1.json"
+        dead_path.write_text(json.dumps(dict(
+            counters=[["filelink_downloads_total", [["share", "1"]], 2]], histograms=[])))
+        metrics.registry.inc("filelink_downloads_total", share="1")
+
+        with self.settings(FL_METRICS_DIR=self.metrics_dir):
+            for _ in range(2):
+                output = metrics.render()
+                self.assertIn('filelink_downloads_total{share="1"} 3', output)
+
+        self.assertFalse(dead_path.exists())
+        self.assertTrue((self.metrics_dir / metrics.RETIRED_FILENAME).exists())
+
+    def test_ignores_unreadable_snapshots(self):
+        (self.metrics_dir / "1.json").write_text("{")
+        metrics.registry.inc("filelink_downloads_total", share="1")
+
+        with self.settings(FL_METRICS_DIR=self.metrics_dir):
+            with self.assertLogs(metrics.logger, "WARNING"):
+                output = metrics.render()
+
+        self.assertIn('filelink_downloads_total{share="1"} 1', output)
+
+    def test_escapes_labels(self):
+        metrics.registry.inc("filelink_requests_total", view='a"b\\c')
+
+        with self.settings(FL_METRICS_DIR=self.metrics_dir):
+            output = metrics.render()
+
+        self.assertIn('filelink_requests_total{view="a\\"b\\\\c"} 1', output)
+
+
+class TestMetricsView(TempDirMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        metrics.registry.clear()
+        self.enterContext(self.settings(
+            FL_METRICS_DIR=self.create_temp_dir(), FL_METRICS_TOKEN="secret"))
+
+    def tearDown(self) -> None:
+        super().tearDown()
+        metrics.registry.clear()
+
+    def test_forbidden(self):
+        response = self.client.get(reverse("shares:metrics"))
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.get(reverse("shares:metrics"),
+                                   headers={"Authorization": "Bearer wrong"})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_login(get_user())
+        response = self.client.get(reverse("shares:metrics"))
+        self.assertEqual(response.status_code, 403)
+
+    def test_token(self):
+        response = self.client.get(reverse("shares:metrics"),
+                                   headers={"Authorization": "Bearer secret"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"],
+                         "text/plain; version=0.0.4; charset=utf-8")
+
+    def test_staff(self):
+        self.client.force_login(User.objects.create(
+            username="staff", is_staff=True))
+        response = self.client.get(reverse("shares:metrics"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_records_requests_and_downloads(self):
+        share = models.Share.objects.create(
+            directory=create_random_string(),
+            name=create_random_string(),
+            user=get_user(),
+            download_enabled=False,
+        )
+        self.client.get(reverse("shares:download_share", args=("missing",)))
+        self.client.get(reverse("shares:download_share", args=(share.slug,)))
+
+        response = self.client.get(reverse("shares:metrics"),
+                                   headers={"Authorization": "Bearer secret"})
+        output = response.content.decode()
+        self.assertIn(
+            'filelink_download_rejections_total{reason="not_found"} 1', output)
+        self.assertIn(
+            'filelink_download_rejections_total{reason="disabled"} 1', output)
+        self.assertIn(
+            'filelink_requests_total{status="404",view="shares:download_share"} 2', output)
+        self.assertIn(
+            'filelink_db_queries_total{view="shares:download_share"}', output)
+        self.assertIn('filelink_cache_misses_total{cache="share"}', output)
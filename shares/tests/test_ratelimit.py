@@ -0,0 +1,194 @@
+import multiprocessing
+from unittest import mock
+
+from django.http import HttpResponse
+from django_sendfile.utils import _get_sendfile
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from shares import metrics, models, ratelimit, views
+from .utils import FilesRootMixin, TempDirMixin, create_random_string, get_user
+
+
+def _acquire_in_process(path, limits, results):
+    results.put(ratelimit.RateLimiter(path, 64, 60).acquire(limits))
+
+
+class TestRateLimiter(TempDirMixin, SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.path = self.create_temp_dir() / "ratelimit.bin"
+        self.limiter = ratelimit.RateLimiter(self.path, 64, 60)
+
+    @mock.patch("time.time")
+    def test_rate(self, mock_time):
+        mock_time.return_value = 1000.0
+        limits = [ratelimit.Limit("ip:1", rate=2, burst=3, max_concurrent=0)]
+        for _ in range(3):
+            self.assertIsNone(self.limiter.acquire(limits))
+        self.assertEqual(self.limiter.acquire(limits), 0.5)
+
+        # Other keys have their own buckets
+        self.assertIsNone(self.limiter.acquire(
+            [ratelimit.Limit("ip:2", rate=2, burst=3, max_concurrent=0)]))
+
+        mock_time.return_value = 1000.5
+        self.assertIsNone(self.limiter.acquire(limits))
+        self.assertEqual(self.limiter.acquire(limits), 0.5)
+
+    def test_concurrency(self):
+        limits = [ratelimit.Limit(
+            "share:1", rate=0, burst=0, max_concurrent=2)]
+        self.assertIsNone(self.limiter.acquire(limits))
+        self.assertIsNone(self.limiter.acquire(limits))
+        self.assertEqual(self.limiter.acquire(limits), 1.0)
+
+        self.limiter.release(limits)
+        self.assertIsNone(self.limiter.acquire(limits))
+
+    @mock.patch("time.time")
+    def test_concurrency_expires(self, mock_time):
+        mock_time.return_value = 1000.0
+        limits = [ratelimit.Limit(
+            "share:1", rate=0, burst=0, max_concurrent=1)]
+        self.assertIsNone(self.limiter.acquire(limits))
+        self.assertIsNotNone(self.limiter.acquire(limits))
+
+        mock_time.return_value = 1061.0
+        self.assertIsNone(self.limiter.acquire(limits))
+
+    def test_takes_nothing_when_limited(self):
+        ip_limit = ratelimit.Limit("ip:1", rate=1, burst=1, max_concurrent=0)
+        share_limit = ratelimit.Limit(
+            "share:1", rate=0, burst=0, max_concurrent=1)
+        self.assertIsNone(self.limiter.acquire([share_limit]))
+        self.assertIsNotNone(self.limiter.acquire([ip_limit, share_limit]))
+
+        self.limiter.release([share_limit])
+        self.assertIsNone(self.limiter.acquire([ip_limit, share_limit]))
+
+    def test_unlimited(self):
+        self.assertIsNone(self.limiter.acquire(
+            [ratelimit.Limit("ip:1", rate=0, burst=0, max_concurrent=0)]))
+        self.assertFalse(self.path.exists())
+
+    def test_shared_across_processes(self):
+        limits = [ratelimit.Limit(
+            "share:1", rate=0, burst=0, max_concurrent=1)]
+        self.assertIsNone(self.limiter.acquire(limits))
+
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        process = context.Process(target=_acquire_in_process,
+                                  args=(self.path, limits, results))
+        process.start()
+        process.join()
+        self.assertEqual(results.get(timeout=5), 1.0)
+
+    @mock.patch("time.time")
+    def test_concurrency_expires_after_last_release(self, mock_time):
+        mock_time.return_value = 1000.0
+        limits = [ratelimit.Limit(
+            "share:1", rate=0, burst=0, max_concurrent=2)]
+        self.assertIsNone(self.limiter.acquire(limits))
+
+        # Starting transfers does not keep a leaked one alive
+        mock_time.return_value = 1030.0
+        self.assertIsNone(self.limiter.acquire(limits))
+        mock_time.return_value = 1061.0
+        self.assertIsNone(self.limiter.acquire(limits))
+
+    @mock.patch("time.time")
+    def test_evicts_only_idle_keys(self, mock_time):
+        mock_time.return_value = 1000.0
+        limiter = ratelimit.RateLimiter(self.path, 1, 60)
+        limits = [ratelimit.Limit(f"ip:{i}", rate=1, burst=2, max_concurrent=0)
+                  for i in range(2)]
+        self.assertIsNone(limiter.acquire(limits[:1]))
+        self.assertEqual(limiter.acquire(limits[1:]), 1.0)
+
+        # Once its bucket is full again, the first key loses nothing
+        mock_time.return_value = 1001.0
+        self.assertIsNone(limiter.acquire(limits[1:]))
+        self.assertIsNone(limiter.acquire(limits[1:]))
+        self.assertEqual(limiter.acquire(limits[:1]), 2.0)
+
+    @mock.patch("time.time")
+    def test_does_not_evict_keys_with_transfers(self, mock_time):
+        mock_time.return_value = 1000.0
+        limiter = ratelimit.RateLimiter(self.path, 1, 60)
+        share_limits = [ratelimit.Limit(
+            "share:1", rate=0, burst=0, max_concurrent=1)]
+        ip_limits = [ratelimit.Limit(
+            "ip:1", rate=1, burst=1, max_concurrent=0)]
+        self.assertIsNone(limiter.acquire(share_limits))
+        self.assertEqual(limiter.acquire(ip_limits), 60.0)
+
+        limiter.release(share_limits)
+        self.assertIsNone(limiter.acquire(ip_limits))
+
+
+class TestDownloadRateLimits(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.enterContext(mock.patch.object(ratelimit, "_limiter", ratelimit.RateLimiter(
+            self.create_temp_dir() / "ratelimit.bin", 64, 60)))
+        self.share = models.Share.objects.create(
+            directory=create_random_string(), name=create_random_string(), user=get_user())
+        self.url = reverse("shares:download_share", args=(self.share.slug,))
+
+    @mock.patch("django_sendfile.sendfile")
+    def test_rate_limit(self, mock_sendfile):
+        mock_sendfile.side_effect = lambda *args, **kwargs: HttpResponse()
+        metrics.registry.clear()
+        with self.settings(FL_RATE_LIMIT_IP_RATE=0.5, FL_RATE_LIMIT_IP_BURST=1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "2")
+        self.assertEqual(models.DownloadLog.objects.count(), 1)
+        self.assertIn(["filelink_download_rejections_total", [("reason", "rate_limited")], 1],
+                      metrics.registry.snapshot()["counters"])
+
+    def test_concurrency_released_on_close(self):
+        (self.root_path / self.share.name).write_bytes(b"data")
+        self.share.directory = ""
+        self.share.save()
+        with self.settings(FL_RATE_LIMIT_SHARE_CONCURRENCY=1):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.client.get(self.url).status_code, 429)
+
+            response.close()
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_uncapped_transfers_keep_file_to_stream(self):
+        (self.root_path / self.share.name).write_bytes(b"data")
+        self.share.directory = ""
+        self.share.save()
+        with self.settings(SENDFILE_BACKEND="shares.sendfile_backend",
+                           FL_RATE_LIMIT_IP_CONCURRENCY=0,
+                           FL_RATE_LIMIT_SHARE_CONCURRENCY=0):
+            _get_sendfile.cache_clear()
+            self.addCleanup(_get_sendfile.cache_clear)
+            # The test client wraps streamed content itself
+            response = views.download_share(
+                RequestFactory().get(self.url), self.share.slug)
+            # Left for the server's wsgi.file_wrapper
+            self.assertIsNotNone(response.file_to_stream)
+            response.close()
+
+    def test_offloaded_transfers_are_not_counted(self):
+        (self.root_path / self.share.name).write_bytes(b"data")
+        self.share.directory = ""
+        self.share.save()
+        with self.settings(SENDFILE_BACKEND="django_sendfile.backends.xsendfile",
+                           FL_RATE_LIMIT_SHARE_CONCURRENCY=1):
+            _get_sendfile.cache_clear()
+            self.addCleanup(_get_sendfile.cache_clear)
+            response = self.client.get(self.url)
+            self.assertTrue(response.has_header("X-Sendfile"))
+            self.assertEqual(self.client.get(self.url).status_code, 200)
@@ -0,0 +1,139 @@
+import datetime
+import fcntl
+import gzip
+import json
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from shares import models, retention, rollups
+from .utils import TempDirMixin, get_user
+
+
+def _read_archive(path: Path):
+    return [json.loads(line) for line in gzip.decompress(path.read_bytes()).splitlines()]
+
+
+class TestArchiveDownloadLogs(TempDirMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.archive_dir = self.create_temp_dir()
+        self.enterContext(self.settings(
+            FL_DOWNLOAD_LOG_ARCHIVE_DIR=self.archive_dir,
+            FL_DOWNLOAD_LOG_ARCHIVE_BATCH_SIZE=2,
+            FL_DOWNLOAD_LOG_ARCHIVE_BATCH_DELAY=0,
+        ))
+        self.share = models.Share.objects.create(
+            name="file.txt", directory="dir", user=get_user())
+        self.now = timezone.now()
+
+    def _log(self, days_ago: int, **kwargs):
+        return models.DownloadLog.objects.create(
+            share=self.share, timestamp=self.now - datetime.timedelta(days=days_ago), **kwargs)
+
+    def _archives(self):
+        return sorted(p.name for p in self.archive_dir.glob("*.ndjson.gz"))
+
+    def test_archives_old_logs_by_month(self):
+        old_logs = [self._log(400), self._log(399, ip="ip2"), self._log(370)]
+        recent_log = self._log(10)
+        rollups.update_daily_rollups()
+
+        stats = retention.archive_download_logs(365)
+        self.assertEqual((stats.archived, stats.deleted), (3, 3))
+        self.assertListEqual(list(models.DownloadLog.objects.values_list(
+            "id", flat=True)), [recent_log.id])
+        self.assertEqual(models.DownloadRollupState.get(
+        ).last_archived_log_id, old_logs[-1].id)
+        # Statistics are kept in the rollups
+        self.assertEqual(sum(models.DailyDownloadRollup.objects.values_list(
+            "request_count", flat=True)), 4)
+
+        rows = []
+        for name in self._archives():
+            self.assertRegex(
+                name, r"^download-logs-\d{4}-\d{2}\.\d+\.ndjson\.gz$")
+            rows.extend(_read_archive(self.archive_dir / name))
+        self.assertEqual(len(self._archives()), stats.files)
+        rows.sort(key=lambda row: row["id"])
+        self.assertListEqual([row["id"] for row in rows],
+                             [log.id for log in old_logs])
+        self.assertEqual(rows[1]["ip"], "ip2")
+        self.assertEqual(rows[1]["path"], "dir/file.txt")
+        self.assertEqual(datetime.datetime.fromisoformat(
+            rows[0]["timestamp"]), old_logs[0].timestamp)
+
+    def test_skips_logs_not_rolled_up(self):
+        self._log(400)
+        rollups.update_daily_rollups()
+        not_rolled_up = self._log(400)
+
+        self.assertEqual(retention.archive_download_logs(365).archived, 1)
+        self.assertListEqual(list(models.DownloadLog.objects.values_list(
+            "id", flat=True)), [not_rolled_up.id])
+
+        rollups.update_daily_rollups()
+        self.assertEqual(retention.archive_download_logs(365).archived, 1)
+        self.assertFalse(models.DownloadLog.objects.exists())
+        # Each run writes its own archive
+        self.assertEqual(len(self._archives()), 2)
+
+    def test_rerun_rewrites_unrecorded_archive(self):
+        self._log(400)
+        self._log(400)
+        rollups.update_daily_rollups()
+        retention.archive_download_logs(365)
+        names = self._archives()
+        contents = (self.archive_dir / names[0]).read_bytes()
+
+        # As if the last run had stopped before recording its progress
+        models.DownloadRollupState.objects.update(last_archived_log_id=0)
+        models.DownloadLog.objects.bulk_create([
+            models.DownloadLog(id=row["id"], share=self.share,
+                               timestamp=datetime.datetime.fromisoformat(row["timestamp"]))
+            for row in _read_archive(self.archive_dir / names[0])
+        ])
+        retention.archive_download_logs(365)
+        self.assertListEqual(self._archives(), names)
+        self.assertEqual((self.archive_dir / names[0]).read_bytes(), contents)
+
+    def test_finishes_interrupted_deletes(self):
+        logs = [self._log(400) for _ in range(3)]
+        rollups.update_daily_rollups()
+        models.DownloadRollupState.objects.update(
+            last_archived_log_id=logs[1].id)
+
+        stats = retention.archive_download_logs(365)
+        self.assertEqual((stats.archived, stats.deleted), (1, 3))
+        self.assertFalse(models.DownloadLog.objects.exists())
+
+    def test_nothing_to_archive(self):
+        self._log(10)
+        rollups.update_daily_rollups()
+        stats = retention.archive_download_logs(365)
+        self.assertEqual(
+            (stats.archived, stats.deleted, stats.files), (0, 0, 0))
+        self.assertListEqual(self._archives(), [])
+
+    def test_already_running(self):
+        with open(self.archive_dir / ".lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with self.assertRaises(retention.AlreadyRunningException):
+                retention.archive_download_logs(365)
+
+    def test_command(self):
+        self._log(40)
+        rollups.update_daily_rollups()
+        out = StringIO()
+        call_command("archive_download_logs",
+                     "--retention-days", "30", stdout=out)
+        self.assertIn("Archived 1 download logs to 1 files", out.getvalue())
+        self.assertFalse(models.DownloadLog.objects.exists())
+
+        with self.assertRaises(CommandError):
+            call_command("archive_download_logs",
+                         "--retention-days", "0", stdout=out)
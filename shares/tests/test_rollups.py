@@ -0,0 +1,84 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from shares import models, rollups
+from .utils import get_user
+
+
+def _at(day: int, hour: int) -> datetime.datetime:
+    return timezone.make_aware(datetime.datetime(2024, 1, day, hour))
+
+
+class TestUpdateDailyRollups(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        user = get_user()
+        self.share1 = models.Share.objects.create(name="share1", user=user)
+        self.share2 = models.Share.objects.create(name="share2", user=user)
+
+    def _log(self, share, timestamp, ip="ip1", range_header=""):
+        return models.DownloadLog.objects.create(
+            share=share, timestamp=timestamp, ip=ip, range_header=range_header)
+
+    def _rollups(self):
+        return list(models.DailyDownloadRollup.objects.order_by("share_id", "day").values_list(
+            "share_id", "day", "request_count", "distinct_ips", "range_request_count"))
+
+    def test_rolls_up_by_share_and_day(self):
+        self._log(self.share1, _at(1, 1))
+        self._log(self.share1, _at(1, 2), ip="ip2", range_header="bytes=0-")
+        self._log(self.share1, _at(1, 3))
+        self._log(self.share1, _at(2, 1))
+        self._log(self.share2, _at(1, 1))
+
+        self.assertEqual(rollups.update_daily_rollups(), 3)
+        self.assertListEqual(self._rollups(), [
+            (self.share1.id, datetime.date(2024, 1, 1), 3, 2, 1),
+            (self.share1.id, datetime.date(2024, 1, 2), 1, 1, 0),
+            (self.share2.id, datetime.date(2024, 1, 1), 1, 1, 0),
+        ])
+
+    def test_only_processes_new_logs(self):
+        self._log(self.share1, _at(1, 1))
+        rollups.update_daily_rollups()
+        self.assertEqual(rollups.update_daily_rollups(), 0)
+
+        self._log(self.share1, _at(1, 2), ip="ip2")
+        last_log = self._log(self.share2, _at(3, 1))
+        self.assertEqual(rollups.update_daily_rollups(), 2)
+
+        self.assertListEqual(self._rollups(), [
+            (self.share1.id, datetime.date(2024, 1, 1), 2, 2, 0),
+            (self.share2.id, datetime.date(2024, 1, 3), 1, 1, 0),
+        ])
+        self.assertEqual(models.DownloadRollupState.get(
+        ).last_download_log_id, last_log.id)
+
+    def test_interrupted_run_is_redone(self):
+        self._log(self.share1, _at(1, 1))
+        self._log(self.share1, _at(2, 1))
+        # Fail writing the second day
+        with mock.patch.object(models.DailyDownloadRollup.objects, "bulk_create",
+                               side_effect=[None, RuntimeError()]):
+            with self.assertRaises(RuntimeError):
+                rollups.update_daily_rollups()
+        self.assertEqual(
+            models.DownloadRollupState.get().last_download_log_id, 0)
+
+        self.assertEqual(rollups.update_daily_rollups(), 2)
+        self.assertListEqual(self._rollups(), [
+            (self.share1.id, datetime.date(2024, 1, 1), 1, 1, 0),
+            (self.share1.id, datetime.date(2024, 1, 2), 1, 1, 0),
+        ])
+
+    def test_command(self):
+        self._log(self.share1, _at(1, 1))
+        out = StringIO()
+        call_command("rollup_downloads", stdout=out)
+        self.assertIn("Updated 1 daily download rollups", out.getvalue())
@@ -0,0 +1,92 @@
+import asyncio
+import email
+
+import django_sendfile
+from django.test import AsyncRequestFactory, RequestFactory, TestCase
+
+from shares import http_utils
+from .utils import FilesRootMixin
+
+
+CONTENT = bytes(range(256)) * 4
+
+
+class TestSendfileBackend(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.file_path = self.root_path / "file.bin"
+        self.file_path.write_bytes(CONTENT)
+        self.etag = http_utils.stat_etag(self.file_path.stat())
+
+        self.enterContext(self.settings(
+            SENDFILE_BACKEND="shares.sendfile_backend"))
+
+    def _sendfile(self, factory=RequestFactory(), **headers):
+        request = factory.get("/download", headers=headers)
+        return django_sendfile.sendfile(request, self.file_path.as_posix())
+
+    def _content(self, response):
+        content = b"".join(response)
+        response.close()
+        return content
+
+    def test_full_file(self):
+        response = self._sendfile()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Length"], str(len(CONTENT)))
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertIn("Last-Modified", response)
+        self.assertEqual(self._content(response), CONTENT)
+
+    def test_single_range(self):
+        response = self._sendfile(Range="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["Content-Range"],
+                         f"bytes 10-19/{len(CONTENT)}")
+        self.assertEqual(response["Content-Type"], "application/octet-stream")
+        self.assertEqual(self._content(response), CONTENT[10:20])
+
+    def test_multiple_ranges(self):
+        response = self._sendfile(Range="bytes=0-1,-2")
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith(
+            "multipart/byteranges; boundary="))
+        content = self._content(response)
+        self.assertEqual(response["Content-Length"], str(len(content)))
+
+        message = email.message_from_bytes(
+            f"Content-Type: {response["Content-Type"]}\r\n\r\n".encode() + content)
+        parts = message.get_payload()
+        self.assertEqual(len(parts), 2)
+        self.assertEqual(parts[0]["Content-Range"],
+                         f"bytes 0-1/{len(CONTENT)}")
+        self.assertEqual(parts[0].get_payload(), CONTENT[:2].decode("latin-1"))
+        self.assertEqual(parts[1]["Content-Range"],
+                         f"bytes {len(CONTENT) - 2}-{len(CONTENT) - 1}/{len(CONTENT)}")
+
+    def test_unsatisfiable_range(self):
+        response = self._sendfile(Range=f"bytes={len(CONTENT)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(CONTENT)}")
+        self.assertEqual(response["Content-Length"], "0")
+
+    def test_if_range(self):
+        response = self._sendfile(Range="bytes=0-9", **{"If-Range": self.etag})
+        self.assertEqual(response.status_code, 206)
+        response.close()
+
+        response = self._sendfile(
+            Range="bytes=0-9", **{"If-Range": "\"stale\""})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._content(response), CONTENT)
+
+    def test_streams_asynchronously_under_asgi(self):
+        response = self._sendfile(AsyncRequestFactory(), Range="bytes=5-9")
+        self.assertTrue(response.is_async)
+
+        async def read():
+            return b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(asyncio.run(read()), CONTENT[5:10])
+        response.close()
@@ -0,0 +1,102 @@
+import importlib
+import re
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.templatetags.static import static
+from django.test import TestCase
+
+from shares import startup
+from .utils import TempDirMixin
+
+
+class TestStartup(TempDirMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        temp_path = self.create_temp_dir()
+        self.static_path = temp_path / "static"
+        (self.static_path / "css").mkdir(parents=True)
+        (self.static_path / "css" / "style.css").write_text("body {}")
+        self.enterContext(self.settings(
+            STATICFILES_DIRS=[self.static_path], STATIC_ROOT=temp_path / "root"))
+
+    def test_no_pending_migrations(self):
+        self.assertEqual(startup.get_pending_migrations(), [])
+
+    def test_static_files_digest(self):
+        digest = startup.get_static_files_digest()
+        self.assertEqual(startup.get_static_files_digest(), digest)
+
+        (self.static_path / "css" /
+         "style.css").write_text("body { margin: 0 }")
+        self.assertNotEqual(startup.get_static_files_digest(), digest)
+
+    @mock.patch("shares.management.commands.startup.call_command")
+    def test_skips_unchanged_steps(self, mock_call_command):
+        call_command("startup", stdout=StringIO())
+        self.assertEqual([c.args[0] for c in mock_call_command.call_args_list],
+                         ["generate_secret_key", "collectstatic"])
+
+        mock_call_command.reset_mock()
+        with mock.patch("shares.startup.get_pending_migrations", return_value=[("shares", "0001_initial")]):
+            call_command("startup", stdout=StringIO())
+        self.assertEqual([c.args[0] for c in mock_call_command.call_args_list],
+                         ["generate_secret_key", "migrate"])
+
+    @mock.patch("shares.management.commands.startup.call_command")
+    def test_collects_changed_static_files(self, _):
+        call_command("startup", stdout=StringIO())
+        self.assertFalse(startup.static_files_changed(
+            startup.get_static_files_digest()))
+
+        (self.static_path / "new.js").write_text("")
+        self.assertTrue(startup.static_files_changed(
+            startup.get_static_files_digest()))
+
+    def test_wsgi_import_time(self):
+        self.assertLess(startup.measure_import_time("filelink.wsgi"),
+                        settings.FL_WSGI_IMPORT_BUDGET)
+
+    @mock.patch("shares.management.commands.startup.call_command")
+    @mock.patch("shares.startup.measure_import_time", return_value=10.0)
+    def test_import_time_over_budget(self, *_):
+        with self.assertRaises(CommandError):
+            call_command("startup", check_import_time=True, stdout=StringIO())
+
+
+class TestContainerStartup(TempDirMixin, TestCase):
+
+    def _get_settings_module(self, file_name: str, pattern: str) -> str:
+        match = re.search(pattern, (settings.BASE_DIR /
+                          file_name).read_text(), re.MULTILINE)
+        self.assertIsNotNone(match, file_name)
+        return match.group(1)
+
+    def test_startup_uses_uwsgi_settings(self):
+        self.assertEqual(
+            self._get_settings_module(
+                "run.sh", r"^export DJANGO_SETTINGS_MODULE=(\S+)$"),
+            self._get_settings_module("uwsgi.ini", r"^env = DJANGO_SETTINGS_MODULE=(\S+)$"))
+
+    def test_collects_static_files_for_prod(self):
+        settings_module = self._get_settings_module(
+            "run.sh", r"^export DJANGO_SETTINGS_MODULE=(\S+)$")
+        static_root = self.create_temp_dir()
+        self.enterContext(self.settings(
+            STATIC_ROOT=static_root, STORAGES=importlib.import_module(settings_module).STORAGES))
+
+        def run_command(name, *args, **kwargs):
+            if name != "generate_secret_key":
+                call_command(name, *args, **kwargs)
+
+        with mock.patch("shares.management.commands.startup.call_command", side_effect=run_command):
+            call_command("startup", stdout=StringIO())
+        with self.settings(DEBUG=False):
+            url = static("admin/css/base.css")
+        self.assertRegex(url, r"^/static/admin/css/base\.[0-9a-f]{12}\.css$")
+        self.assertTrue(
+            (static_root / f"{url.removeprefix('/static/')}.gz").exists())
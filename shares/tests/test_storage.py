@@ -0,0 +1,54 @@
+import gzip
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import call_command
+from django.templatetags.static import static
+from django.test import SimpleTestCase
+
+from .utils import TempDirMixin
+
+
+class TestCompressedManifestStaticFilesStorage(TempDirMixin, SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        temp_path = self.create_temp_dir()
+        source_path = temp_path / "source"
+        source_path.mkdir()
+        self.css = "body { background: url(\"image.png\"); }\n" * 20
+        (source_path / "style.css").write_text(self.css)
+        (source_path / "small.js").write_text("let a = 1;")
+        (source_path / "image.png").write_bytes(b"\x89PNG" * 100)
+        self.root_path = temp_path / "root"
+
+        self.enterContext(self.settings(
+            STATICFILES_DIRS=[source_path],
+            STATICFILES_FINDERS=[
+                "django.contrib.staticfiles.finders.FileSystemFinder"],
+            STATIC_ROOT=self.root_path,
+            STORAGES={
+                "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+                "staticfiles": {"BACKEND": "shares.storage.CompressedManifestStaticFilesStorage"},
+            },
+        ))
+        call_command("collectstatic", interactive=False,
+                     verbosity=0, stdout=StringIO())
+
+    def test_hashes_names(self):
+        with self.settings(DEBUG=False):
+            url = static("style.css")
+        self.assertRegex(url, r"^/static/style\.[0-9a-f]{12}\.css$")
+        hashed_path = self.root_path / url.removeprefix("/static/")
+        self.assertIn("image.", hashed_path.read_text())
+
+    def test_compresses_text_files(self):
+        with self.settings(DEBUG=False):
+            hashed_path = self.root_path / \
+                static("style.css").removeprefix("/static/")
+        for path in (self.root_path / "style.css", hashed_path):
+            self.assertEqual(gzip.decompress(Path(f"{path}.gz").read_bytes()),
+                             path.read_bytes())
+
+        self.assertFalse((self.root_path / "small.js.gz").exists())
+        self.assertFalse((self.root_path / "image.png.gz").exists())
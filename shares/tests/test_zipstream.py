@@ -0,0 +1,102 @@
+import io
+import os
+import zipfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from shares import zipstream
+from .utils import FilesRootMixin
+
+
+class TestZipStream(FilesRootMixin, SimpleTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        (self.root_path / "sub").mkdir()
+        (self.root_path / "empty").mkdir()
+        (self.root_path / "file1").write_bytes(b"hello" * 1000)
+        (self.root_path / "sub" / "file2.txt").write_bytes(os.urandom(100_000))
+        (self.root_path / "sub" / "ünïcode").write_bytes(b"")
+        os.symlink(self.root_path / "sub", self.root_path / "link")
+
+    def _read(self, archive: zipstream.ZipStream) -> zipfile.ZipFile:
+        data = b"".join(archive)
+        if archive.size() is not None:
+            self.assertEqual(len(data), archive.size())
+        zip_file = zipfile.ZipFile(io.BytesIO(data))
+        self.assertIsNone(zip_file.testzip())
+        return zip_file
+
+    def _assert_contents(self, zip_file: zipfile.ZipFile):
+        self.assertEqual(zip_file.namelist(), [
+            "share/file1",
+            "share/sub/file2.txt",
+            "share/sub/ünïcode",
+        ])
+        for name in zip_file.namelist():
+            self.assertEqual(zip_file.read(name),
+                             (self.root_path / name.removeprefix("share/")).read_bytes())
+
+    def test_collects_entries(self):
+        entries = zipstream.collect_entries(self.root_path, "share")
+        self.assertEqual([(e.arcname, e.size) for e in entries], [
+            ("share/file1", 5000),
+            ("share/sub/file2.txt", 100_000),
+            ("share/sub/ünïcode", 0),
+        ])
+
+    def test_skips_symlinks_outside_files_root(self):
+        (self.root_path.parent / "secret").write_bytes(b"secret")
+        os.symlink(self.root_path.parent / "secret",
+                   self.root_path / "sub" / "escape")
+        os.symlink(self.root_path / "file1", self.root_path / "sub" / "inside")
+
+        entries = zipstream.collect_entries(self.root_path / "sub", "sub")
+        self.assertEqual([e.arcname for e in entries], [
+                         "sub/file2.txt", "sub/ünïcode"])
+        entries = zipstream.collect_entries(
+            self.root_path / "sub", "sub", self.root_path)
+        self.assertEqual([e.arcname for e in entries], [
+                         "sub/file2.txt", "sub/inside", "sub/ünïcode"])
+
+    def test_store(self):
+        zip_file = self._read(zipstream.ZipStream(
+            zipstream.collect_entries(self.root_path, "share")))
+        self._assert_contents(zip_file)
+        self.assertEqual({i.compress_type for i in zip_file.infolist()},
+                         {zipfile.ZIP_STORED})
+
+    def test_deflate(self):
+        archive = zipstream.ZipStream(zipstream.collect_entries(
+            self.root_path, "share"), compress=True)
+        self.assertIsNone(archive.size())
+        zip_file = self._read(archive)
+        self._assert_contents(zip_file)
+        self.assertLess(zip_file.getinfo("share/file1").compress_size, 5000)
+
+    def test_empty(self):
+        archive = zipstream.ZipStream([])
+        self.assertEqual(self._read(archive).namelist(), [])
+
+    @mock.patch("shares.zipstream.ZIP32_MAX_ENTRIES", 2)
+    @mock.patch("shares.zipstream.ZIP32_LIMIT", 4096)
+    def test_zip64(self):
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                archive = zipstream.ZipStream(zipstream.collect_entries(
+                    self.root_path, "share"), compress=compress)
+                self._assert_contents(self._read(archive))
+
+    def test_truncated_file(self):
+        entries = zipstream.collect_entries(self.root_path, "share")
+        (self.root_path / "file1").write_bytes(b"")
+        with self.assertRaises(OSError):
+            b"".join(zipstream.ZipStream(entries))
+
+    def test_grown_file(self):
+        entries = zipstream.collect_entries(self.root_path, "share")
+        with open(self.root_path / "file1", "ab") as f:
+            f.write(b"more")
+        zip_file = self._read(zipstream.ZipStream(entries))
+        self.assertEqual(zip_file.read("share/file1"), b"hello" * 1000)
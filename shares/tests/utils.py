@@ -1,5 +1,7 @@
 import random
 import string
+import tempfile
+from pathlib import Path
 
 from django.contrib.auth.models import User
 from django.test import TestCase
@@ -7,6 +9,29 @@ from django.test import TestCase
 from shares import models
 
 
+class TempDirMixin:
+
+    def create_temp_dir(self) -> Path:
+        """Creates a directory that is removed after the test."""
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        return Path(temp_dir.name).resolve()
+
+
+class FilesRootMixin(TempDirMixin):
+    """
+    Points FL_FILES_PATH and SENDFILE_ROOT at root_path, an empty directory
+    inside a temporary one, so tests can also place files outside the root.
+    """
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.root_path = self.create_temp_dir() / "files"
+        self.root_path.mkdir()
+        self.enterContext(self.settings(
+            FL_FILES_PATH=self.root_path, SENDFILE_ROOT=self.root_path))
+
+
 class AuthenticatedTestCase(TestCase):
 
     def setUp(self) -> None:
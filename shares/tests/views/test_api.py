@@ -0,0 +1,167 @@
+import os
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.urls import reverse
+
+from shares import actions, models
+from ..utils import AuthenticatedTestCase, FilesRootMixin
+
+
+class TestApiFiles(FilesRootMixin, AuthenticatedTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        (self.root_path / "dir").mkdir()
+        (self.root_path / "dir" / "file1").write_bytes(b"")
+        (self.root_path / "dir" / "file2").write_bytes(b"")
+        (self.root_path / "dir" / "sub").mkdir()
+        self._age_directory()
+        actions.listing_cache.clear()
+        self.url = reverse("shares:api_files")
+
+    def _age_directory(self):
+        mtime = time.time() - 60
+        os.utime(self.root_path / "dir", (mtime, mtime))
+
+    def test_lists_directory(self):
+        share = models.Share.objects.create(
+            directory="dir", name="file1", user=self.user)
+        response = self.client.get(self.url, dict(path="dir"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), dict(
+            path="dir",
+            parent_path=".",
+            directories=[dict(name="sub/", share=None)],
+            files=[dict(name="file1", share=share.id),
+                   dict(name="file2", share=None)],
+        ))
+        self.assertNotIn(b" ", response.content)
+
+        # The cached listing is left as it was
+        response = self.client.get(self.url, dict(path="dir"))
+        self.assertEqual(response.json()["files"][0]["share"], share.id)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url, dict(path="dir"))
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                self.url, dict(path="dir"), headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_etag_changes(self):
+        etag = self.client.get(self.url, dict(path="dir"))["ETag"]
+
+        models.Share.objects.create(
+            directory="dir", name="file2", user=self.user)
+        new_etag = self.client.get(self.url, dict(path="dir"))["ETag"]
+        self.assertNotEqual(new_etag, etag)
+
+        (self.root_path / "dir" / "file3").write_bytes(b"")
+        self._age_directory()
+        self.assertNotEqual(self.client.get(
+            self.url, dict(path="dir"))["ETag"], new_etag)
+
+    def test_no_etag_for_recent_changes(self):
+        (self.root_path / "dir" / "file3").write_bytes(b"")
+        response = self.client.get(self.url, dict(path="dir"))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("ETag"))
+
+    def test_indexed_listing(self):
+        models.FileEntry.objects.create(
+            path="dir", parent="", name="dir", is_dir=True, mtime_ns=1)
+        entry = models.FileEntry.objects.create(
+            path="dir/file1", parent="dir", name="file1", is_dir=False, size=10, mtime_ns=0)
+        with self.settings(FL_LISTING_SOURCE="index"):
+            response = self.client.get(self.url, dict(path="dir"))
+            self.assertEqual(response.json()["files"], [dict(
+                name="file1", size=10, modified="1970-01-01T00:00:00Z", share=None)])
+
+            entry.size = 20
+            entry.save()
+            self.assertNotEqual(self.client.get(
+                self.url, dict(path="dir"))["ETag"], response["ETag"])
+
+    def test_invalid_path(self):
+        response = self.client.get(self.url, dict(path="../"))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, dict(path="missing"))
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+
+class TestApiShares(AuthenticatedTestCase):
+
+    def test_lists_shares(self):
+        share = self.create_share_in_db()
+        response = self.client.get(reverse("shares:api_shares"))
+        self.assertEqual(response.json(), dict(shares=[dict(
+            id=share.id,
+            slug=share.slug,
+            directory=share.directory,
+            name=share.name,
+            download_enabled=True,
+            force_download=True,
+            cache_max_age=0,
+            compress_archive=False,
+            updated_at=DjangoJSONEncoder().default(share.updated_at),
+            download_url=reverse("shares:download_share", args=(share.slug,)),
+        )]))
+
+    def test_not_modified(self):
+        share = self.create_share_in_db()
+        etag = self.client.get(reverse("shares:api_shares"))["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("shares:api_shares"),
+                                       headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        actions.bulk_update_shares(self.user, [share.id], "disable")
+        response = self.client.get(reverse("shares:api_shares"),
+                                   headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["shares"][0]["download_enabled"])
+
+        etag = response["ETag"]
+        share.delete()
+        response = self.client.get(reverse("shares:api_shares"),
+                                   headers={"If-None-Match": etag})
+        self.assertEqual(response.json(), dict(shares=[]))
+
+    def test_share_detail(self):
+        share = self.create_share_in_db()
+        models.DailyDownloadRollup.objects.create(
+            share=share, day="2024-01-01", request_count=3, distinct_ips=2, range_request_count=1)
+        url = reverse("shares:api_share", args=(share.id,))
+        response = self.client.get(url)
+        self.assertEqual(response.json()["share"]["id"], share.id)
+        self.assertEqual(response.json()["daily_downloads"], [dict(
+            day="2024-01-01", request_count=3, distinct_ips=2, range_request_count=1)])
+        self.assertEqual(response.json()["total_downloads"], dict(
+            request_count=3, range_request_count=1))
+
+        etag = response["ETag"]
+        self.assertEqual(self.client.get(
+            url, headers={"If-None-Match": etag}).status_code, 304)
+
+        # New rollups change the download counts
+        models.DownloadRollupState.objects.create(pk=1, last_download_log_id=1)
+        self.assertEqual(self.client.get(
+            url, headers={"If-None-Match": etag}).status_code, 200)
+
+    def test_share_not_found(self):
+        response = self.client.get(reverse("shares:api_share", args=(1,)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(
+            reverse("shares:api_shares")).status_code, 401)
@@ -1,16 +1,27 @@
+import base64
+import hashlib
+import io
+import os
+import zipfile
 from pathlib import Path
 from unittest import mock
 
+from asgiref.sync import sync_to_async
 from django.http import HttpResponse
-from django.test import TestCase
+from django.test import AsyncRequestFactory, TestCase
 from django.urls import reverse
+from django.utils.http import http_date
 
-from shares import models
-from ..utils import create_random_string, get_user
+from shares import actions, checksums, http_utils, metrics, models, views
+from ..utils import FilesRootMixin, create_random_string, get_user
 
 
 class TestDownloadShare(TestCase):
 
+    def setUp(self) -> None:
+        super().setUp()
+        actions.share_cache.clear()
+
     @mock.patch("django_sendfile.sendfile")
     def test_valid_link(self, mock_sendfile):
         mock_sendfile.return_value = HttpResponse()
@@ -80,3 +91,218 @@ class TestDownloadShare(TestCase):
             (mock_files_path / share.directory / share.name).as_posix(),
             attachment=False,
             attachment_filename=share.name)
+
+
+class TestDownloadShareAsync(TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.share_cache.clear()
+
+    @mock.patch("django_sendfile.sendfile")
+    async def test_valid_link(self, mock_sendfile):
+        mock_sendfile.return_value = HttpResponse()
+        mock_files_path = Path(__file__).resolve().parent
+
+        share = await models.Share.objects.acreate(
+            directory=create_random_string(),
+            name=create_random_string(),
+            user=await sync_to_async(get_user)(),
+        )
+
+        request = AsyncRequestFactory().get(
+            reverse("shares:download_share", args=(share.slug,)))
+        with self.settings(FL_FILES_PATH=mock_files_path):
+            response = await views.download_share_async(request, share.slug)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers.get("Accept-Ranges"), "bytes")
+
+        self.assertEqual(
+            await models.DownloadLog.objects.filter(share=share).acount(), 1)
+        mock_sendfile.assert_called_once_with(
+            mock.ANY,
+            (mock_files_path / share.directory / share.name).as_posix(),
+            attachment=True,
+            attachment_filename=share.name)
+
+    async def test_invalid_link(self):
+        request = AsyncRequestFactory().get(
+            reverse("shares:download_share", args=("slug",)))
+        response = await views.download_share_async(request, "slug")
+        self.assertEqual(response.status_code, 404)
+
+    async def test_cannot_download_disabled_share(self):
+        share = await models.Share.objects.acreate(
+            download_enabled=False,
+            directory=create_random_string(),
+            name=create_random_string(),
+            user=await sync_to_async(get_user)(),
+        )
+
+        request = AsyncRequestFactory().get(
+            reverse("shares:download_share", args=(share.slug,)))
+        response = await views.download_share_async(request, share.slug)
+        self.assertEqual(response.status_code, 404)
+
+
+class TestDownloadShareConditional(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.share_cache.clear()
+        (self.root_path / "file.txt").write_text("content")
+        self.stat = (self.root_path / "file.txt").stat()
+        self.etag = http_utils.stat_etag(self.stat)
+
+    def _get(self, share, **headers):
+        return self.client.get(
+            reverse("shares:download_share", args=(share.slug,)), headers=headers)
+
+    def _create_share(self, **kwargs):
+        return models.Share.objects.create(name="file.txt", user=get_user(), **kwargs)
+
+    def test_sets_validators(self):
+        response = self._get(self._create_share())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Last-Modified"],
+                         http_date(self.stat.st_mtime))
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual(b"".join(response.streaming_content), b"content")
+
+    def test_sets_share_cache_control(self):
+        response = self._get(self._create_share(cache_max_age=3600))
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+
+    @mock.patch("django_sendfile.sendfile")
+    def test_not_modified_for_matching_etag(self, mock_sendfile):
+        response = self._get(self._create_share(), **
+                             {"If-None-Match": self.etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], self.etag)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        mock_sendfile.assert_not_called()
+
+    def test_revalidation_is_not_logged(self):
+        share = self._create_share()
+        metrics.registry.clear()
+        self.assertEqual(self._get(share).status_code, 200)
+        self.assertEqual(
+            self._get(share, **{"If-None-Match": self.etag}).status_code, 304)
+        self.assertEqual(models.DownloadLog.objects.filter(
+            share=share).count(), 1)
+        self.assertIn(["filelink_downloads_total", [("share", str(share.id))], 1],
+                      metrics.registry.snapshot()["counters"])
+
+    @mock.patch("django_sendfile.sendfile")
+    def test_not_modified_since(self, mock_sendfile):
+        response = self._get(self._create_share(), **
+                             {"If-Modified-Since": http_date(self.stat.st_mtime + 1)})
+        self.assertEqual(response.status_code, 304)
+        mock_sendfile.assert_not_called()
+
+    def test_modified_for_stale_etag(self):
+        response = self._get(self._create_share(), **
+                             {"If-None-Match": "\"stale\""})
+        self.assertEqual(response.status_code, 200)
+
+    def test_checksum_headers(self):
+        share = self._create_share()
+        checksums.update_checksums()
+        response = self._get(share)
+        self.assertEqual(response["ETag"],
+                         f"\"sha256-{hashlib.sha256(b"content").hexdigest()}\"")
+        digest = base64.b64encode(hashlib.sha256(b"content").digest()).decode()
+        self.assertEqual(response["Repr-Digest"], f"sha-256=:{digest}:")
+        self.assertEqual(response["Digest"], f"SHA-256={digest}")
+
+        response = self._get(share, **{"If-None-Match": response["ETag"]})
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_with_checksum_etag(self):
+        share = self._create_share()
+        checksums.update_checksums()
+        etag = self._get(share)["ETag"]
+        response = self._get(share, Range="bytes=0-2", **{"If-Range": etag})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"con")
+
+    def test_ignores_outdated_checksum(self):
+        share = self._create_share()
+        checksums.update_checksums()
+        (self.root_path / "file.txt").write_text("changed")
+        os.utime(self.root_path / "file.txt", ns=(0, 0))
+        actions.share_cache.clear()
+
+        response = self._get(share)
+        self.assertEqual(response["ETag"], http_utils.stat_etag(
+            (self.root_path / "file.txt").stat()))
+        self.assertFalse(response.has_header("Repr-Digest"))
+
+
+class TestDownloadDirectoryShare(FilesRootMixin, TestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        actions.share_cache.clear()
+        (self.root_path / "dir" / "sub").mkdir(parents=True)
+        (self.root_path / "dir" / "file1").write_bytes(b"a" * 1000)
+        (self.root_path / "dir" / "sub" / "file2").write_bytes(b"b")
+        (self.root_path.parent / "secret").mkdir()
+        (self.root_path.parent / "secret" / "key.txt").write_bytes(b"secret")
+
+    def _assert_archive(self, response, content: bytes):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertEqual(response["Content-Disposition"],
+                         "attachment; filename=\"dir.zip\"")
+        zip_file = zipfile.ZipFile(io.BytesIO(content))
+        self.assertEqual(zip_file.namelist(), ["dir/file1", "dir/sub/file2"])
+        self.assertEqual(zip_file.read("dir/file1"), b"a" * 1000)
+
+    def test_store(self):
+        share = models.Share.objects.create(name="dir", user=get_user())
+        response = self.client.get(
+            reverse("shares:download_share", args=(share.slug,)))
+        content = b"".join(response.streaming_content)
+        self._assert_archive(response, content)
+        self.assertEqual(int(response["Content-Length"]), len(content))
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertEqual(
+            models.DownloadLog.objects.filter(share=share).count(), 1)
+
+    def test_deflate(self):
+        share = models.Share.objects.create(
+            name="dir", compress_archive=True, user=get_user())
+        response = self.client.get(
+            reverse("shares:download_share", args=(share.slug,)))
+        content = b"".join(response.streaming_content)
+        self._assert_archive(response, content)
+        self.assertFalse(response.has_header("Content-Length"))
+
+    def test_outside_files_root(self):
+        (self.root_path / "link").symlink_to(self.root_path.parent / "secret")
+        for (directory, name) in (("..", "secret"), ("", "link"), ("dir/../..", "secret")):
+            share = models.Share.objects.create(
+                directory=directory, name=name, user=get_user())
+            response = self.client.get(
+                reverse("shares:download_share", args=(share.slug,)))
+            self.assertEqual(response.status_code, 404, (directory, name))
+
+    def test_leaves_out_symlinks_outside_files_root(self):
+        (self.root_path / "dir" / "key.txt").symlink_to(
+            self.root_path.parent / "secret" / "key.txt")
+        share = models.Share.objects.create(name="dir", user=get_user())
+        response = self.client.get(
+            reverse("shares:download_share", args=(share.slug,)))
+        self._assert_archive(response, b"".join(response.streaming_content))
+
+    async def test_async(self):
+        share = await models.Share.objects.acreate(
+            name="dir", user=await sync_to_async(get_user)())
+        request = AsyncRequestFactory().get(
+            reverse("shares:download_share", args=(share.slug,)))
+        response = await views.download_share_async(request, share.slug)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        self._assert_archive(response, content)
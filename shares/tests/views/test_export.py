@@ -0,0 +1,52 @@
+import datetime
+import json
+
+from django.urls import reverse
+
+from shares import models
+from ..utils import AuthenticatedTestCase
+
+
+class TestExportDownloadLogs(AuthenticatedTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        self.user.is_staff = True
+        self.user.save()
+        self.share = self.create_share_in_db()
+        self.log = models.DownloadLog.objects.create(
+            timestamp=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc), share=self.share)
+        self.url = reverse("shares:export_download_logs")
+
+    def test_csv(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertEqual(response["Content-Disposition"],
+                         "attachment; filename=\"download-logs.csv\"")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn(self.share.full_path, lines[1])
+
+    def test_ndjson_filtered(self):
+        response = self.client.get(self.url, dict(
+            format="ndjson", start="2023-12-31", end="2024-01-01T00:00:01Z", share=self.share.id))
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(json.loads(b"".join(response.streaming_content))[
+                         "id"], self.log.id)
+
+        response = self.client.get(self.url, dict(
+            format="ndjson", start="2024-01-02T00:00:00Z"))
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+    def test_invalid_parameters(self):
+        for params in (dict(format="xml"), dict(start="yesterday"), dict(share="one")):
+            self.assertEqual(self.client.get(
+                self.url, params).status_code, 400)
+
+    def test_requires_staff(self):
+        self.user.is_staff = False
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.client.logout()
+        self.assertEqual(self.client.get(self.url).status_code, 403)
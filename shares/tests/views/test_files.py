@@ -1,9 +1,10 @@
 from pathlib import Path
 from unittest import mock
 
+from django.test import AsyncRequestFactory
 from django.urls import reverse
 
-from shares import models
+from shares import models, views
 from shares.exceptions import InvalidRequestPathException
 from ..utils import AuthenticatedTestCase
 
@@ -28,10 +29,10 @@ class TestGetFiles(AuthenticatedTestCase):
         self.assertContains(response, "<title>Browse Files | FileLink</title>")
         self.assertNotContains(response, "Parent")
         self.assertContains(response, f"""
-        <tr><td><a href="{files_url}?path=dir1">dir1</a></td><td></td></tr>
-        <tr><td><a href="{files_url}?path=dir2">dir2</a></td><td></td></tr>
-        <tr><td>file1</td><td><a href="{reverse("shares:share", args=(file1_share.id,))}">Manage</a></td></tr>
-        <tr><td>file2</td><td><a href="{new_share_url}?path=file2">Share</a></td></tr>
+        <tr><td><input type="checkbox" name="path" value="dir1"></td><td><a href="{files_url}?path=dir1">dir1</a></td><td><a href="{reverse("shares:new_share")}?path=dir1">Share</a></td></tr>
+        <tr><td><input type="checkbox" name="path" value="dir2"></td><td><a href="{files_url}?path=dir2">dir2</a></td><td><a href="{reverse("shares:new_share")}?path=dir2">Share</a></td></tr>
+        <tr><td></td><td>file1</td><td><a href="{reverse("shares:share", args=(file1_share.id,))}">Manage</a></td></tr>
+        <tr><td><input type="checkbox" name="path" value="file2"></td><td>file2</td><td><a href="{new_share_url}?path=file2">Share</a></td></tr>
                             """, html=True)
 
     @mock.patch("shares.actions.get_directories_and_files")
@@ -56,3 +57,112 @@ class TestGetFiles(AuthenticatedTestCase):
         response = self.client.get(files_url)
         self.assertRedirects(response, files_url,
                              fetch_redirect_response=False)
+
+    @mock.patch("shares.actions.get_directories_and_files")
+    def test_paginates_listing(self, mock_get_directories_and_files):
+        mock_get_directories_and_files.return_value = (
+            [dict(name="dir1/", path="dir1")],
+            [dict(name="file1", path="file1"),
+             dict(name="file2", path="file2")],
+            None,
+        )
+
+        files_url = reverse("shares:files")
+        response = self.client.get(files_url, dict(limit=2))
+        self.assertContains(response, "dir1/")
+        self.assertContains(response, "file1")
+        self.assertNotContains(response, "file2")
+        self.assertContains(
+            response, f"<a href=\"{files_url}?path=.&amp;after=file1&amp;limit=2\">Next</a>", html=True)
+
+        response = self.client.get(files_url, dict(after="file1", limit=2))
+        self.assertNotContains(response, "file1")
+        self.assertContains(response, "file2")
+        self.assertNotContains(response, "Next")
+
+    @mock.patch("shares.actions.stream_directories_and_files")
+    def test_streams_listing(self, mock_stream_directories_and_files):
+        mock_stream_directories_and_files.return_value = (
+            iter([
+                ([dict(name="dir1/", path="dir1")], []),
+                ([], [dict(name="file1", path="file1")]),
+            ]),
+            Path("parent"),
+        )
+
+        file1_share = models.Share.objects.create(
+            directory="", name="file1", user=self.user)
+
+        files_url = reverse("shares:files")
+        response = self.client.get(files_url, dict(stream=1))
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        self.assertInHTML(f"""
+        <tbody>
+        <tr><td></td><td><a href="{files_url}?path=parent">Parent</a></td><td></td></tr>
+        <tr><td><input type="checkbox" name="path" value="dir1"></td><td><a href="{files_url}?path=dir1">dir1/</a></td><td><a href="{reverse("shares:new_share")}?path=dir1">Share</a></td></tr>
+        <tr><td></td><td>file1</td><td><a href="{reverse("shares:share", args=(file1_share.id,))}">Manage</a></td></tr>
+        </tbody>
+                          """, content)
+
+    @mock.patch("shares.actions.stream_directories_and_files")
+    def test_stream_redirects_on_invalid_path(self, mock_stream_directories_and_files):
+        mock_stream_directories_and_files.side_effect = InvalidRequestPathException()
+
+        files_url = reverse("shares:files")
+        response = self.client.get(files_url, dict(stream=1))
+        self.assertRedirects(response, files_url,
+                             fetch_redirect_response=False)
+
+
+class TestGetFilesAsync(AuthenticatedTestCase):
+
+    def _create_request(self, **params):
+        request = AsyncRequestFactory().get(reverse("shares:files"), params)
+        request.user = self.user
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        return request
+
+    @mock.patch("shares.actions.get_directories_and_files")
+    async def test_displays_files_and_directories_in_order(self, mock_get_directories_and_files):
+        mock_get_directories_and_files.return_value = (
+            [dict(name="dir1/", path="dir1")],
+            [dict(name="file1", path="file1"),
+             dict(name="file2", path="file2")],
+            None,
+        )
+
+        file1_share = await models.Share.objects.acreate(
+            directory="", name="file1", user=self.user)
+
+        response = await views.files_async(self._create_request())
+        files_url = reverse("shares:files")
+        self.assertContains(response, f"""
+        <tr><td><input type="checkbox" name="path" value="dir1"></td><td><a href="{files_url}?path=dir1">dir1/</a></td><td><a href="{reverse("shares:new_share")}?path=dir1">Share</a></td></tr>
+        <tr><td></td><td>file1</td><td><a href="{reverse("shares:share", args=(file1_share.id,))}">Manage</a></td></tr>
+        <tr><td><input type="checkbox" name="path" value="file2"></td><td>file2</td><td><a href="{reverse("shares:new_share")}?path=file2">Share</a></td></tr>
+                            """, html=True)
+
+    @mock.patch("shares.actions.get_directories_and_files")
+    async def test_redirects_when_get_directories_and_files_raises(self, mock_get_directories_and_files):
+        mock_get_directories_and_files.side_effect = InvalidRequestPathException()
+
+        response = await views.files_async(self._create_request())
+        self.assertRedirects(response, reverse("shares:files"),
+                             fetch_redirect_response=False)
+
+    @mock.patch("shares.actions.stream_directories_and_files")
+    async def test_streams_listing(self, mock_stream_directories_and_files):
+        mock_stream_directories_and_files.return_value = (
+            iter([([], [dict(name="file1", path="file1")])]),
+            None,
+        )
+
+        response = await views.files_async(self._create_request(stream=1))
+        content = "".join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertInHTML(
+            f"<tr><td><input type=\"checkbox\" name=\"path\" value=\"file1\"></td><td>file1</td><td><a href=\"{reverse("shares:new_share")}?path=file1\">Share</a></td></tr>",
+            content)
@@ -0,0 +1,49 @@
+from django.urls import reverse
+
+from shares import models
+from ..utils import AuthenticatedTestCase
+
+
+class TestSearch(AuthenticatedTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        for (path, is_dir) in (("dir", True), ("dir/file1", False), ("dir/file2", False)):
+            models.FileEntry.objects.create(
+                path=path, parent=path.rpartition("/")[0], name=path.rpartition("/")[2], is_dir=is_dir)
+
+    def test_get(self):
+        response = self.client.get(reverse("shares:search"))
+        self.assertContains(
+            response, "<input type=\"search\" name=\"q\" value=\"\" autofocus>", html=True)
+        self.assertIsNone(response.context["results"])
+
+    def test_displays_results(self):
+        share = models.Share.objects.create(
+            directory="dir", name="file1", user=self.user)
+        response = self.client.get(reverse("shares:search"), dict(q="dir"))
+        files_url = reverse("shares:files")
+        self.assertContains(response, f"""
+        <tr><td><a href="{files_url}?path=dir">dir/</a></td><td><a href="{reverse("shares:new_share")}?path=dir">Share</a></td></tr>
+        <tr><td>dir/file1</td><td><a href="{reverse("shares:share", args=(share.id,))}">Manage</a></td></tr>
+        <tr><td>dir/file2</td><td><a href="{reverse("shares:new_share")}?path=dir/file2">Share</a></td></tr>
+                            """, html=True)
+        self.assertNotContains(response, "Showing the first")
+
+    def test_marks_shared_directories(self):
+        share = models.Share.objects.create(name="dir", user=self.user)
+        response = self.client.get(reverse("shares:search"), dict(q="dir"))
+        self.assertContains(response, f"""
+        <tr><td><a href="{reverse("shares:files")}?path=dir">dir/</a></td>
+        <td><a href="{reverse("shares:share", args=(share.id,))}">Manage</a></td></tr>
+                            """, html=True)
+
+    def test_notes_truncated_results(self):
+        with self.settings(FL_SEARCH_MAX_RESULTS=2):
+            response = self.client.get(reverse("shares:search"), dict(q="dir"))
+        self.assertContains(response, "Showing the first 2 results.")
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.client.get(reverse("shares:search"), dict(q="dir"))
+        self.assertEqual(response.status_code, 302)
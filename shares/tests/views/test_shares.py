@@ -1,9 +1,11 @@
+import datetime
+import hashlib
 from unittest import mock
 
 from django.urls import reverse
 
-from shares import forms, models
-from ..utils import AuthenticatedTestCase, create_random_string
+from shares import checksums, forms, models
+from ..utils import AuthenticatedTestCase, FilesRootMixin, create_random_string
 
 
 class TestNewShare(AuthenticatedTestCase):
@@ -22,6 +24,7 @@ class TestNewShare(AuthenticatedTestCase):
             response,
             "<input type='checkbox' name='force_download' id='id_force_download' checked>",
             html=True)
+        self.assertContains(response, "Cache Max Age (Seconds)")
         self.assertIsNotNone(response.context["form"])
         self.assertIsInstance(response.context["form"], forms.ShareForm)
 
@@ -40,6 +43,17 @@ class TestNewShare(AuthenticatedTestCase):
         self.assertEqual(share.directory, share_directory)
         self.assertEqual(share.name, share_name)
         self.assertTrue(share.slug)
+        self.assertEqual(share.cache_max_age, 0)
+
+    def test_post_cache_max_age(self):
+        response = self.client.post(reverse("shares:new_share"), dict(
+            directory="",
+            name=create_random_string(),
+            cache_max_age=60,
+        ))
+        self.assertRedirects(response, reverse(
+            "shares:index"), fetch_redirect_response=False)
+        self.assertEqual(models.Share.objects.get().cache_max_age, 60)
 
     def test_post_invalid(self):
         response = self.client.post(reverse("shares:new_share"))
@@ -58,6 +72,19 @@ class TestNewShare(AuthenticatedTestCase):
         self.assertContains(
             response, "Share with this Containing Directory and Shared File Name already exists.")
 
+    def test_requires_path_inside_files_root(self):
+        for (directory, name) in (("..", "secret"), ("/etc", "passwd"), ("dir", "a/b"), ("dir", "..")):
+            form = forms.ShareForm(dict(directory=directory, name=name))
+            self.assertFalse(form.is_valid(), (directory, name))
+
+        response = self.client.post(reverse("shares:new_share"), dict(
+            directory="..",
+            name="secret",
+        ))
+        self.assertContains(
+            response, "The shared path must be inside the files directory.")
+        self.assertFalse(models.Share.objects.exists())
+
 
 class TestGetShares(AuthenticatedTestCase):
 
@@ -67,6 +94,7 @@ class TestGetShares(AuthenticatedTestCase):
         response = self.client.get(reverse("shares:shares"))
         self.assertContains(response, f"""
             <tr>
+                <td><input type="checkbox" name="share" value="{share1.id}"></td>
                 <td>{share1.name}</td>
                 <td><a href="{reverse("shares:download_share", args=(share1.slug,))}">Direct Download</a></td>
                 <td>
@@ -76,6 +104,7 @@ class TestGetShares(AuthenticatedTestCase):
                 </td>
             </tr>
             <tr>
+                <td><input type="checkbox" name="share" value="{share2.id}"></td>
                 <td>{share2.directory}/{share2.name}</td>
                 <td><a href="{reverse("shares:download_share", args=(share2.slug,))}">Direct Download</a></td>
                 <td>
@@ -91,7 +120,7 @@ class TestGetShares(AuthenticatedTestCase):
         self.assertContains(response, "<tbody></tbody>", html=True)
 
 
-class TestGetShare(AuthenticatedTestCase):
+class TestGetShare(FilesRootMixin, AuthenticatedTestCase):
 
     def test_displays_share(self):
         share = self.create_share_in_db()
@@ -101,6 +130,32 @@ class TestGetShare(AuthenticatedTestCase):
         self.assertContains(response, f"<a href=\"{reverse(
             "shares:download_share", args=(share.slug,))}\">Direct Download</a>", html=True)
         self.assertContains(response, f"{share.directory}/{share.name}")
+        self.assertNotContains(response, "SHA-256")
+
+    def test_displays_checksum(self):
+        share = models.Share.objects.create(name="file", user=self.user)
+        (self.root_path / "file").write_bytes(b"data")
+        checksums.update_checksums()
+        response = self.client.get(reverse("shares:share", args=(share.id,)))
+        self.assertContains(
+            response, f"<p>SHA-256: <code>{hashlib.sha256(b"data").hexdigest()}</code></p>", html=True)
+
+    def test_displays_daily_downloads(self):
+        share = self.create_share_in_db()
+        models.DailyDownloadRollup.objects.create(
+            share=share, day=datetime.date(2024, 1, 1), request_count=5, distinct_ips=2, range_request_count=1)
+        models.DailyDownloadRollup.objects.create(
+            share=share, day=datetime.date(2024, 1, 2), request_count=3, distinct_ips=1, range_request_count=0)
+
+        response = self.client.get(reverse("shares:share", args=(share.id,)))
+        self.assertContains(
+            response, "Total requests: 8 (1 range requests)")
+        self.assertContains(response, """
+            <tbody>
+                <tr><td>2024-01-02</td><td>3</td><td>1</td><td>0</td></tr>
+                <tr><td>2024-01-01</td><td>5</td><td>2</td><td>1</td></tr>
+            </tbody>
+        """, html=True)
 
 
 class TestDeleteShare(AuthenticatedTestCase):
@@ -126,6 +181,20 @@ class TestDeleteShare(AuthenticatedTestCase):
 
         self.assertQuerySetEqual(models.Share.objects.filter(id=share.id), [])
 
+    def test_post_in_background(self):
+        share = self.create_share_in_db()
+        models.DownloadLog.objects.create(
+            share=share, timestamp=datetime.datetime.now(datetime.timezone.utc))
+        with self.settings(FL_SHARE_DELETE_IN_BACKGROUND=True), \
+                mock.patch("shares.deletion.get_purger") as get_purger:
+            self.client.post(reverse("shares:delete_share", args=(share.id,)))
+        get_purger.return_value.wake.assert_called_once()
+
+        # Hidden right away, and purged by the background thread later
+        self.assertQuerySetEqual(models.Share.objects.filter(id=share.id), [])
+        self.assertTrue(models.DownloadLog.objects.filter(
+            share_id=share.id).exists())
+
 
 class ShareEditViewTests(AuthenticatedTestCase):
 
@@ -184,3 +253,116 @@ class ShareEditViewTests(AuthenticatedTestCase):
         db_share = models.Share.objects.get(pk=share.id)
         self.assertEqual(not share.download_enabled, db_share.download_enabled)
         self.assertEqual(not share.force_download, db_share.force_download)
+
+
+class TestBulkShares(FilesRootMixin, AuthenticatedTestCase):
+
+    def setUp(self) -> None:
+        super().setUp()
+        (self.root_path / "dir").mkdir()
+        (self.root_path / "dir" / "file1").touch()
+        (self.root_path / "file2").touch()
+
+    def test_new(self):
+        response = self.client.post(reverse("shares:bulk_new_share"), dict(
+            path=["dir", "file2"],
+            download_enabled="on",
+        ))
+        self.assertRedirects(response, reverse(
+            "shares:shares"), fetch_redirect_response=False)
+
+        shares = models.Share.objects.order_by("name")
+        self.assertEqual([s.full_path for s in shares], ["dir/file1", "file2"])
+        self.assertTrue(all(s.download_enabled and not s.force_download
+                            and s.user == self.user for s in shares))
+
+    def test_new_invalid_path(self):
+        response = self.client.post(
+            reverse("shares:bulk_new_share"), dict(path=["../"]))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.Share.objects.exists())
+
+    def test_new_too_many_files(self):
+        with self.settings(FL_BULK_SHARE_MAX_FILES=1):
+            response = self.client.post(
+                reverse("shares:bulk_new_share"), dict(path=["."]))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(models.Share.objects.exists())
+
+    def test_action(self):
+        share1 = self.create_share_in_db()
+        share2 = self.create_share_in_db()
+        response = self.client.post(reverse("shares:bulk_share_action"), dict(
+            action="disable",
+            share=[share1.id],
+        ))
+        self.assertRedirects(response, reverse(
+            "shares:shares"), fetch_redirect_response=False)
+        self.assertFalse(models.Share.objects.get(
+            id=share1.id).download_enabled)
+        self.assertTrue(models.Share.objects.get(
+            id=share2.id).download_enabled)
+
+        self.client.post(reverse("shares:bulk_share_action"), dict(
+            action="delete",
+            share=[share1.id, share2.id],
+        ))
+        self.assertFalse(models.Share.objects.exists())
+
+    def test_action_invalid(self):
+        share = self.create_share_in_db()
+        response = self.client.post(reverse("shares:bulk_share_action"), dict(
+            action="unknown", share=[share.id]))
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(reverse("shares:bulk_share_action"), dict(
+            action="delete", share=["x"]))
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(models.Share.objects.exists())
+
+    def test_api_create(self):
+        response = self.client.post(reverse("shares:api_bulk_shares"), dict(
+            action="create",
+            paths=["dir", "file2"],
+            force_download=False,
+        ), content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+
+        shares = {s.full_path: s for s in models.Share.objects.all()}
+        self.assertEqual(response.json(), dict(
+            created=[dict(id=shares[path].id, slug=shares[path].slug, path=path)
+                     for path in ("dir/file1", "file2")],
+            skipped=[],
+        ))
+        self.assertFalse(shares["file2"].force_download)
+        self.assertTrue(shares["file2"].download_enabled)
+
+        response = self.client.post(reverse("shares:api_bulk_shares"), dict(
+            action="create",
+            paths=["file2"],
+        ), content_type="application/json")
+        self.assertEqual(response.json(), dict(created=[], skipped=["file2"]))
+
+    def test_api_update(self):
+        share = self.create_share_in_db()
+        response = self.client.post(reverse("shares:api_bulk_shares"), dict(
+            action="disable",
+            ids=[share.id],
+        ), content_type="application/json")
+        self.assertEqual(response.json(), dict(count=1))
+        self.assertFalse(models.Share.objects.get().download_enabled)
+
+    def test_api_invalid(self):
+        for body in ("[]", "{", '{"action": "create", "paths": "file2"}',
+                     '{"action": "create", "paths": ["../"]}', '{"action": "delete", "ids": "1"}'):
+            response = self.client.post(reverse("shares:api_bulk_shares"), body,
+                                        content_type="application/json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+    def test_api_requires_login(self):
+        self.client.logout()
+        response = self.client.post(reverse("shares:api_bulk_shares"), dict(
+            action="create", paths=["file2"]), content_type="application/json")
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(models.Share.objects.exists())
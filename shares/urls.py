@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path
 
 from . import views
@@ -5,12 +6,26 @@ from . import views
 app_name = "shares"
 urlpatterns = [
     path("", views.index, name="index"),
-    path("files", views.files, name="files"),
+    path("files", views.files_async if settings.FL_ASYNC_VIEWS else views.files,
+         name="files"),
+    path("search", views.search, name="search"),
     path("shares", views.shares, name="shares"),
     path("shares/new", views.new_share, name="new_share"),
+    path("shares/bulk/new", views.bulk_new_share, name="bulk_new_share"),
+    path("shares/bulk/action", views.bulk_share_action,
+         name="bulk_share_action"),
     path("shares/<int:share_id>", views.share, name="share"),
     path("shares/<int:share_id>/edit", views.edit_share, name="edit_share"),
     path("shares/<int:share_id>/delete",
          views.delete_share, name="delete_share"),
-    path("download/<share_slug>", views.download_share, name="download_share"),
+    path("download/<share_slug>",
+         views.download_share_async if settings.FL_ASYNC_VIEWS else views.download_share,
+         name="download_share"),
+    path("api/files", views.api_files, name="api_files"),
+    path("api/shares", views.api_shares, name="api_shares"),
+    path("api/shares/<int:share_id>", views.api_share, name="api_share"),
+    path("api/shares/bulk", views.api_bulk_shares, name="api_bulk_shares"),
+    path("download-logs/export", views.export_download_logs,
+         name="export_download_logs"),
+    path("metrics", views.metrics_view, name="metrics"),
 ]
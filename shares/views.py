@@ -1,14 +1,32 @@
+import base64
+import functools
+import json
+import math
 from pathlib import Path
+from stat import S_ISDIR
+from typing import Any, Callable, Dict, List, Tuple
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.http import HttpRequest, HttpResponse, HttpResponseNotFound
+from django.db.models import Sum
+from django.http import HttpRequest, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotFound, \
+    JsonResponse, QueryDict, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render, resolve_url
-from django.views.decorators.http import require_GET
+from django.template import loader
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import content_disposition_header, http_date
+from django.views.decorators.http import require_GET, require_POST
 import django_sendfile
 
-from shares import actions, forms, models
-from shares.exceptions import InvalidRequestPathException
+from shares import actions, download_logs, exports, forms, http_utils, metrics, models, ratelimit, zipstream
+from shares.exceptions import InvalidRequestPathException, TooManyFilesException
+
+
+# Must match the marker in shares/files.html
+FILES_ROWS_MARKER = "<!-- files rows -->"
 
 
 def index(_: HttpRequest):
@@ -18,20 +36,149 @@ def index(_: HttpRequest):
 @login_required
 @require_GET
 def files(request: HttpRequest):
+    requested_path = Path(request.GET.get("path", default="."))
+    if request.GET.get("stream"):
+        return _stream_files(request, requested_path)
+
     try:
-        requested_path = Path(request.GET.get("path", default="."))
         (directories, files, parent_path) = actions.get_directories_and_files(
             requested_path)
     except InvalidRequestPathException:
         return redirect("shares:files")
 
-    shares_for_path = actions.get_shares_for_directory(requested_path)
-    return render(request, "shares/files.html", dict(
+    context = _get_files_page_context(
+        request, requested_path, directories, files, parent_path)
+    context["shares"] = actions.get_shares_for_directory(
+        requested_path, _get_share_names(context["directories"], context["files"]))
+    return render(request, "shares/files.html", context)
+
+
+@login_required
+@require_GET
+async def files_async(request: HttpRequest):
+    requested_path = Path(request.GET.get("path", default="."))
+    if request.GET.get("stream"):
+        return await _astream_files(request, requested_path)
+
+    try:
+        (directories, files, parent_path) = await http_utils.run_in_thread(
+            actions.get_directories_and_files)(requested_path)
+    except InvalidRequestPathException:
+        return redirect("shares:files")
+
+    context = _get_files_page_context(
+        request, requested_path, directories, files, parent_path)
+    context["shares"] = await actions.aget_shares_for_directory(
+        requested_path, _get_share_names(context["directories"], context["files"]))
+    return await sync_to_async(render)(request, "shares/files.html", context)
+
+
+def _get_files_page_context(request: HttpRequest, requested_path: Path,
+                            directories: List[Dict[str, Any]], files: List[Dict[str, Any]],
+                            parent_path: Path | None) -> Dict[str, Any]:
+    limit = _get_page_size(request)
+    (directories, files, next_cursor) = actions.paginate_directories_and_files(
+        directories, files, request.GET.get("after"), limit)
+
+    next_query = None
+    if next_cursor is not None:
+        next_query = QueryDict(mutable=True)
+        next_query.update(dict(path=requested_path.as_posix(),
+                          after=next_cursor, limit=limit))
+
+    return dict(
         title="Browse Files",
         parent_path=parent_path,
         directories=directories,
         files=files,
-        shares=shares_for_path,
+        next_query=next_query.urlencode() if next_query else None,
+    )
+
+
+def _get_share_names(directories: List[Dict[str, Any]], files: List[Dict[str, Any]]) -> List[str]:
+    # Directory names end with a slash in listings
+    return [d["name"][:-1] for d in directories] + [f["name"] for f in files]
+
+
+def _get_page_size(request: HttpRequest) -> int:
+    try:
+        limit = int(request.GET["limit"])
+    except (KeyError, ValueError):
+        return settings.FL_FILES_PAGE_SIZE
+    return max(1, min(limit, settings.FL_FILES_MAX_PAGE_SIZE))
+
+
+def _render_streamed_files_page(request: HttpRequest, parent_path: Path | None) -> Tuple[str, str]:
+    """Renders the files page around the rows, split where the rows go."""
+    page = loader.render_to_string("shares/files.html", dict(
+        title="Browse Files",
+        parent_path=parent_path,
+        streaming=True,
+    ), request)
+    (head, tail) = page.split(FILES_ROWS_MARKER)
+    return (head, tail)
+
+
+def _stream_files(request: HttpRequest, requested_path: Path):
+    try:
+        (chunks, parent_path) = actions.stream_directories_and_files(
+            requested_path, settings.FL_FILES_PAGE_SIZE)
+    except InvalidRequestPathException:
+        return redirect("shares:files")
+
+    (head, tail) = _render_streamed_files_page(request, parent_path)
+    rows_template = loader.get_template("shares/files_rows.html")
+
+    def generate():
+        yield head
+        for (directories, files) in chunks:
+            yield rows_template.render(dict(
+                directories=directories,
+                files=files,
+                shares=actions.get_shares_for_directory(
+                    requested_path, _get_share_names(directories, files)),
+            ), request)
+        yield tail
+
+    return StreamingHttpResponse(generate())
+
+
+async def _astream_files(request: HttpRequest, requested_path: Path):
+    try:
+        (chunks, parent_path) = await http_utils.run_in_thread(
+            actions.stream_directories_and_files)(requested_path, settings.FL_FILES_PAGE_SIZE)
+    except InvalidRequestPathException:
+        return redirect("shares:files")
+
+    (head, tail) = await sync_to_async(_render_streamed_files_page)(request, parent_path)
+    rows_template = loader.get_template("shares/files_rows.html")
+    next_chunk = http_utils.run_in_thread(next)
+
+    async def generate():
+        yield head
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            (directories, files) = chunk
+            yield rows_template.render(dict(
+                directories=directories,
+                files=files,
+                shares=await actions.aget_shares_for_directory(
+                    requested_path, _get_share_names(directories, files)),
+            ), request)
+        yield tail
+
+    return StreamingHttpResponse(generate())
+
+
+@login_required
+@require_GET
+def search(request: HttpRequest):
+    query = request.GET.get("q", "")
+    return render(request, "shares/search.html", dict(
+        title="Search Files",
+        query=query,
+        results=actions.search_files(
+            query, settings.FL_SEARCH_MAX_RESULTS) if query else None,
+        max_results=settings.FL_SEARCH_MAX_RESULTS,
     ))
 
 
@@ -49,9 +196,17 @@ def shares(request: HttpRequest):
 @require_GET
 def share(request: HttpRequest, share_id: int):
     share = get_object_or_404(models.Share, id=share_id)
+    rollups = models.DailyDownloadRollup.objects.filter(share=share)
     return render(request, "shares/share.html", dict(
         title=f"Share \"{share.name}\"",
         share=share,
+        checksum=actions.get_current_checksum(share),
+        daily_downloads=rollups.order_by(
+            "-day")[:settings.FL_SHARE_DAILY_DOWNLOADS_DAYS],
+        total_downloads=rollups.aggregate(
+            request_count=Sum("request_count"),
+            range_request_count=Sum("range_request_count"),
+        ),
     ))
 
 
@@ -74,7 +229,8 @@ def new_share(request: HttpRequest):
                 directory = parent
 
         form = forms.ShareForm(
-            dict(directory=directory, name=name, download_enabled=True, force_download=True))
+            dict(directory=directory, name=name, download_enabled=True, force_download=True, cache_max_age=0,
+                 compress_archive=False))
 
     return render(request, "shares/share_form.html", dict(
         title="New Share",
@@ -105,7 +261,7 @@ def edit_share(request: HttpRequest, share_id: int):
 def delete_share(request: HttpRequest, share_id: int):
     share = get_object_or_404(models.Share, id=share_id, user=request.user)
     if request.method == "POST":
-        share.delete()
+        actions.delete_shares(models.Share.objects.filter(id=share.id))
         return redirect("shares:index")
 
     return render(request, "shares/share_delete.html", dict(
@@ -114,18 +270,414 @@ def delete_share(request: HttpRequest, share_id: int):
     ))
 
 
+@login_required
+@require_POST
+def bulk_new_share(request: HttpRequest):
+    form = forms.BulkShareForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest()
+
+    try:
+        paths = actions.collect_share_paths(
+            Path(p) for p in request.POST.getlist("path"))
+    except InvalidRequestPathException:
+        return HttpResponseBadRequest()
+    except TooManyFilesException:
+        return HttpResponseBadRequest(f"Too many files, at most {settings.FL_BULK_SHARE_MAX_FILES} can be shared at once.")
+
+    actions.bulk_create_shares(request.user, paths, **form.cleaned_data)
+    return redirect("shares:shares")
+
+
+@login_required
+@require_POST
+def bulk_share_action(request: HttpRequest):
+    form = forms.BulkShareActionForm(request.POST)
+    share_ids = _parse_share_ids(request.POST.getlist("share"))
+    if not form.is_valid() or share_ids is None:
+        return HttpResponseBadRequest()
+
+    actions.bulk_update_shares(
+        request.user, share_ids, form.cleaned_data["action"])
+    return redirect("shares:shares")
+
+
+def _api_login_required(view: Callable[..., HttpResponse]) -> Callable[..., HttpResponse]:
+    """Like login_required, but responds with a JSON error instead of redirecting."""
+    @functools.wraps(view)
+    def wrapper(request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponse:
+        if not request.user.is_authenticated:
+            return JsonResponse(dict(error="Authentication required."), status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _conditional_json_response(request: HttpRequest, etag: str | None,
+                               get_data: Callable[[], Dict[str, Any]]) -> HttpResponse:
+    """
+    Responds with 304 Not Modified if the client has the current version, and
+    only builds the data otherwise.
+    """
+    response = get_conditional_response(request, etag=etag) \
+        if etag is not None else None
+    if response is None:
+        response = JsonResponse(get_data(), json_dumps_params=dict(
+            separators=(",", ":")))
+    if etag is not None:
+        response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def _serialize_share(share: models.Share) -> Dict[str, Any]:
+    return dict(
+        id=share.id,
+        slug=share.slug,
+        directory=share.directory,
+        name=share.name,
+        download_enabled=share.download_enabled,
+        force_download=share.force_download,
+        cache_max_age=share.cache_max_age,
+        compress_archive=share.compress_archive,
+        updated_at=share.updated_at,
+        download_url=reverse("shares:download_share", args=(share.slug,)),
+    )
+
+
+@_api_login_required
+@require_GET
+def api_files(request: HttpRequest):
+    """
+    Lists a directory like the files page, along with the ID of the share for
+    each entry that is shared. File sizes and modification times are included
+    when the listing comes from the index.
+    """
+    requested_path = Path(request.GET.get("path", default="."))
+    try:
+        version = actions.get_listing_version(requested_path)
+    except InvalidRequestPathException:
+        return JsonResponse(dict(error="Invalid path."), status=400)
+
+    def get_data() -> Dict[str, Any]:
+        (directories, files, parent_path) = actions.get_directories_and_files(
+            requested_path)
+        shares = actions.get_shares_for_directory(
+            requested_path, _get_share_names(directories, files))
+
+        def serialize(entry: Dict[str, Any]) -> Dict[str, Any]:
+            # Listings may be cached, so build new dicts rather than modifying them
+            share = shares.get(entry["name"].removesuffix("/"))
+            return {key: value for (key, value) in entry.items() if key != "path"} | \
+                dict(share=share.id if share else None)
+
+        return dict(
+            path=requested_path.as_posix(),
+            parent_path=parent_path.as_posix() if parent_path is not None else None,
+            directories=[serialize(d) for d in directories],
+            files=[serialize(f) for f in files],
+        )
+
+    try:
+        return _conditional_json_response(
+            request, http_utils.hash_etag(*version) if version else None, get_data)
+    except InvalidRequestPathException:
+        return JsonResponse(dict(error="Invalid path."), status=400)
+    except OSError:
+        return JsonResponse(dict(error="Directory not found."), status=404)
+
+
+@_api_login_required
+@require_GET
+def api_shares(request: HttpRequest):
+    return _conditional_json_response(
+        request,
+        http_utils.hash_etag(*actions.get_shares_version(request.user)),
+        lambda: dict(shares=[_serialize_share(s) for s in models.Share.objects.filter(
+            user=request.user).order_by("id")]),
+    )
+
+
+@_api_login_required
+@require_GET
+def api_share(request: HttpRequest, share_id: int):
+    share = models.Share.objects.filter(id=share_id).first()
+    if share is None:
+        return JsonResponse(dict(error="Share not found."), status=404)
+
+    # Download counts only change when new logs are rolled up
+    last_download_log_id = models.DownloadRollupState.objects.filter(
+        pk=1).values_list("last_download_log_id", flat=True).first()
+
+    def get_data() -> Dict[str, Any]:
+        rollups = models.DailyDownloadRollup.objects.filter(share=share)
+        return dict(
+            share=_serialize_share(share),
+            daily_downloads=list(rollups.order_by("-day").values(
+                "day", "request_count", "distinct_ips", "range_request_count")[
+                    :settings.FL_SHARE_DAILY_DOWNLOADS_DAYS]),
+            total_downloads=rollups.aggregate(
+                request_count=Sum("request_count"),
+                range_request_count=Sum("range_request_count"),
+            ),
+        )
+
+    return _conditional_json_response(request, http_utils.hash_etag(
+        share.id, share.updated_at, last_download_log_id), get_data)
+
+
+@_api_login_required
+@require_POST
+def api_bulk_shares(request: HttpRequest):
+    """
+    Creates shares for a list of paths, or enables, disables or deletes a list
+    of shares, from a JSON body like {"action": "create", "paths": [...]} or
+    {"action": "delete", "ids": [...]}.
+    """
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        body = None
+    if not isinstance(body, dict):
+        return JsonResponse(dict(error="Invalid JSON body."), status=400)
+
+    action = body.get("action")
+    if action == "create":
+        form = forms.BulkShareForm(dict(
+            download_enabled=body.get("download_enabled", True),
+            force_download=body.get("force_download", True),
+            cache_max_age=body.get("cache_max_age", 0),
+        ))
+        requested_paths = body.get("paths")
+        if not form.is_valid() or not isinstance(requested_paths, list) or \
+                not all(isinstance(p, str) for p in requested_paths):
+            return JsonResponse(dict(error="Invalid share options or paths."), status=400)
+
+        try:
+            paths = actions.collect_share_paths(
+                Path(p) for p in requested_paths)
+        except InvalidRequestPathException:
+            return JsonResponse(dict(error="Invalid path."), status=400)
+        except TooManyFilesException:
+            return JsonResponse(dict(
+                error=f"Too many files, at most {settings.FL_BULK_SHARE_MAX_FILES} can be shared at once."), status=400)
+
+        (created, skipped) = actions.bulk_create_shares(
+            request.user, paths, **form.cleaned_data)
+        return JsonResponse(dict(
+            created=[dict(id=s.id, slug=s.slug, path=s.full_path)
+                     for s in created],
+            skipped=[p.as_posix() for p in skipped],
+        ), status=201)
+
+    share_ids = _parse_share_ids(body.get("ids"))
+    if action not in actions.BULK_ACTIONS or share_ids is None:
+        return JsonResponse(dict(error="Invalid action or share IDs."), status=400)
+
+    count = actions.bulk_update_shares(request.user, share_ids, action)
+    return JsonResponse(dict(count=count))
+
+
+def _parse_share_ids(values: Any) -> List[int] | None:
+    if not isinstance(values, list):
+        return None
+    try:
+        return [int(v) for v in values]
+    except (TypeError, ValueError):
+        return None
+
+
 @require_GET
 def download_share(request: HttpRequest, share_slug: str):
-    share = get_object_or_404(models.Share, slug=share_slug)
+    share = actions.resolve_share(share_slug)
+    if (reason := _get_rejection_reason(share)):
+        metrics.registry.inc(
+            "filelink_download_rejections_total", reason=reason)
+        return HttpResponseNotFound()
+
+    limits = ratelimit.get_download_limits(
+        models.get_ip_from_meta(request.META), share.id)
+    if (response := _acquire_download_limits(limits)) is not None:
+        return response
+
+    response = _send_limited_share(request, share, limits)
+    # Revalidations of a cached copy are not downloads
+    if response.status_code != 304:
+        download_logs.log_download(request, share.id)
+        metrics.registry.inc("filelink_downloads_total", share=str(share.id))
+    return response
+
+
+@require_GET
+async def download_share_async(request: HttpRequest, share_slug: str):
+    share = await actions.aresolve_share(share_slug)
+    if (reason := _get_rejection_reason(share)):
+        metrics.registry.inc(
+            "filelink_download_rejections_total", reason=reason)
+        return HttpResponseNotFound()
+
+    limits = ratelimit.get_download_limits(
+        models.get_ip_from_meta(request.META), share.id)
+    if (response := _acquire_download_limits(limits)) is not None:
+        return response
+
+    response = await http_utils.run_in_thread(_send_limited_share)(request, share, limits)
+    if response.status_code != 304:
+        await download_logs.alog_download(request, share.id)
+        metrics.registry.inc("filelink_downloads_total", share=str(share.id))
+    return response
+
+
+def _get_rejection_reason(share: actions.ResolvedShare | None) -> str | None:
+    if share is None:
+        return "not_found"
     if not share.download_enabled:
+        return "disabled"
+    return None
+
+
+def _acquire_download_limits(limits: List[ratelimit.Limit]) -> HttpResponse | None:
+    if (retry_after := ratelimit.get_limiter().acquire(limits)) is None:
+        return None
+
+    metrics.registry.inc(
+        "filelink_download_rejections_total", reason="rate_limited")
+    response = HttpResponse("Too many requests, try again later.",
+                            status=429, content_type="text/plain")
+    response["Retry-After"] = max(math.ceil(retry_after), 1)
+    return response
+
+
+def _send_limited_share(request: HttpRequest, share: actions.ResolvedShare,
+                        limits: List[ratelimit.Limit]) -> HttpResponse:
+    limiter = ratelimit.get_limiter()
+    try:
+        response = _send_share(request, share)
+    except BaseException:
+        limiter.release(limits)
+        raise
+
+    if response.streaming and any(limit.max_concurrent for limit in limits):
+        # The transfer ends when the server closes the response, after the
+        # streamed content has been sent
+        http_utils.close_with_response(
+            response, functools.partial(limiter.release, limits))
+    else:
+        # Including files handed to the server with X-Sendfile, which are no
+        # longer this process's to count once the response is returned
+        limiter.release(limits)
+    return response
+
+
+def _send_share(request: HttpRequest, share: actions.ResolvedShare) -> HttpResponse:
+    # Directories are streamed here rather than by sendfile, which is what
+    # refused paths outside SENDFILE_ROOT, so check before touching the file
+    try:
+        file_path = actions.get_share_file_path(share.full_path)
+    except InvalidRequestPathException:
         return HttpResponseNotFound()
+    try:
+        stat = file_path.stat()
+    except OSError:
+        # Leave reporting the missing file to sendfile
+        stat = None
+    if stat is not None and S_ISDIR(stat.st_mode):
+        return _send_directory(request, share, file_path)
 
-    root_path: Path = settings.FL_FILES_PATH
-    models.DownloadLog.create_from_request_and_share(request, share)
-    response: HttpResponse = django_sendfile.sendfile(
-        request,
-        (root_path / share.full_path).as_posix(),
-        attachment=share.force_download,
-        attachment_filename=share.name)
-    response["Accept-Ranges"] = "bytes"
+    headers = {"Cache-Control": _get_cache_control(share)}
+    response = None
+    if stat is not None:
+        headers["ETag"] = http_utils.stat_etag(stat)
+        headers["Last-Modified"] = http_date(stat.st_mtime)
+        if share.checksum is not None and share.checksum[:3] == \
+                (stat.st_ino, stat.st_size, stat.st_mtime_ns):
+            headers.update(_get_checksum_headers(share.checksum[3]))
+            # The sendfile backend checks If-Range (from META, as request.headers
+            # is cached) against the stat based ETag
+            if request.headers.get("If-Range") == headers["ETag"]:
+                request.META["HTTP_IF_RANGE"] = http_utils.stat_etag(stat)
+        response = get_conditional_response(
+            request, etag=headers["ETag"], last_modified=int(stat.st_mtime))
+
+    if response is None:
+        response = django_sendfile.sendfile(
+            request,
+            file_path.as_posix(),
+            attachment=share.force_download,
+            attachment_filename=share.name)
+        response["Accept-Ranges"] = "bytes"
+
+    for (header, value) in headers.items():
+        response[header] = value
     return response
+
+
+def _get_checksum_headers(sha256: str) -> Dict[str, str]:
+    digest = base64.b64encode(bytes.fromhex(sha256)).decode()
+    return {
+        "ETag": f"\"sha256-{sha256}\"",
+        "Repr-Digest": f"sha-256=:{digest}:",
+        # The older RFC 3230 header, for clients that predate Repr-Digest
+        "Digest": f"SHA-256={digest}",
+    }
+
+
+def _send_directory(request: HttpRequest, share: actions.ResolvedShare, directory_path: Path) -> HttpResponse:
+    try:
+        entries = zipstream.collect_entries(
+            directory_path, share.name, settings.FL_FILES_PATH)
+    except OSError:
+        return HttpResponseNotFound()
+
+    archive = zipstream.ZipStream(entries, compress=share.compress_archive)
+    response = StreamingHttpResponse(http_utils.streaming_content(
+        request, archive), content_type="application/zip")
+    if (size := archive.size()) is not None:
+        response["Content-Length"] = size
+    response["Content-Disposition"] = content_disposition_header(
+        True, f"{share.name}.zip")
+    response["Cache-Control"] = _get_cache_control(share)
+    return response
+
+
+def _get_cache_control(share: actions.ResolvedShare) -> str:
+    if share.cache_max_age:
+        return f"public, max-age={share.cache_max_age}"
+    return "no-cache"
+
+
+@require_GET
+def export_download_logs(request: HttpRequest):
+    """
+    Streams download logs as CSV or NDJSON, optionally limited to a time range
+    with start and end, or to one share.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    export_format = request.GET.get("format", "csv")
+    try:
+        (content_type, write_logs) = exports.FORMATS[export_format]
+        (start, end) = (exports.parse_time(request.GET[key]) if request.GET.get(key) else None
+                        for key in ("start", "end"))
+        share_id = int(request.GET["share"]) if request.GET.get(
+            "share") else None
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest()
+
+    response = StreamingHttpResponse(http_utils.streaming_content(
+        request, write_logs(exports.get_download_logs(start, end, share_id))), content_type=content_type)
+    response["Content-Disposition"] = content_disposition_header(
+        True, f"download-logs.{export_format}")
+    return response
+
+
+@require_GET
+def metrics_view(request: HttpRequest):
+    (scheme, _, token) = request.headers.get(
+        "Authorization", "").partition(" ")
+    token_valid = settings.FL_METRICS_TOKEN and scheme.lower() == "bearer" and \
+        constant_time_compare(token, settings.FL_METRICS_TOKEN)
+    if not token_valid and not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
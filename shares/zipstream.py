@@ -0,0 +1,212 @@
+"""
+Builds ZIP archives of a directory tree on the fly, without temp files and in
+constant memory.
+
+Entries are written with data descriptors, so each file's CRC is computed as
+it is streamed. In store mode the archive's length only depends on the names
+and sizes of the files, so it is known before streaming starts. ZIP64 records
+are used when sizes, offsets or the number of entries exceed the ZIP limits.
+"""
+import os
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Iterator, List, NamedTuple, Tuple
+
+
+CHUNK_SIZE = 256 * 1024
+
+# Values at or above these limits are moved into ZIP64 records, leaving a
+# marker in the regular field
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP32_MAX_ENTRIES = 0xFFFF
+_MARKER_32 = 0xFFFFFFFF
+_MARKER_16 = 0xFFFF
+
+_FLAGS = 0x08 | 0x800  # Data descriptor, UTF-8 names
+_METHOD_STORE = 0
+_METHOD_DEFLATE = 8
+_VERSION_ZIP32 = 20
+_VERSION_ZIP64 = 45
+_MADE_BY_UNIX = 3 << 8
+
+
+class ZipEntry(NamedTuple):
+    path: Path
+    arcname: str
+    size: int
+    mtime: float
+    mode: int
+
+
+def collect_entries(root: Path, prefix: str, files_root: Path | None = None) -> List[ZipEntry]:
+    """
+    Lists the files under root in a stable order, named under prefix in the
+    archive. Symlinked directories are not followed, and symlinked files are
+    left out unless they resolve inside files_root, which defaults to root.
+    """
+    files_root = (files_root or root).resolve()
+    entries: List[ZipEntry] = []
+    # Pending directories and files, with the next one to visit last
+    pending: List[Tuple[os.DirEntry | Path, str]] = [(root, prefix)]
+    while pending:
+        (item, arcname) = pending.pop()
+        if isinstance(item, Path) or item.is_dir(follow_symlinks=False):
+            with os.scandir(item) as scan:
+                children = sorted(scan, key=lambda f: f.name, reverse=True)
+            pending.extend((f, f"{arcname}/{f.name}") for f in children)
+        elif item.is_file():
+            if item.is_symlink() and \
+                    not Path(item.path).resolve().is_relative_to(files_root):
+                continue
+            stat = item.stat()
+            entries.append(ZipEntry(
+                path=Path(item.path),
+                arcname=arcname,
+                size=stat.st_size,
+                mtime=stat.st_mtime,
+                mode=stat.st_mode,
+            ))
+    return entries
+
+
+def _dos_time(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(mtime)
+    if t.tm_year < 1980:
+        return (0, (1 << 5) | 1)
+    return ((t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2),
+            ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday)
+
+
+class ZipStream:
+    """An iterable of the bytes of a ZIP archive of the given entries."""
+
+    def __init__(self, entries: List[ZipEntry], compress: bool = False):
+        self._entries = entries
+        self._compress = compress
+
+    def _entry_zip64(self, entry: ZipEntry) -> bool:
+        # Deflate can slightly expand incompressible data, so leave headroom
+        # when the compressed size is not known in advance
+        if self._compress:
+            return entry.size + entry.size // 100 + 1024 >= ZIP32_LIMIT
+        return entry.size >= ZIP32_LIMIT
+
+    def _local_header(self, entry: ZipEntry, zip64: bool) -> bytes:
+        name = entry.arcname.encode()
+        # Sizes and the CRC follow the data in the descriptor. A ZIP64 extra
+        # field with zero sizes marks the descriptor as using 8 byte sizes.
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0) if zip64 else b""
+        (dos_time, dos_date) = _dos_time(entry.mtime)
+        return struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50,
+            _VERSION_ZIP64 if zip64 else _VERSION_ZIP32, _FLAGS,
+            _METHOD_DEFLATE if self._compress else _METHOD_STORE,
+            dos_time, dos_date, 0,
+            _MARKER_32 if zip64 else 0, _MARKER_32 if zip64 else 0,
+            len(name), len(extra),
+        ) + name + extra
+
+    def _data_descriptor(self, crc: int, compressed_size: int, size: int, zip64: bool) -> bytes:
+        if zip64:
+            return struct.pack("<IIQQ", 0x08074B50, crc, compressed_size, size)
+        return struct.pack("<IIII", 0x08074B50, crc, compressed_size, size)
+
+    def _central_header(self, entry: ZipEntry, crc: int, compressed_size: int, offset: int, zip64: bool) -> bytes:
+        name = entry.arcname.encode()
+        zip64_fields = []
+        if zip64:
+            zip64_fields.extend((entry.size, compressed_size))
+        if offset >= ZIP32_LIMIT:
+            zip64_fields.append(offset)
+        extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields) \
+            if zip64_fields else b""
+        version = _VERSION_ZIP64 if zip64_fields else _VERSION_ZIP32
+        (dos_time, dos_date) = _dos_time(entry.mtime)
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII", 0x02014B50,
+            _MADE_BY_UNIX | version, version, _FLAGS,
+            _METHOD_DEFLATE if self._compress else _METHOD_STORE,
+            dos_time, dos_date, crc,
+            _MARKER_32 if zip64 else compressed_size,
+            _MARKER_32 if zip64 else entry.size,
+            len(name), len(extra), 0, 0, 0,
+            (entry.mode & 0xFFFF) << 16,
+            _MARKER_32 if offset >= ZIP32_LIMIT else offset,
+        ) + name + extra
+
+    def _end_records(self, count: int, cd_offset: int, cd_size: int) -> bytes:
+        records = b""
+        zip64 = count >= ZIP32_MAX_ENTRIES or cd_offset >= ZIP32_LIMIT or cd_size >= ZIP32_LIMIT
+        if zip64:
+            records += struct.pack(
+                "<IQHHIIQQQQ", 0x06064B50, 44,
+                _MADE_BY_UNIX | _VERSION_ZIP64, _VERSION_ZIP64, 0, 0,
+                count, count, cd_size, cd_offset)
+            records += struct.pack("<IIQI", 0x07064B50,
+                                   0, cd_offset + cd_size, 1)
+        records += struct.pack(
+            "<IHHHHIIH", 0x06054B50, 0, 0,
+            _MARKER_16 if zip64 else count, _MARKER_16 if zip64 else count,
+            _MARKER_32 if zip64 else cd_size, _MARKER_32 if zip64 else cd_offset, 0)
+        return records
+
+    def size(self) -> int | None:
+        """The length of the archive, if known without compressing the files."""
+        if self._compress:
+            return None
+
+        offset = 0
+        cd_size = 0
+        for entry in self._entries:
+            zip64 = self._entry_zip64(entry)
+            cd_size += len(self._central_header(entry,
+                           0, entry.size, offset, zip64))
+            offset += len(self._local_header(entry, zip64)) + entry.size + \
+                len(self._data_descriptor(0, entry.size, entry.size, zip64))
+        return offset + cd_size + len(self._end_records(len(self._entries), offset, cd_size))
+
+    def __iter__(self) -> Iterator[bytes]:
+        offset = 0
+        central_directory = []
+        for entry in self._entries:
+            zip64 = self._entry_zip64(entry)
+            header = self._local_header(entry, zip64)
+            yield header
+
+            crc = 0
+            compressed_size = 0
+            compressor = zlib.compressobj(
+                6, zlib.DEFLATED, -15) if self._compress else None
+            with open(entry.path, "rb") as f:
+                # Only the size listed up front is sent, so a file that grows
+                # while streaming does not break the archive's length
+                remaining = entry.size
+                while remaining:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        raise OSError(
+                            f"{entry.path} was truncated while streaming")
+                    remaining -= len(chunk)
+                    crc = zlib.crc32(chunk, crc)
+                    if compressor:
+                        chunk = compressor.compress(chunk)
+                    compressed_size += len(chunk)
+                    if chunk:
+                        yield chunk
+            if compressor:
+                chunk = compressor.flush()
+                compressed_size += len(chunk)
+                yield chunk
+
+            descriptor = self._data_descriptor(
+                crc, compressed_size, entry.size, zip64)
+            yield descriptor
+            central_directory.append(self._central_header(
+                entry, crc, compressed_size, offset, zip64))
+            offset += len(header) + compressed_size + len(descriptor)
+
+        cd = b"".join(central_directory)
+        yield cd
+        yield self._end_records(len(self._entries), offset, len(cd))